@@ -1,7 +1,15 @@
 """Flask后端API服务器"""
-from flask import Flask, request, jsonify, session
+from flask import Flask, Response, request, jsonify, session, g, send_file, send_from_directory, has_request_context
 from flask_cors import CORS
+import math
+import os
 import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from contextvars import ContextVar
+from functools import wraps
 from pathlib import Path
 
 # 添加项目根目录到路径
@@ -10,16 +18,39 @@ if str(project_root) not in sys.path:
     sys.path.insert(0, str(project_root))
 
 from prompt_optimizer.config.settings import Config
-from prompt_optimizer.src.utils.logger import Logger
+from prompt_optimizer.src.utils.logger import Logger, parse_event_rates
 from prompt_optimizer.src.models.ai_models import AIModelManager
 from prompt_optimizer.src.core.optimizer import PromptOptimizerCore
+from prompt_optimizer.src.core.prompt_templates import PromptTemplates
+from prompt_optimizer.src.core.similarity import SimilarityIndex
+from prompt_optimizer.src.core.search import parse_terms, build_boolean_query, format_hit
+from prompt_optimizer.src.core.scheduler import FairScheduler, SchedulerRejected
 from prompt_optimizer.src.utils.auth import AuthService
-from prompt_optimizer.src.utils.database import Database, SessionDAO, ConversationDAO, OptimizationResultDAO
+from prompt_optimizer.src.utils.archive import SessionArchiver
+from prompt_optimizer.src.utils.assets import AssetManifest
+from prompt_optimizer.src.utils.compression import ResponseCompressor
+from prompt_optimizer.src.utils.json_provider import FastJSONProvider
+from prompt_optimizer.src.utils.lifecycle import InFlightTracker
+from prompt_optimizer.src.utils.profiling import RequestProfiler, KINDS as PROFILE_KINDS
+from prompt_optimizer.src.utils.text_codec import TextCompressor
+from prompt_optimizer.src.utils import stage_delta
+from prompt_optimizer.src.utils.usage import UsageLedger, UsageDAO
+from prompt_optimizer.src.utils.write_queue import BackgroundWriter
+from prompt_optimizer.src.utils.database import (
+    Database, UserDAO, SessionDAO, ConversationDAO, OptimizationResultDAO, LastLoginWriteBehind,
+    SearchDAO, StatsDAO
+)
 
-app = Flask(__name__, static_folder='static', template_folder='templates')
-app.secret_key = 'your-secret-key-change-in-production'
+# 关闭Flask内置的static路由，由static_files统一处理（支持预压缩和长缓存）
+STATIC_DIR = Path(__file__).parent / 'static'
+app = Flask(__name__, static_folder=None, template_folder='templates')
+# 多worker部署时各进程必须使用相同的密钥，否则Session无法跨进程校验
+app.secret_key = os.getenv('FLASK_SECRET_KEY', 'your-secret-key-change-in-production')
 CORS(app, supports_credentials=True)
 
+# 静态资源构建清单（运行 python build_assets.py 生成，未构建时回退到原始文件）
+asset_manifest = AssetManifest(STATIC_DIR)
+
 # 全局变量
 config = None
 logger = None
@@ -30,12 +61,31 @@ db = None
 session_dao = None
 conversation_dao = None
 optimization_result_dao = None
+search_dao = None
+stats_dao = None
+pipeline_scheduler = None
+text_compressor = None
+last_login_writer = None
+usage_ledger = None
+persist_writer = None
+usage_dao = None
+similarity_index = None
+request_profiler = None
+naming_executor = None
+
+# 请求上下文之外的模型调用（如后台会话命名）的用量归属：(user_id, request_id, source)
+usage_attribution: ContextVar = ContextVar("usage_attribution", default=None)
+
+# 进行中的优化流程，用于优雅退出时排空
+inflight = InFlightTracker()
 
 
 def init_app():
     """初始化应用"""
     global config, logger, model_manager, optimizer_core
     global auth_service, db, session_dao, conversation_dao, optimization_result_dao
+    global last_login_writer, similarity_index, search_dao, text_compressor, stats_dao
+    global pipeline_scheduler, usage_ledger, usage_dao, persist_writer, request_profiler, naming_executor
     
     try:
         # 初始化配置
@@ -47,48 +97,497 @@ def init_app():
             raise ValueError(f"缺少API密钥: {', '.join(missing_keys)}")
         
         # 初始化日志
-        logger = Logger(config.log_file)
+        logger = Logger(
+            config.log_file,
+            console_level=config.log_console_level,
+            file_level=config.log_file_level,
+            log_format=config.log_format,
+            sample_rates=parse_event_rates(config.log_sample_rates),
+            rate_limits=parse_event_rates(config.log_rate_limits)
+        )
         logger.info("=" * 50)
         logger.info("提示词优化工具Web服务启动")
         logger.info("=" * 50)
         
+        # 替换JSON提供器（jsonify和request.json均使用）
+        if config.fast_json_enabled:
+            app.json = FastJSONProvider(app)
+        
+        # 注册响应压缩
+        if config.compression_enabled:
+            ResponseCompressor(
+                app,
+                min_size=config.compression_min_size,
+                gzip_level=config.compression_gzip_level,
+                brotli_quality=config.compression_brotli_quality
+            )
+            logger.debug("响应压缩已启用")
+        
         # 初始化数据库相关服务
-        auth_service = AuthService()
         db = Database()
+        last_login_writer = LastLoginWriteBehind(
+            db,
+            flush_interval=config.last_login_flush_interval,
+            batch_size=config.last_login_batch_size
+        )
+        user_dao = UserDAO(db, cache_ttl=config.user_cache_ttl, write_behind=last_login_writer)
+        auth_service = AuthService(db, user_dao)
         session_dao = SessionDAO(db)
-        conversation_dao = ConversationDAO(db)
-        optimization_result_dao = OptimizationResultDAO(db)
+        # 已归档会话在读取对话/结果时自动还原
+        archiver = None
+        if config.archive_enabled:
+            archiver = SessionArchiver(db, after_days=config.archive_after_days, logger=logger)
+        # 大文本字段透明压缩（关闭时仍能读取已压缩的数据）
+        text_compressor = TextCompressor(
+            codec=config.text_compression_codec,
+            min_size=config.text_compression_min_size,
+            enabled=config.text_compression_enabled
+        )
+        conversation_dao = ConversationDAO(db, archiver=archiver, compressor=text_compressor,
+                                           delta_results=config.result_delta_storage)
+        optimization_result_dao = OptimizationResultDAO(db, archiver=archiver, compressor=text_compressor,
+                                                        delta_results=config.result_delta_storage)
+        search_dao = SearchDAO(db, compressor=text_compressor)
+        stats_dao = StatsDAO(db)
+        # 优化结果的后台写入队列（写满时退回同步写入）
+        persist_writer = BackgroundWriter("persist-writer", maxsize=config.persist_queue_size, logger=logger)
+        # 服务端保存后的会话命名要调用模型，使用独立的线程，不占用写入队列
+        naming_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="session-naming")
         logger.info("数据库服务初始化成功")
         
-        # 初始化AI模型管理器
+        # 初始化AI模型管理器（模型客户端在首次使用时创建）
         model_manager = AIModelManager(config, logger)
+        usage_dao = UsageDAO(db)
+        if config.usage_ledger_enabled:
+            usage_ledger = UsageLedger(
+                db,
+                flush_interval=config.usage_flush_interval,
+                batch_size=config.usage_batch_size,
+                max_buffer=config.usage_max_buffer
+            )
+            model_manager.usage_callback = record_model_usage
+        if config.model_warm_up:
+            model_manager.warm_up()
         
         # 初始化优化核心
         optimizer_core = PromptOptimizerCore(config, model_manager, logger)
         logger.debug("优化核心初始化成功")
         
+        # 初始化模型流程调度器（按用户公平分配执行槽位）
+        if config.scheduler_enabled:
+            pipeline_scheduler = FairScheduler(
+                slots=config.scheduler_slots,
+                per_user_limit=config.scheduler_per_user_limit,
+                max_queue=config.scheduler_max_queue,
+                queue_timeout=config.scheduler_queue_timeout,
+                shared_dir=config.scheduler_shared_dir if config.scheduler_shared else None
+            )
+        logger.info("提示词模板版本: %s", PromptTemplates.fingerprint())
+        
+        # 初始化近似重复需求索引（索引文件不存在时从数据库构建）
+        if config.similarity_enabled:
+            similarity_index = SimilarityIndex(config.similarity_index_file)
+            try:
+                # 多个worker同时启动时由先拿到文件锁的一个构建，其余等待后直接加载
+                count = similarity_index.build_if_missing(optimization_result_dao.get_index_records)
+                if count is not None:
+                    logger.info("相似度索引已从数据库构建 - 记录数: %s", count)
+            except Exception as e:
+                logger.warning("从数据库构建相似度索引失败: %s", e)
+            logger.debug("相似度索引加载完成 - 记录数: %s", len(similarity_index))
+        
+        # 按需性能剖析（管理员布置后才采集）
+        if config.profiling_enabled:
+            request_profiler = RequestProfiler(
+                config.profiling_dir,
+                max_profiles=config.profiling_max_profiles,
+                interval_ms=config.profiling_interval_ms,
+                tracemalloc_frames=config.profiling_tracemalloc_frames,
+                max_duration=config.profiling_max_duration,
+                logger=logger
+            )
+        
         logger.info("✅ 所有服务初始化完成，系统就绪")
         logger.info("=" * 50)
         
     except Exception as e:
         if logger:
-            logger.critical(f"初始化失败: {e}", exc_info=True)
+            logger.critical("初始化失败: %s", e, exc_info=True)
         raise
 
 
+def create_app():
+    """应用工厂：初始化服务并返回Flask应用
+
+    供WSGI服务器使用，例如 `gunicorn "prompt_optimizer.app:create_app()"`。
+    每个进程只初始化一次。
+    """
+    if config is None:
+        init_app()
+    return app
+
+
+def init_worker():
+    """worker进程初始化钩子（prefork服务器在worker启动后调用）
+
+    丢弃可能从父进程继承的数据库连接池和模型HTTP客户端，
+    由当前worker在首次使用时重新建立。
+    """
+    create_app()
+    db.reset_pool()
+    model_manager.reset_clients()
+    if pipeline_scheduler is not None:
+        # 排队中的请求同样占用worker线程，为执行中的流程和其他接口保留线程
+        web_threads = int(os.getenv("WEB_THREADS", 8))
+        max_queue = max(web_threads - pipeline_scheduler.slots - 2, 1)
+        if pipeline_scheduler.max_queue > max_queue:
+            logger.info("调度器排队上限按worker线程数调整为 %s（WEB_THREADS=%s）", max_queue, web_threads)
+            pipeline_scheduler.max_queue = max_queue
+    if config.model_warm_up:
+        model_manager.warm_up()
+    logger.info("worker初始化完成 - PID: %s", os.getpid())
+
+
+def begin_shutdown():
+    """收到退出信号时调用：立即停止接受新的优化请求（返回503），不等待进行中的流程"""
+    inflight.stop_accepting()
+
+
+def shutdown_app(timeout: float = 30) -> bool:
+    """优雅退出：拒绝新的优化请求，等待进行中的流程完成并写出缓冲数据"""
+    drained = inflight.drain(timeout)
+    if logger:
+        if drained:
+            logger.info("进行中的优化流程已全部完成 - PID: %s", os.getpid())
+        else:
+            logger.warning("等待超时，仍有 %s 个优化流程未完成 - PID: %s", inflight.count, os.getpid())
+    if persist_writer is not None:
+        persist_writer.close(timeout)
+    if naming_executor is not None:
+        # 命名只是体验优化，退出时丢弃尚未开始的任务
+        naming_executor.shutdown(wait=False, cancel_futures=True)
+    if last_login_writer is not None:
+        last_login_writer.close()
+    if usage_ledger is not None:
+        usage_ledger.close()
+    if model_manager is not None:
+        model_manager.close()
+    if logger:
+        logger.shutdown()
+    return drained
+
+
+def record_model_usage(stage: str, provider: str, upstream: str, usage: dict, duration_ms: float):
+    """模型调用用量回调：按当前请求的用户和接口写入用量台账"""
+    if usage_ledger is None:
+        return
+    user_id = request_id = source = None
+    if has_request_context():
+        user_id = session.get('user_id')
+        request_id = g.get('request_id')
+        source = request.endpoint
+    elif usage_attribution.get() is not None:
+        user_id, request_id, source = usage_attribution.get()
+    usage_ledger.record(stage, provider, usage, user_id=user_id, request_id=request_id,
+                        source=source, upstream=upstream, duration_ms=duration_ms)
+
+
+def is_admin() -> bool:
+    """当前登录用户是否在管理员列表中"""
+    user_id = session.get('user_id')
+    return user_id is not None and str(user_id) in config.admin_users
+
+
+def write_optimize_turn(user_id: int, session_id: int, user_text: str, ai_summary: str, results: dict,
+                        naming: tuple = None):
+    """在同一事务中写入一轮对话和三步优化结果，并更新相似度索引
+    
+    naming为 (request_id, source) 时，写入成功后为会话提交后台命名任务。
+    """
+    turn_number, conversation_id, result_id = conversation_dao.add_turn_with_result(
+        session_id, user_text, ai_summary, user_text,
+        results['deepseek'], results['kimi'], results['qwen']
+    )
+    if logger:
+        logger.info("优化结果已保存 - 会话ID: %s, 轮次: %s, 对话ID: %s, 结果ID: %s",
+                    session_id, turn_number, conversation_id, result_id, event="optimize_persisted")
+    if similarity_index is not None:
+        try:
+            similarity_index.add(result_id, user_text, user_id, session_id)
+        except Exception as e:
+            if logger:
+                logger.warning("更新相似度索引失败: %s", e)
+    if naming is not None and naming_executor is not None:
+        try:
+            naming_executor.submit(name_persisted_session, user_id, session_id, *naming)
+        except RuntimeError:
+            # 进程正在退出，执行器已关闭
+            pass
+
+
+def generate_session_name(session_id: int) -> str:
+    """根据最近3轮对话的用户消息，使用DeepSeek生成会话名称并保存，返回新名称"""
+    # 获取会话的所有对话
+    all_conversations = conversation_dao.get_session_conversations(session_id)
+    
+    # 构建对话摘要用于生成会话名称
+    conversation_summary = ""
+    for conv in all_conversations[-3:]:  # 只取最近3轮对话
+        conversation_summary += f"用户: {conv['user_message'][:100]}\n"
+    
+    # 使用DeepSeek生成会话名称
+    summary_prompt = f"""请为以下对话生成一个简短的会话标题，不超过15个字，只返回标题本身，不要其他内容：
+
+{conversation_summary}"""
+    
+    from langchain_core.messages import HumanMessage
+    response = model_manager.invoke_with_retry(
+        None, [HumanMessage(content=summary_prompt)], "DeepSeek (会话命名)",
+        max_retries=2, provider="deepseek"
+    )
+    new_session_name = response.strip()
+    # 限制长度
+    if len(new_session_name) > 15:
+        new_session_name = new_session_name[:15]
+    
+    # 更新会话名称
+    session_dao.update_session_name(session_id, new_session_name)
+    return new_session_name
+
+
+def name_persisted_session(user_id: int, session_id: int, request_id: str = None, source: str = None):
+    """服务端保存本轮结果后为会话生成名称（在命名线程中执行，失败只记录日志）
+    
+    不在请求上下文中，模型用量按触发保存的请求归属。
+    """
+    token = usage_attribution.set((user_id, request_id, source))
+    try:
+        new_session_name = generate_session_name(session_id)
+        if logger:
+            logger.info("会话名称已更新 - 会话ID: %s, 名称: %s", session_id, new_session_name,
+                        event="session_named")
+    except Exception as e:
+        if logger:
+            logger.warning("更新会话名称失败: %s", e)
+    finally:
+        usage_attribution.reset(token)
+
+
+def persist_optimize_turn(user_id: int, session_id: int, user_text: str, results: dict,
+                          name_session: bool = False) -> str:
+    """保存本次优化的对话记录和结果：优先交给后台写入队列，返回 queued / saved / failed
+    
+    name_session为True时在写入成功后为会话生成名称（与前端调用 POST /api/conversations 时的命名一致）。
+    """
+    ai_summary = (f"已完成三模型优化：DeepSeek({len(results['deepseek'])}字) + "
+                  f"Kimi({len(results['kimi'])}字) + Qwen({len(results['qwen'])}字)")
+    naming = (g.get('request_id'), request.endpoint) if name_session else None
+    args = (user_id, session_id, user_text, ai_summary, results, naming)
+    if persist_writer is not None and persist_writer.submit(
+            write_optimize_turn, *args, description=f"会话{session_id}的优化结果"):
+        return "queued"
+    # 队列已满或已关闭时同步写入
+    try:
+        write_optimize_turn(*args)
+        return "saved"
+    except Exception as e:
+        if logger:
+            logger.error("保存优化结果失败 - 会话ID: %s: %s", session_id, e, exc_info=True)
+        return "failed"
+
+
+def format_optimize_results(results: dict, response_format: str) -> dict:
+    """按请求的格式返回三步结果：delta 时后续步骤为相对上一步的行级增量（前端还原）"""
+    if response_format == 'delta':
+        return stage_delta.encode_response(results)
+    return results
+
+
+def find_similar_result(user_text: str, user_id: int):
+    """在历史优化结果中查找与需求近似重复的一条，返回 (匹配信息, 结果记录)"""
+    if similarity_index is None or not user_text:
+        return None, None
+    matches = similarity_index.query(
+        user_text,
+        threshold=config.similarity_threshold,
+        user_id=None if config.similarity_cross_user else user_id,
+        limit=5
+    )
+    for match in matches:
+        # 索引只追加不删除，跳过已删除会话中的结果
+        owner = session_dao.get_session(match['session_id']) if match.get('session_id') else None
+        if not owner or not owner['is_active']:
+            continue
+        if owner.get('archived_at') and optimization_result_dao.archiver is not None:
+            optimization_result_dao.archiver.rehydrate(owner['id'])
+        stored = optimization_result_dao.get_result(match['result_id'])
+        if stored:
+            return match, stored
+    return None, None
+
+
+def parse_bool_param(value, default: bool) -> bool:
+    """解析请求中的布尔参数：接受JSON布尔值、0/1及 "true"/"false" 等字符串，无法识别时抛出ValueError"""
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int) and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str):
+        text = value.strip().lower()
+        if text in ('true', '1', 'yes', 'on'):
+            return True
+        if text in ('false', '0', 'no', 'off', ''):
+            return False
+    raise ValueError(f"无法识别的布尔值: {value!r}")
+
+
+def run_optimize_pipeline(input_context: str, has_history: bool, adaptive: bool = False) -> dict:
+    """依次执行三步优化，返回各模型的结果（被跳过的步骤记录在 g.skipped_stages）"""
+    results, g.skipped_stages = optimizer_core.run_pipeline(input_context, has_history, adaptive)
+    if logger:
+        logger.info("三步优化流程全部完成", event="optimize_done",
+                    duration_ms=round((time.perf_counter() - g.request_start) * 1000, 1),
+                    sizes={"skipped": len(g.skipped_stages)})
+    return results
+
+
+def acquire_pipeline_slot(cost: float = 1.0, requested_priority: str = None):
+    """获取模型流程的执行槽位（未启用调度器时不排队）
+    
+    客户端只能声明 low 优先级（后台任务）；high 仅分配给配置中指定的用户。
+    """
+    if pipeline_scheduler is None:
+        return nullcontext()
+    user_id = session.get('user_id')
+    user_key = user_id or f"ip:{request.remote_addr}"
+    if user_id and str(user_id) in config.scheduler_priority_users:
+        priority = 'high'
+    elif requested_priority == 'low':
+        priority = 'low'
+    else:
+        priority = 'normal'
+    return pipeline_scheduler.slot(user_key, priority, cost, request_id=g.get('request_id'))
+
+
+def scheduler_rejected_response(error: SchedulerRejected):
+    """排队已满或等待超时时返回429，并告知排队位置和建议重试时间"""
+    if logger:
+        logger.warning("请求被调度器拒绝: %s", error, event="scheduler_rejected")
+    response = jsonify({
+        "success": False,
+        "error": str(error),
+        "queue": {
+            "position": error.position,
+            "estimated_wait": error.estimated_wait
+        }
+    })
+    response.status_code = 429
+    response.headers['Retry-After'] = str(math.ceil(error.estimated_wait or 5))
+    return response
+
+
+def track_inflight(view):
+    """将视图标记为长耗时流程：关闭过程中返回503，并在执行期间计数"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if inflight.draining:
+            return jsonify({
+                "success": False,
+                "error": "服务正在重启，请稍后重试"
+            }), 503
+        with inflight.track():
+            return view(*args, **kwargs)
+    return wrapper
+
+
+@app.before_request
+def bind_request_context():
+    """为每个请求生成request_id并写入日志上下文"""
+    g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex[:16]
+    g.request_start = time.perf_counter()
+    Logger.set_context(request_id=g.request_id, user_id=session.get('user_id'))
+    if request_profiler is not None:
+        g.profile_capture = request_profiler.maybe_start(request.endpoint, request.path, request.method)
+
+
+@app.after_request
+def attach_request_id(response):
+    """在响应头中返回request_id，便于前后端日志关联"""
+    request_id = g.get('request_id')
+    if request_id:
+        response.headers['X-Request-ID'] = request_id
+    if g.get('profile_capture') is not None:
+        g.profile_status = response.status_code
+    return response
+
+
+@app.teardown_request
+def finish_request_profile(error=None):
+    """结束本请求的性能剖析（请求异常时同样执行）"""
+    capture = g.pop('profile_capture', None)
+    if capture is not None:
+        request_profiler.finish(capture, status=g.get('profile_status'), error=error)
+
+
+def admin_required(view):
+    """仅允许管理员访问：未登录返回401，非管理员返回403"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not session.get('user_id'):
+            return jsonify({
+                "success": False,
+                "error": "未登录"
+            }), 401
+        if not is_admin():
+            return jsonify({
+                "success": False,
+                "error": "需要管理员权限"
+            }), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def send_built_asset(entry: dict):
+    """发送构建后的静态资源，按Accept-Encoding选择预压缩版本并支持ETag协商"""
+    path, encoding, etag, mimetype = asset_manifest.resolve(
+        entry, request.headers.get('Accept-Encoding')
+    )
+    response = send_file(path, mimetype=mimetype, etag=False, conditional=False)
+    # 预压缩文件名（如 .gz）不应暴露给客户端
+    response.headers.pop('Content-Disposition', None)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept-Encoding'
+    if entry.get('immutable'):
+        # 文件名包含内容哈希，内容变化即换名，可永久缓存
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    else:
+        # 页面地址固定，每次通过ETag协商，未变化时返回304
+        response.headers['Cache-Control'] = 'no-cache'
+    response.set_etag(etag)
+    return response.make_conditional(request)
+
+
+def send_page(name: str):
+    """发送HTML页面，优先使用构建后的版本"""
+    entry = asset_manifest.page(name)
+    if entry is not None:
+        return send_built_asset(entry)
+    return send_from_directory(STATIC_DIR, name)
+
+
 @app.route('/')
 def index():
     """返回主页面"""
-    from flask import send_from_directory
-    import os
     # 检查用户是否登录
     if 'user_id' not in session:
         # 未登录，重定向到登录页
-        return send_from_directory(app.static_folder, 'login.html')
+        return send_page('login.html')
     
-    index_path = os.path.join(app.static_folder, 'index.html')
-    if os.path.exists(index_path):
-        return send_from_directory(app.static_folder, 'index.html')
+    if (STATIC_DIR / 'index.html').exists():
+        return send_page('index.html')
     else:
         return "前端文件未找到，请确保static/index.html存在", 404
 
@@ -96,15 +595,17 @@ def index():
 @app.route('/login')
 def login_page():
     """返回登录页面"""
-    from flask import send_from_directory
-    return send_from_directory(app.static_folder, 'login.html')
+    return send_page('login.html')
 
 
 @app.route('/static/<path:filename>')
 def static_files(filename):
     """提供静态文件"""
-    from flask import send_from_directory
-    return send_from_directory(app.static_folder, filename)
+    if filename.startswith('dist/'):
+        entry = asset_manifest.dist_file(filename[len('dist/'):])
+        if entry is not None:
+            return send_built_asset(entry)
+    return send_from_directory(STATIC_DIR, filename)
 
 
 @app.route('/api/health', methods=['GET'])
@@ -116,7 +617,227 @@ def health():
     })
 
 
+@app.route('/api/metrics/http-pool', methods=['GET'])
+@admin_required
+def http_pool_metrics():
+    """模型API连接复用统计"""
+    if model_manager is None:
+        return jsonify({
+            "success": False,
+            "error": "服务未初始化"
+        }), 503
+    return jsonify({
+        "success": True,
+        "data": model_manager.connection_stats()
+    })
+
+
+@app.route('/api/metrics/upstreams', methods=['GET'])
+@admin_required
+def upstream_metrics():
+    """各提供方每组API密钥/接口地址的请求量、进行中请求数和剔除状态"""
+    return jsonify({
+        "success": True,
+        "data": model_manager.upstream_stats() if model_manager else {}
+    })
+
+
+@app.route('/api/metrics/prompt-cache', methods=['GET'])
+@admin_required
+def prompt_cache_metrics():
+    """提示词模板指纹及各模型的前缀缓存命中统计"""
+    return jsonify({
+        "success": True,
+        "data": {
+            "template_version": PromptTemplates.TEMPLATE_VERSION,
+            "template_fingerprint": PromptTemplates.fingerprint(),
+            "prefix_fingerprints": PromptTemplates.fingerprints(),
+            "usage": model_manager.cache_stats.snapshot() if model_manager else {}
+        }
+    })
+
+
+@app.route('/api/metrics/pipeline', methods=['GET'])
+@admin_required
+def pipeline_metrics():
+    """自适应流程各步骤的跳过率、输出相似度、估算节省的耗时及本地摘要统计（当前进程）"""
+    return jsonify({
+        "success": True,
+        "data": dict(optimizer_core.early_exit.snapshot(),
+                     summarizer=optimizer_core.summarizer.snapshot()) if optimizer_core else {}
+    })
+
+
+@app.route('/api/usage', methods=['GET'])
+def token_usage():
+    """token用量统计（读取按日汇总表）
+    
+    参数：days（默认30，最多366）、group_by（逗号分隔，可选 day/provider/stage/user）、
+    scope=all（仅管理员，统计全部用户）
+    """
+    if not session.get('user_id'):
+        return jsonify({
+            "success": False,
+            "error": "未登录"
+        }), 401
+    if usage_dao is None:
+        return jsonify({
+            "success": False,
+            "error": "服务未初始化"
+        }), 503
+    
+    all_users = request.args.get('scope') == 'all'
+    if all_users and not is_admin():
+        return jsonify({
+            "success": False,
+            "error": "无权查看全部用户的用量"
+        }), 403
+    days = min(max(request.args.get('days', 30, type=int), 1), 366)
+    group_by = tuple(item for item in request.args.get('group_by', 'day,provider').split(',') if item)
+    try:
+        rows = usage_dao.summary(days=days, user_id=None if all_users else session['user_id'],
+                                 group_by=group_by)
+    except ValueError as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 400
+    return jsonify({
+        "success": True,
+        "data": rows,
+        "days": days,
+        "group_by": list(group_by),
+        # 仍在内存缓冲中、尚未写入汇总表的条数
+        "pending": usage_ledger.snapshot()["pending"] if usage_ledger else 0
+    })
+
+
+@app.route('/api/metrics/persist-writer', methods=['GET'])
+@admin_required
+def persist_writer_metrics():
+    """优化结果后台写入队列的积压和失败统计（当前进程）"""
+    return jsonify({
+        "success": True,
+        "data": persist_writer.snapshot() if persist_writer else {}
+    })
+
+
+@app.route('/api/admin/profiling', methods=['GET'])
+@admin_required
+def profiling_status():
+    """性能剖析的布置状态和已采集的剖析列表"""
+    if request_profiler is None:
+        return jsonify({
+            "success": False,
+            "error": "性能剖析未启用"
+        }), 503
+    return jsonify({
+        "success": True,
+        "data": dict(request_profiler.status(), profiles=request_profiler.list_profiles())
+    })
+
+
+@app.route('/api/admin/profiling', methods=['POST'])
+@admin_required
+def arm_profiling():
+    """布置性能剖析
+    
+    参数：endpoint（Flask视图名如 optimize、请求路径如 /api/sessions，或 *）、
+    count（剖析请求数，默认10）、rate（可选，抽样比例0~1）、kinds（默认 wall,cpu,alloc）、
+    duration（布置有效秒数）、interval_ms（采样间隔毫秒）
+    """
+    if request_profiler is None:
+        return jsonify({
+            "success": False,
+            "error": "性能剖析未启用"
+        }), 503
+    data = request.json or {}
+    kinds = data.get('kinds') or PROFILE_KINDS
+    if isinstance(kinds, str):
+        kinds = kinds.split(',')
+    try:
+        arm = request_profiler.arm(
+            data.get('endpoint', ''),
+            count=int(data.get('count', 10)),
+            rate=float(data['rate']) if data.get('rate') is not None else None,
+            kinds=kinds,
+            duration=float(data['duration']) if data.get('duration') else None,
+            interval_ms=float(data['interval_ms']) if data.get('interval_ms') else None
+        )
+    except (TypeError, ValueError) as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 400
+    return jsonify({
+        "success": True,
+        "data": arm
+    })
+
+
+@app.route('/api/admin/profiling', methods=['DELETE'])
+@admin_required
+def disarm_profiling():
+    """取消布置的性能剖析（已采集的结果保留）"""
+    if request_profiler is not None:
+        request_profiler.disarm()
+    return jsonify({
+        "success": True
+    })
+
+
+@app.route('/api/admin/profiling/<profile_id>/<kind>', methods=['GET'])
+@admin_required
+def download_profile(profile_id, kind):
+    """下载折叠栈（wall/cpu单位为微秒，alloc单位为字节）；profile_id为布置ID时合并该次布置的全部剖析"""
+    content = request_profiler.collapsed(profile_id, kind) if request_profiler else None
+    if content is None:
+        return jsonify({
+            "success": False,
+            "error": "剖析结果不存在"
+        }), 404
+    return Response(content, mimetype='text/plain', headers={
+        'Content-Disposition': f'attachment; filename="{profile_id}.{kind}.folded"'
+    })
+
+
+@app.route('/api/metrics/text-compression', methods=['GET'])
+@admin_required
+def text_compression_metrics():
+    """大文本字段压缩的压缩率和CPU耗时统计（当前进程）"""
+    return jsonify({
+        "success": True,
+        "data": text_compressor.snapshot() if text_compressor else {}
+    })
+
+
+@app.route('/api/optimize/queue', methods=['GET'])
+def optimize_queue_status():
+    """当前用户排队中的请求：位置和预计等待秒数（客户端在等待期间轮询）"""
+    if pipeline_scheduler is None:
+        return jsonify({
+            "success": True,
+            "data": []
+        })
+    user_key = session.get('user_id') or f"ip:{request.remote_addr}"
+    return jsonify({
+        "success": True,
+        "data": pipeline_scheduler.queue_status(user_key)
+    })
+
+
+@app.route('/api/metrics/scheduler', methods=['GET'])
+@admin_required
+def scheduler_metrics():
+    """调度器的槽位占用、排队数和等待时间统计（当前进程；共享模式下槽位为所有worker合计）"""
+    return jsonify({
+        "success": True,
+        "data": pipeline_scheduler.snapshot() if pipeline_scheduler else {}
+    })
+
+
 @app.route('/api/optimize', methods=['POST'])
+@track_inflight
 def optimize():
     """优化提示词"""
     if optimizer_core is None:
@@ -135,7 +856,9 @@ def optimize():
         conversation_history = data.get('conversation_history', [])
         
         if logger:
-            logger.info(f"收到优化请求 - 用户文本长度: {len(user_text)}, 历史对话数: {len(conversation_history)}")
+            logger.info("收到优化请求 - 用户文本长度: %s, 历史对话数: %s", len(user_text), len(conversation_history),
+                        event="optimize_received",
+                        sizes={"user_text": len(user_text), "history_turns": len(conversation_history)})
         
         # 验证输入
         if not user_text and not conversation_history:
@@ -157,49 +880,104 @@ def optimize():
                 "error": "对话历史过多，请控制50个对话以内"
             }), 400
         
+        # format=delta 时后续步骤以相对上一步的增量返回（可选，默认返回全文）
+        response_format = 'delta' if data.get('format') == 'delta' else 'full'
+        
+        # adaptive 允许跳过预计没有改进的后续步骤（未传入时取配置默认值）
+        try:
+            adaptive = parse_bool_param(data.get('adaptive'), config.adaptive_pipeline_enabled)
+        except ValueError:
+            return jsonify({
+                "success": False,
+                "error": "adaptive参数应为true或false"
+            }), 400
+        
+        # 传入session_id时由服务端保存本轮对话和结果（需要有初始需求，与前端原有逻辑一致）
+        persist_session_id = None
+        name_session = False
+        if data.get('session_id') and data.get('persist', True) and user_text:
+            owned = session_dao.get_session(data['session_id']) if session.get('user_id') else None
+            if not owned or owned['user_id'] != session['user_id']:
+                return jsonify({
+                    "success": False,
+                    "error": "会话不存在"
+                }), 404
+            persist_session_id = owned['id']
+            # 仍为默认名称的会话在首次由服务端保存后自动命名
+            name_session = owned['session_name'] == '新会话'
+        
+        # 近似重复检测：仅针对无对话历史的单次需求
+        # offer的响应不含优化结果，只在客户端明确要求时使用，不作为默认模式
+        dedup_mode = data.get('dedup_mode')
+        if dedup_mode is None and config.similarity_default_mode != 'offer':
+            dedup_mode = config.similarity_default_mode
+        if dedup_mode in ('offer', 'reuse') and not conversation_history and session.get('user_id'):
+            try:
+                match, stored = find_similar_result(user_text, session['user_id'])
+            except Exception as e:
+                match, stored = None, None
+                if logger:
+                    logger.warning("相似结果查询失败: %s", e)
+            if match:
+                if logger:
+                    logger.info("命中相似需求 - 结果ID: %s, 相似度: %s, 模式: %s",
+                                match['result_id'], match['similarity'], dedup_mode, event="similar_hit")
+                if dedup_mode == 'reuse':
+                    results = {
+                        "deepseek": stored.get('deepseek_result') or '',
+                        "kimi": stored.get('kimi_result') or '',
+                        "qwen": stored.get('qwen_result') or ''
+                    }
+                    payload = {
+                        "success": True,
+                        "data": format_optimize_results(results, response_format),
+                        "format": response_format,
+                        "reused_from": match
+                    }
+                    if persist_session_id is not None:
+                        payload["persisted"] = persist_optimize_turn(
+                            session['user_id'], persist_session_id, user_text, results, name_session
+                        )
+                    return jsonify(payload)
+                return jsonify({
+                    "success": True,
+                    "data": None,
+                    "similar": dict(match, preview=(stored.get('qwen_result') or '')[:200])
+                })
+        
         # 构建输入上下文
         input_context, has_history = optimizer_core.build_input_context(
             user_text,
             conversation_history
         )
         
-        # 执行三步优化
-        results = {}
-        
-        # Step 1: DeepSeek
-        if logger:
-            logger.info("开始Step 1: DeepSeek优化")
-        results['deepseek'] = optimizer_core.optimize_step1_deepseek(input_context, has_history)
-        if logger:
-            logger.debug(f"DeepSeek优化完成，结果长度: {len(results['deepseek'])}")
+        # 执行三步优化（经调度器排队，按用户公平分配执行槽位）
+        cost = 1 + min(len(input_context) / 8000, 3)
+        with acquire_pipeline_slot(cost, data.get('priority')) as ticket:
+            results = run_optimize_pipeline(input_context, has_history, adaptive)
         
-        # Step 2: Kimi
-        if logger:
-            logger.info("开始Step 2: Kimi优化")
-        results['kimi'] = optimizer_core.optimize_step2_kimi(
-            input_context, results['deepseek'], has_history
-        )
-        if logger:
-            logger.debug(f"Kimi优化完成，结果长度: {len(results['kimi'])}")
-        
-        # Step 3: Qwen
-        if logger:
-            logger.info("开始Step 3: Qwen优化")
-        results['qwen'] = optimizer_core.optimize_step3_qwen(
-            input_context, results['deepseek'], results['kimi'], has_history
-        )
-        if logger:
-            logger.debug(f"Qwen优化完成，结果长度: {len(results['qwen'])}")
-            logger.info("三步优化流程全部完成")
-        
-        return jsonify({
+        payload = {
             "success": True,
-            "data": results
-        })
+            "data": format_optimize_results(results, response_format),
+            "format": response_format
+        }
+        if g.skipped_stages:
+            payload["skipped_stages"] = g.skipped_stages
+        if persist_session_id is not None:
+            payload["persisted"] = persist_optimize_turn(
+                session['user_id'], persist_session_id, user_text, results, name_session
+            )
+        response = jsonify(payload)
+        if ticket is not None:
+            response.headers['X-Queue-Wait-Ms'] = str(round(ticket.wait_seconds * 1000))
+            response.headers['X-Queue-Position'] = str(ticket.position_at_enqueue)
+        return response
         
+    except SchedulerRejected as e:
+        return scheduler_rejected_response(e)
     except Exception as e:
         if logger:
-            logger.error(f"优化失败: {e}", exc_info=True)
+            logger.error("优化失败: %s", e, exc_info=True)
         return jsonify({
             "success": False,
             "error": f"优化失败: {str(e)}"
@@ -207,6 +985,7 @@ def optimize():
 
 
 @app.route('/api/summarize', methods=['POST'])
+@track_inflight
 def summarize():
     """总结长文本"""
     if optimizer_core is None:
@@ -235,7 +1014,8 @@ def summarize():
                 "error": "内容较短，无需总结"
             }), 400
         
-        summary = optimizer_core.summarize_text(content)
+        with acquire_pipeline_slot(1.0, data.get('priority')):
+            summary = optimizer_core.summarize_text(content)
         
         return jsonify({
             "success": True,
@@ -246,9 +1026,11 @@ def summarize():
             }
         })
         
+    except SchedulerRejected as e:
+        return scheduler_rejected_response(e)
     except Exception as e:
         if logger:
-            logger.error(f"总结失败: {e}", exc_info=True)
+            logger.error("总结失败: %s", e, exc_info=True)
         return jsonify({
             "success": False,
             "error": str(e)
@@ -268,7 +1050,7 @@ def register():
         password = data.get('password', '').strip()
         
         if logger:
-            logger.info(f"用户注册请求 - 用户名: {username}")
+            logger.info("用户注册请求 - 用户名: %s", username)
         
         if not username or not password:
             return jsonify({
@@ -286,16 +1068,16 @@ def register():
                 None
             )
             if logger:
-                logger.info(f"用户注册成功 - 用户ID: {result['user_id']}, 用户名: {username}, 默认会话ID: {session_id}")
+                logger.info("用户注册成功 - 用户ID: %s, 用户名: %s, 默认会话ID: %s", result['user_id'], username, session_id)
             return jsonify(result)
         else:
             if logger:
-                logger.warning(f"用户注册失败 - 用户名: {username}, 原因: {result.get('error', 'Unknown')}")
+                logger.warning("用户注册失败 - 用户名: %s, 原因: %s", username, result.get('error', 'Unknown'))
             return jsonify(result), 400
             
     except Exception as e:
         if logger:
-            logger.error(f"注册失败: {e}", exc_info=True)
+            logger.error("注册失败: %s", e, exc_info=True)
         return jsonify({
             "success": False,
             "error": str(e)
@@ -311,7 +1093,7 @@ def login():
         password = data.get('password', '').strip()
         
         if logger:
-            logger.info(f"用户登录请求 - 用户名: {username}")
+            logger.info("用户登录请求 - 用户名: %s", username)
         
         if not username or not password:
             return jsonify({
@@ -325,16 +1107,16 @@ def login():
             session['user_id'] = result['user_id']
             session['username'] = result['username']
             if logger:
-                logger.info(f"用户登录成功 - 用户ID: {result['user_id']}, 用户名: {username}")
+                logger.info("用户登录成功 - 用户ID: %s, 用户名: %s", result['user_id'], username)
             return jsonify(result)
         else:
             if logger:
-                logger.warning(f"用户登录失败 - 用户名: {username}")
+                logger.warning("用户登录失败 - 用户名: %s", username)
             return jsonify(result), 401
             
     except Exception as e:
         if logger:
-            logger.error(f"登录失败: {e}", exc_info=True)
+            logger.error("登录失败: %s", e, exc_info=True)
         return jsonify({
             "success": False,
             "error": str(e)
@@ -346,7 +1128,7 @@ def logout():
     """用户登出"""
     username = session.get('username', 'Unknown')
     if logger:
-        logger.info(f"用户登出 - 用户名: {username}")
+        logger.info("用户登出 - 用户名: %s", username)
     session.clear()
     return jsonify({
         "success": True,
@@ -387,17 +1169,42 @@ def get_sessions():
     
     try:
         if logger:
-            logger.debug(f"获取会话列表 - 用户ID: {user_id}")
+            logger.debug("获取会话列表 - 用户ID: %s", user_id, event="session_list_fetched")
         sessions = session_dao.get_user_sessions(user_id)
         if logger:
-            logger.debug(f"会话列表获取成功 - 数量: {len(sessions)}")
+            logger.debug("会话列表获取成功 - 数量: %s", len(sessions),
+                         event="session_list_fetched", sizes={"sessions": len(sessions)})
         return jsonify({
             "success": True,
             "data": sessions
         })
     except Exception as e:
         if logger:
-            logger.error(f"获取会话列表失败: {e}", exc_info=True)
+            logger.error("获取会话列表失败: %s", e, exc_info=True)
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+
+@app.route('/api/stats', methods=['GET'])
+def get_user_stats():
+    """获取当前用户的会话数、对话数和优化结果数"""
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({
+            "success": False,
+            "error": "未登录"
+        }), 401
+    
+    try:
+        return jsonify({
+            "success": True,
+            "data": stats_dao.get_user_stats(user_id)
+        })
+    except Exception as e:
+        if logger:
+            logger.error("获取用户统计失败: %s", e, exc_info=True)
         return jsonify({
             "success": False,
             "error": str(e)
@@ -419,7 +1226,7 @@ def create_session_api():
         initial_requirement = data.get('initial_requirement', '')
         
         if logger:
-            logger.info(f"创建新会话 - 用户ID: {user_id}, 初始需求长度: {len(initial_requirement)}")
+            logger.info("创建新会话 - 用户ID: %s, 初始需求长度: %s", user_id, len(initial_requirement))
         
         # 如果有初始需求，则生成会话名称；否则使用默认名称
         if initial_requirement and len(initial_requirement.strip()) > 0:
@@ -430,14 +1237,17 @@ def create_session_api():
 {initial_requirement[:200]}"""
                 
                 from langchain_core.messages import HumanMessage
-                response = model_manager.deepseek_chain.invoke([HumanMessage(content=summary_prompt)])
-                session_name = response.content.strip()
+                response = model_manager.invoke_with_retry(
+                    None, [HumanMessage(content=summary_prompt)], "DeepSeek (会话命名)",
+                    max_retries=2, provider="deepseek"
+                )
+                session_name = response.strip()
                 # 限制长度
                 if len(session_name) > 15:
                     session_name = session_name[:15]
             except Exception as e:
                 if logger:
-                    logger.warning(f"生成会话名称失败: {e}")
+                    logger.warning("生成会话名称失败: %s", e)
                 session_name = '新会话'
         else:
             session_name = '新会话'
@@ -449,7 +1259,7 @@ def create_session_api():
         )
         
         if logger:
-            logger.info(f"会话创建成功 - 会话ID: {session_id}, 会话名称: {session_name}")
+            logger.info("会话创建成功 - 会话ID: %s, 会话名称: %s", session_id, session_name)
         
         return jsonify({
             "success": True,
@@ -458,7 +1268,7 @@ def create_session_api():
         })
     except Exception as e:
         if logger:
-            logger.error(f"创建会话失败: {e}", exc_info=True)
+            logger.error("创建会话失败: %s", e, exc_info=True)
         return jsonify({
             "success": False,
             "error": str(e)
@@ -477,7 +1287,7 @@ def delete_session_api(session_id):
     
     try:
         if logger:
-            logger.info(f"删除会话 - 用户ID: {user_id}, 会话ID: {session_id}")
+            logger.info("删除会话 - 用户ID: %s, 会话ID: %s", user_id, session_id)
         session_dao.delete_session(session_id)
         return jsonify({
             "success": True,
@@ -485,7 +1295,7 @@ def delete_session_api(session_id):
         })
     except Exception as e:
         if logger:
-            logger.error(f"删除会话失败: {e}", exc_info=True)
+            logger.error("删除会话失败: %s", e, exc_info=True)
         return jsonify({
             "success": False,
             "error": str(e)
@@ -498,7 +1308,12 @@ def delete_session_api(session_id):
 
 @app.route('/api/conversations/<int:session_id>', methods=['GET'])
 def get_conversations(session_id):
-    """获取会话的所有对话"""
+    """获取会话的对话列表
+    
+    响应带有会话版本的ETag，版本未变化时返回304。
+    since_version：只返回该版本之后新增的对话；其间有删除/清空时返回全量并标记 reset。
+    since_turn：只返回该轮次之后的对话（仅追加场景，历史被清空时返回全量并标记 reset）。
+    """
     user_id = session.get('user_id')
     if not user_id:
         return jsonify({
@@ -507,18 +1322,103 @@ def get_conversations(session_id):
         }), 401
     
     try:
+        owned = session_dao.get_session(session_id)
+        if not owned or owned['user_id'] != user_id:
+            return jsonify({
+                "success": False,
+                "error": "会话不存在"
+            }), 404
+        version = owned.get('version') or 0
+        etag = f"conv-{session_id}-{version}"
+        if request.if_none_match.contains_weak(etag):
+            response = app.response_class(status=304)
+            response.set_etag(etag, weak=True)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        
+        since_version = request.args.get('since_version', type=int)
+        since_turn = request.args.get('since_turn', type=int)
+        # 已归档会话需先经全量读取还原
+        delta_allowed = not owned.get('archived_at')
+        if since_version is not None and delta_allowed and since_version >= (owned.get('reset_version') or 0):
+            conversations = conversation_dao.get_conversations_since(session_id, since_version=since_version)
+            mode = "delta"
+        elif since_version is None and since_turn is not None and delta_allowed \
+                and since_turn <= (owned.get('last_turn') or 0):
+            conversations = conversation_dao.get_conversations_since(session_id, since_turn=since_turn)
+            mode = "delta"
+        else:
+            conversations = conversation_dao.get_session_conversations(session_id)
+            mode = "full"
+        
         if logger:
-            logger.debug(f"获取对话列表 - 会话ID: {session_id}")
-        conversations = conversation_dao.get_session_conversations(session_id)
+            logger.debug("对话列表获取成功 - 会话ID: %s, 模式: %s, 数量: %s", session_id, mode, len(conversations),
+                         event="conversation_list_fetched", sizes={"conversations": len(conversations)})
+        response = jsonify({
+            "success": True,
+            "data": conversations,
+            "version": version,
+            "mode": mode,
+            "reset": mode == "full" and (since_version is not None or since_turn is not None)
+        })
+        response.set_etag(etag, weak=True)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    except Exception as e:
+        if logger:
+            logger.error("获取对话列表失败: %s", e, exc_info=True)
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+
+@app.route('/api/search', methods=['GET'])
+def search():
+    """在当前用户的会话、对话记录和优化结果中全文搜索（已归档会话只匹配会话名称和初始需求）"""
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({
+            "success": False,
+            "error": "未登录"
+        }), 401
+    
+    terms = parse_terms(request.args.get('q', ''))
+    if not terms:
+        return jsonify({
+            "success": False,
+            "error": "搜索词至少需要2个字符"
+        }), 400
+    
+    try:
+        page = max(int(request.args.get('page', 1)), 1)
+        page_size = min(max(int(request.args.get('page_size', 20)), 1), 50)
+    except ValueError:
+        return jsonify({
+            "success": False,
+            "error": "分页参数无效"
+        }), 400
+    
+    try:
+        start_time = time.perf_counter()
+        # 多取一条用于判断是否还有下一页，避免额外的COUNT查询
+        rows = search_dao.search(user_id, build_boolean_query(terms),
+                                 limit=page_size + 1, offset=(page - 1) * page_size)
+        duration_ms = round((time.perf_counter() - start_time) * 1000, 2)
         if logger:
-            logger.debug(f"对话列表获取成功 - 数量: {len(conversations)}")
+            logger.debug("搜索完成 - 用户ID: %s, 关键词: %s, 命中: %s", user_id, terms, len(rows),
+                         event="search", duration_ms=duration_ms)
         return jsonify({
             "success": True,
-            "data": conversations
+            "data": [format_hit(row, terms) for row in rows[:page_size]],
+            "page": page,
+            "page_size": page_size,
+            "has_more": len(rows) > page_size,
+            "terms": terms
         })
     except Exception as e:
         if logger:
-            logger.error(f"获取对话列表失败: {e}", exc_info=True)
+            logger.error("搜索失败: %s", e, exc_info=True)
         return jsonify({
             "success": False,
             "error": str(e)
@@ -559,33 +1459,12 @@ def add_conversation():
         )
         
         if logger:
-            logger.info(f"添加对话记录 - 会话ID: {session_id}, 轮次: {turn_number}, 对话ID: {conversation_id}")
-            logger.debug(f"用户消息长度: {len(user_message)}, AI回复长度: {len(ai_response)}")
+            logger.info("添加对话记录 - 会话ID: %s, 轮次: %s, 对话ID: %s", session_id, turn_number, conversation_id)
+            logger.debug("用户消息长度: %s, AI回复长度: %s", len(user_message), len(ai_response))
         
         # 添加对话后，自动更新会话名称
         try:
-            # 获取会话的所有对话
-            all_conversations = conversation_dao.get_session_conversations(session_id)
-            
-            # 构建对话摘要用于生成会话名称
-            conversation_summary = ""
-            for conv in all_conversations[-3:]:  # 只取最近3轮对话
-                conversation_summary += f"用户: {conv['user_message'][:100]}\n"
-            
-            # 使用DeepSeek生成会话名称
-            summary_prompt = f"""请为以下对话生成一个简短的会话标题，不超过15个字，只返回标题本身，不要其他内容：
-
-{conversation_summary}"""
-            
-            from langchain_core.messages import HumanMessage
-            response = model_manager.deepseek_chain.invoke([HumanMessage(content=summary_prompt)])
-            new_session_name = response.content.strip()
-            # 限制长度
-            if len(new_session_name) > 15:
-                new_session_name = new_session_name[:15]
-            
-            # 更新会话名称
-            session_dao.update_session_name(session_id, new_session_name)
+            new_session_name = generate_session_name(session_id)
             
             return jsonify({
                 "success": True,
@@ -595,7 +1474,7 @@ def add_conversation():
         except Exception as e:
             # 即使更新名称失败，对话也已经添加成功
             if logger:
-                logger.warning(f"更新会话名称失败: {e}")
+                logger.warning("更新会话名称失败: %s", e)
             return jsonify({
                 "success": True,
                 "conversation_id": conversation_id,
@@ -604,7 +1483,7 @@ def add_conversation():
             
     except Exception as e:
         if logger:
-            logger.error(f"添加对话失败: {e}", exc_info=True)
+            logger.error("添加对话失败: %s", e, exc_info=True)
         return jsonify({
             "success": False,
             "error": str(e)
@@ -623,7 +1502,7 @@ def clear_conversations(session_id):
     
     try:
         if logger:
-            logger.info(f"清空对话 - 会话ID: {session_id}")
+            logger.info("清空对话 - 会话ID: %s", session_id)
         conversation_dao.clear_session_conversations(session_id)
         return jsonify({
             "success": True,
@@ -631,7 +1510,7 @@ def clear_conversations(session_id):
         })
     except Exception as e:
         if logger:
-            logger.error(f"清空对话失败: {e}", exc_info=True)
+            logger.error("清空对话失败: %s", e, exc_info=True)
         return jsonify({
             "success": False,
             "error": str(e)
@@ -661,8 +1540,10 @@ def save_optimization_result():
         qwen_result = data.get('qwen_result', '')
         
         if logger:
-            logger.info(f"保存优化结果 - 会话ID: {session_id}")
-            logger.debug(f"原始提示词长度: {len(original_prompt)}, DeepSeek: {len(deepseek_result)}, Kimi: {len(kimi_result)}, Qwen: {len(qwen_result)}")
+            logger.info("保存优化结果 - 会话ID: %s", session_id)
+            logger.debug("原始提示词长度: %s, DeepSeek: %s, Kimi: %s, Qwen: %s", len(original_prompt), len(deepseek_result), len(kimi_result), len(qwen_result),
+                         event="result_save", sizes={"original": len(original_prompt), "deepseek": len(deepseek_result),
+                                                     "kimi": len(kimi_result), "qwen": len(qwen_result)})
         
         if not session_id:
             return jsonify({
@@ -679,7 +1560,15 @@ def save_optimization_result():
         )
         
         if logger:
-            logger.info(f"优化结果保存成功 - 结果ID: {result_id}")
+            logger.info("优化结果保存成功 - 结果ID: %s", result_id)
+        
+        # 增量更新相似度索引
+        if similarity_index is not None and original_prompt:
+            try:
+                similarity_index.add(result_id, original_prompt, user_id, session_id)
+            except Exception as e:
+                if logger:
+                    logger.warning("更新相似度索引失败: %s", e)
         
         return jsonify({
             "success": True,
@@ -687,7 +1576,7 @@ def save_optimization_result():
         })
     except Exception as e:
         if logger:
-            logger.error(f"保存优化结果失败: {e}", exc_info=True)
+            logger.error("保存优化结果失败: %s", e, exc_info=True)
         return jsonify({
             "success": False,
             "error": str(e)
@@ -695,14 +1584,14 @@ def save_optimization_result():
 
 
 if __name__ == '__main__':
-    import os
     try:
         # 初始化服务（关闯debug模式后不需要reloader检查）
-        init_app()
+        create_app()
+        # 开发服务器为单进程；多worker部署请使用 gunicorn -c gunicorn.conf.py
         # 关闯debug模式，避免开发调试信息泄露和性能问题
         app.run(debug=False, host='0.0.0.0', port=5000)
     except Exception as e:
         print(f"启动失败: {e}")
         if logger:
-            logger.critical(f"应用启动失败: {e}", exc_info=True)
+            logger.critical("应用启动失败: %s", e, exc_info=True)
         sys.exit(1)
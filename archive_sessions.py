@@ -0,0 +1,43 @@
+"""冷数据归档脚本：把长期未更新会话的对话和优化结果移入压缩归档表
+
+建议通过cron在业务低峰期定期执行，例如每天凌晨:
+    python archive_sessions.py
+    python archive_sessions.py --days 60 --max-sessions 1000
+    python archive_sessions.py --purge-days 90    # 同时分批清理已删除的旧会话
+"""
+import argparse
+import sys
+from pathlib import Path
+
+# 添加项目根目录到路径
+project_root = Path(__file__).parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from prompt_optimizer.config.settings import Config
+from prompt_optimizer.src.utils.archive import SessionArchiver
+from prompt_optimizer.src.utils.database import Database
+
+config = Config()
+parser = argparse.ArgumentParser(description="归档长期未更新的会话")
+parser.add_argument("--days", type=int, default=config.archive_after_days, help="超过多少天未更新的会话被归档")
+parser.add_argument("--batch-size", type=int, default=config.archive_batch_size, help="每批归档的会话数")
+parser.add_argument("--pause", type=float, default=config.archive_pause, help="批次之间暂停的秒数")
+parser.add_argument("--max-sessions", type=int, default=None, help="本次最多归档的会话数")
+parser.add_argument("--purge-days", type=int, default=None, help="分批删除超过多少天的已删除会话")
+args = parser.parse_args()
+
+archiver = SessionArchiver(Database(pool_size=0), after_days=args.days,
+                           batch_size=args.batch_size, pause=args.pause)
+
+print(f"正在归档超过 {args.days} 天未更新的会话...")
+totals = archiver.run(max_sessions=args.max_sessions)
+ratio = totals["compressed_bytes"] / totals["raw_bytes"] if totals["raw_bytes"] else 0
+print(f"✓ 会话 {totals['sessions']} 个, 对话 {totals['conversations']} 条, 优化结果 {totals['results']} 条")
+print(f"✓ 原始 {totals['raw_bytes'] / 1024:.1f} KiB -> 压缩后 {totals['compressed_bytes'] / 1024:.1f} KiB ({ratio:.1%})")
+
+if args.purge_days is not None:
+    deleted = archiver.purge_inactive(args.purge_days)
+    print(f"✓ 已删除 {deleted} 个超过 {args.purge_days} 天的非活跃会话")
+
+print("\n归档完成！")
@@ -0,0 +1,84 @@
+"""响应压缩基准测试
+
+使用接近真实的中文Markdown负载（/api/optimize 的三段提示词、
+/api/conversations/<id> 的长对话历史），比较不同压缩算法和级别的
+CPU耗时与节省的字节数。
+
+用法:
+    python benchmarks/bench_compression.py [重复次数]
+"""
+import json
+import sys
+import time
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from prompt_optimizer.src.core.prompt_templates import PromptTemplates
+from prompt_optimizer.src.utils.compression import compress_bytes, brotli
+
+
+def build_optimize_payload() -> dict:
+    """模拟 /api/optimize 的响应：三段较长的中文Markdown提示词"""
+    base = PromptTemplates.DEEPSEEK_SYSTEM_WITH_HISTORY
+    return {
+        "success": True,
+        "data": {
+            "deepseek": "# 角色设定\n\n" + base * 2,
+            "kimi": "# 角色设定（完善版）\n\n" + base * 2 + PromptTemplates.KIMI_SYSTEM_WITH_HISTORY,
+            "qwen": "# 最终提示词\n\n" + PromptTemplates.QWEN_SYSTEM_WITH_HISTORY * 3,
+        }
+    }
+
+
+def build_conversations_payload(turns: int = 30) -> dict:
+    """模拟 /api/conversations/<id> 的响应：多轮长对话"""
+    rows = []
+    for i in range(turns):
+        rows.append({
+            "id": i + 1,
+            "session_id": 1,
+            "turn_number": i + 1,
+            "user_message": f"第{i + 1}轮：请根据上面的结果继续调整，重点说明输出格式和约束条件。",
+            "ai_response": PromptTemplates.QWEN_SYSTEM_NO_HISTORY * 2,
+            "created_at": "Mon, 19 Oct 2026 10:00:00 GMT",
+        })
+    return {"success": True, "data": rows}
+
+
+def bench(data: bytes, encoding: str, repeat: int, **kwargs):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        compressed = compress_bytes(data, encoding, **kwargs)
+    elapsed_ms = (time.perf_counter() - start) / repeat * 1000
+    return len(compressed), elapsed_ms
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    payloads = {
+        "optimize": build_optimize_payload(),
+        "conversations": build_conversations_payload(),
+    }
+    variants = [("gzip", {"gzip_level": level}, f"gzip -{level}") for level in (1, 6, 9)]
+    if brotli is not None:
+        variants += [("br", {"brotli_quality": q}, f"br q{q}") for q in (1, 4, 11)]
+
+    for name, payload in payloads.items():
+        for ensure_ascii in (True, False):
+            data = json.dumps(payload, ensure_ascii=ensure_ascii).encode("utf-8")
+            label = "\\u转义" if ensure_ascii else "UTF-8"
+            print(f"\n{name} ({label}) 原始大小: {len(data) / 1024:.1f} KiB")
+            for encoding, kwargs, title in variants:
+                size, ms = bench(data, encoding, repeat, **kwargs)
+                saved = 1 - size / len(data)
+                print(f"  {title:<8} {size / 1024:8.1f} KiB  节省 {saved:6.1%}  CPU {ms:7.3f} ms")
+
+    if brotli is None:
+        print("\n提示: 未安装brotli，仅测试gzip")
+
+
+if __name__ == '__main__':
+    main()
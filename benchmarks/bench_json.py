@@ -0,0 +1,87 @@
+"""JSON序列化基准测试
+
+对比Flask默认JSON提供器与FastJSONProvider在 /api/conversations/<id>
+和 /api/optimize 负载上的编码、解码耗时及输出大小。
+
+用法:
+    python benchmarks/bench_json.py [重复次数]
+"""
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from prompt_optimizer.src.core.prompt_templates import PromptTemplates
+from prompt_optimizer.src.utils.json_provider import FastJSONProvider, orjson
+
+
+def build_conversations_payload(turns: int = 50) -> dict:
+    """模拟DAO返回的对话记录（含datetime和长TEXT字段）"""
+    now = datetime.now()
+    rows = []
+    for i in range(turns):
+        rows.append({
+            "id": i + 1,
+            "session_id": 1,
+            "turn_number": i + 1,
+            "user_message": f"第{i + 1}轮：请继续调整输出格式和约束条件。",
+            "ai_response": PromptTemplates.QWEN_SYSTEM_NO_HISTORY * 2,
+            "created_at": now - timedelta(minutes=turns - i),
+        })
+    return {"success": True, "data": rows}
+
+
+def build_optimize_payload() -> dict:
+    """模拟 /api/optimize 响应"""
+    return {
+        "success": True,
+        "data": {
+            "deepseek": PromptTemplates.DEEPSEEK_SYSTEM_WITH_HISTORY * 2,
+            "kimi": PromptTemplates.KIMI_SYSTEM_WITH_HISTORY * 2,
+            "qwen": PromptTemplates.QWEN_SYSTEM_WITH_HISTORY * 3,
+        }
+    }
+
+
+def bench(provider, payload, repeat: int):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        text = provider.dumps(payload)
+    dumps_ms = (time.perf_counter() - start) / repeat * 1000
+
+    data = text.encode("utf-8")
+    start = time.perf_counter()
+    for _ in range(repeat):
+        provider.loads(data)
+    loads_ms = (time.perf_counter() - start) / repeat * 1000
+    return len(data), dumps_ms, loads_ms
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    app = Flask(__name__)
+    providers = {
+        "Flask默认": DefaultJSONProvider(app),
+        "FastJSON": FastJSONProvider(app),
+    }
+    payloads = {
+        "/api/conversations/<id>": build_conversations_payload(),
+        "/api/optimize": build_optimize_payload(),
+    }
+    print(f"orjson: {'已安装' if orjson is not None else '未安装（使用标准库json）'}")
+    for name, payload in payloads.items():
+        print(f"\n{name}")
+        for title, provider in providers.items():
+            size, dumps_ms, loads_ms = bench(provider, payload, repeat)
+            print(f"  {title:<10} 大小 {size / 1024:8.1f} KiB  编码 {dumps_ms:7.3f} ms  解码 {loads_ms:7.3f} ms")
+
+
+if __name__ == '__main__':
+    main()
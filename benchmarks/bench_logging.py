@@ -0,0 +1,88 @@
+"""日志开销基准测试
+
+对比同步写入（原实现：请求线程直接写终端和轮转文件）与队列化日志
+（请求线程只入队，后台线程写出）在单次请求中的日志耗时。
+
+用法:
+    python benchmarks/bench_logging.py [请求数]
+"""
+import logging
+import os
+import sys
+import tempfile
+import time
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from prompt_optimizer.src.utils.logger import Logger
+
+
+def simulate_request(log, user_text: str, results: dict):
+    """模拟一次 /api/optimize 请求中的日志调用"""
+    log.info("收到优化请求 - 用户文本长度: %s, 历史对话数: %s", len(user_text), 3)
+    for name in ("DeepSeek", "Kimi", "Qwen"):
+        log.info("开始%s优化", name)
+        log.debug("调用%s模型 (尝试 %d/%d)", name, 1, 3)
+        log.info("%s模型调用成功，耗时 %.2f秒", name, 1.23)
+        log.debug("%s优化完成，结果长度: %s", name, len(results[name]))
+    log.info("三步优化流程全部完成")
+
+
+def build_sync_logger(log_file: Path, stream) -> logging.Logger:
+    """构建与原实现一致的同步日志器"""
+    sync_logger = logging.getLogger("PromptOptimizer.sync_bench")
+    sync_logger.setLevel(logging.DEBUG)
+    sync_logger.propagate = False
+    console_handler = logging.StreamHandler(stream)
+    console_handler.setFormatter(logging.Formatter(
+        '%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    file_handler = RotatingFileHandler(log_file, maxBytes=10*1024*1024,
+                                       backupCount=5, encoding='utf-8')
+    file_handler.setFormatter(logging.Formatter(
+        '%(asctime)s - %(name)s - %(levelname)s - %(funcName)s:%(lineno)d - %(message)s'))
+    sync_logger.addHandler(console_handler)
+    sync_logger.addHandler(file_handler)
+    return sync_logger
+
+
+def measure(log, requests: int) -> float:
+    """返回单次请求的平均日志耗时（微秒）"""
+    user_text = "请帮我写一个能够自动生成代码注释的工具" * 10
+    results = {name: "优化后的提示词" * 300 for name in ("DeepSeek", "Kimi", "Qwen")}
+    start = time.perf_counter()
+    for _ in range(requests):
+        simulate_request(log, user_text, results)
+    return (time.perf_counter() - start) / requests * 1e6
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    real_stdout = sys.stdout
+
+    with tempfile.TemporaryDirectory() as tmp_dir, open(os.devnull, 'w', encoding='utf-8') as devnull:
+        sys.stdout = devnull
+        try:
+            sync_logger = build_sync_logger(Path(tmp_dir) / "sync.log", devnull)
+            sync_us = measure(sync_logger, requests)
+
+            queued = Logger(Path(tmp_dir) / "queued.log")
+            queued_us = measure(queued, requests)
+
+            logging.getLogger("PromptOptimizer").setLevel(logging.INFO)
+            queued_info_us = measure(queued, requests)
+            queued.shutdown()
+        finally:
+            sys.stdout = real_stdout
+
+    print(f"请求数: {requests}")
+    print(f"同步写入（原实现）        : {sync_us:8.1f} µs/请求")
+    print(f"队列化写入（DEBUG）       : {queued_us:8.1f} µs/请求")
+    print(f"队列化写入（INFO，跳过DEBUG）: {queued_info_us:8.1f} µs/请求")
+
+
+if __name__ == '__main__':
+    main()
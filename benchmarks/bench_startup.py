@@ -0,0 +1,76 @@
+"""启动导入耗时基准测试
+
+使用 `python -X importtime` 在独立子进程中导入指定模块，统计总导入耗时
+和耗时最多的模块，可设置预算用于CI中跟踪冷启动回归。
+
+用法:
+    python benchmarks/bench_startup.py [--module prompt_optimizer.app] [--runs 5] [--top 15] [--budget-ms 800]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+project_root = Path(__file__).absolute().parent.parent.parent
+
+
+def run_importtime(module: str) -> Tuple[int, Dict[str, int]]:
+    """在子进程中导入模块，返回 (总耗时微秒, 模块 -> 累计耗时微秒)"""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(project_root), env.get("PYTHONPATH")]))
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, env=env, cwd=str(project_root)
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"导入 {module} 失败:\n{proc.stderr[-2000:]}")
+
+    cumulative: Dict[str, int] = {}
+    total = 0
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, raw_name = line[len("import time:"):].split("|")
+        name = raw_name.strip()
+        cumulative[name] = int(cumulative_us)
+        # 名称前只有一个空格的是顶层导入，其累计耗时之和即为总耗时
+        if not raw_name.startswith("  "):
+            total += int(cumulative_us)
+    return total, cumulative
+
+
+def main():
+    parser = argparse.ArgumentParser(description="统计模块导入耗时")
+    parser.add_argument("--module", default="prompt_optimizer.app")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--budget-ms", type=float, default=None,
+                        help="总导入耗时中位数超过该值时以非零状态退出")
+    args = parser.parse_args()
+
+    totals: List[int] = []
+    last: Dict[str, int] = {}
+    for _ in range(args.runs):
+        total, last = run_importtime(args.module)
+        totals.append(total)
+
+    median_ms = statistics.median(totals) / 1000
+    print(f"模块: {args.module}")
+    print(f"总导入耗时（{args.runs}次中位数）: {median_ms:.1f} ms")
+    print(f"\n累计耗时最多的 {args.top} 个模块（最后一次运行）:")
+    for name, us in sorted(last.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"  {us / 1000:8.1f} ms  {name}")
+
+    heavy = [name for name in ("langchain_openai", "langchain_core", "openai", "mysql.connector") if name in last]
+    print(f"\n已导入的重量级依赖: {', '.join(heavy) if heavy else '无'}")
+
+    if args.budget_ms is not None and median_ms > args.budget_ms:
+        print(f"\n✗ 超出预算 {args.budget_ms:.0f} ms")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,21 @@
+"""静态资源构建脚本：生成带哈希的文件名及gzip/brotli预压缩版本"""
+import sys
+from pathlib import Path
+
+# 添加项目根目录到路径
+project_root = Path(__file__).parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from prompt_optimizer.src.utils.assets import build_assets, brotli
+
+static_dir = Path(__file__).parent / 'static'
+print(f"正在构建静态资源 {static_dir}...")
+
+manifest = build_assets(static_dir)
+for name, entry in manifest.items():
+    print(f"✓ {name} -> dist/{entry['file']} ({', '.join(entry['encodings'])})")
+
+if brotli is None:
+    print("\n提示: 未安装brotli，仅生成了gzip版本（pip install brotli）")
+print("\n静态资源构建完成！")
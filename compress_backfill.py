@@ -0,0 +1,73 @@
+"""大文本字段压缩回填脚本：按主键分批压缩（或解压）已有数据
+
+用法:
+    python compress_backfill.py                  # 压缩尚未压缩的历史数据
+    python compress_backfill.py --decompress     # 全部还原为原文（例如准备关闭压缩时）
+    python compress_backfill.py --batch-size 200 --pause 0.2
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# 添加项目根目录到路径
+project_root = Path(__file__).parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from prompt_optimizer.config.settings import Config
+from prompt_optimizer.src.utils.database import Database, ConversationDAO, OptimizationResultDAO
+from prompt_optimizer.src.utils.text_codec import TextCompressor
+
+TARGETS = {
+    "conversations": ConversationDAO.COMPRESSED_FIELDS,
+    "optimization_results": OptimizationResultDAO.COMPRESSED_FIELDS,
+}
+
+config = Config()
+parser = argparse.ArgumentParser(description="压缩或解压已有的大文本字段")
+parser.add_argument("--decompress", action="store_true", help="把已压缩的数据还原为原文")
+parser.add_argument("--batch-size", type=int, default=500, help="每批处理的行数")
+parser.add_argument("--pause", type=float, default=0.1, help="批次之间暂停的秒数")
+parser.add_argument("--min-size", type=int, default=config.text_compression_min_size, help="压缩阈值（字节）")
+args = parser.parse_args()
+
+db = Database(pool_size=0)
+compressor = TextCompressor(codec=config.text_compression_codec, min_size=args.min_size)
+action = "解压" if args.decompress else "压缩"
+print(f"正在{action}大文本字段（编码: {compressor.codec}, 阈值: {args.min_size} 字节）...")
+
+for table, fields in TARGETS.items():
+    column_list = ", ".join(fields)
+    last_id = 0
+    scanned = updated = 0
+    while True:
+        rows = db.execute_query(
+            f"SELECT id, {column_list} FROM {table} WHERE id > %s ORDER BY id LIMIT %s",
+            (last_id, args.batch_size)
+        )
+        if not rows:
+            break
+        last_id = rows[-1]['id']
+        scanned += len(rows)
+
+        params_list = []
+        for row in rows:
+            if args.decompress:
+                values = [compressor.decode(row[field]) for field in fields]
+            else:
+                values = [compressor.encode(row[field]) for field in fields]
+            if values != [row[field] for field in fields]:
+                params_list.append(tuple(values) + (row['id'],))
+        if params_list:
+            assignments = ", ".join(f"{field} = %s" for field in fields)
+            db.execute_many(f"UPDATE {table} SET {assignments} WHERE id = %s", params_list)
+            updated += len(params_list)
+        time.sleep(args.pause)
+    print(f"✓ {table}: 扫描 {scanned} 行, 更新 {updated} 行")
+
+stats = compressor.snapshot()
+if not args.decompress and stats["raw_bytes"]:
+    print(f"✓ 原始 {stats['raw_bytes'] / 1024:.1f} KiB -> 存储 {stats['stored_bytes'] / 1024:.1f} KiB "
+          f"(压缩率 {stats['ratio']:.1%}, CPU {stats['compress_ms']:.0f} ms)")
+print(f"\n{action}回填完成！")
@@ -1,7 +1,7 @@
 """配置文件管理"""
 import os
 from pathlib import Path
-from typing import Optional
+from typing import Dict, List, Optional
 from dotenv import load_dotenv
 
 
@@ -29,6 +29,18 @@ class Config:
         self.qwen_model: str = "qwen-max"
         self.qwen_api_base: str = "https://dashscope.aliyuncs.com/compatible-mode/v1"
         
+        # 多密钥/多接口地址（逗号分隔，可选）：第i个密钥使用第 i % 地址数 个地址
+        # 未配置时使用上面的单个密钥和默认地址
+        self.deepseek_api_keys: List[str] = self._split_env("DEEPSEEK_API_KEYS") or \
+            [key for key in [self.deepseek_api_key] if key]
+        self.deepseek_api_bases: List[str] = self._split_env("DEEPSEEK_API_BASES") or [self.deepseek_api_base]
+        self.kimi_api_keys: List[str] = self._split_env("KIMI_API_KEYS") or \
+            [key for key in [self.kimi_api_key] if key]
+        self.kimi_api_bases: List[str] = self._split_env("KIMI_API_BASES") or [self.kimi_api_base]
+        self.dashscope_api_keys: List[str] = self._split_env("DASHSCOPE_API_KEYS") or \
+            [key for key in [self.dashscope_api_key] if key]
+        self.qwen_api_bases: List[str] = self._split_env("QWEN_API_BASES") or [self.qwen_api_base]
+        
         # 应用配置
         self.app_name: str = "多AI模型提示词优化工具（支持多轮对话）"
         self.window_size: str = "1200x1000"
@@ -43,31 +55,151 @@ class Config:
         self.log_dir: Path = Path(__file__).parent.parent / "logs"
         self.log_dir.mkdir(parents=True, exist_ok=True)
         self.log_file: Path = self.log_dir / "app.log"
+        # 各处理器的日志级别（DEBUG/INFO/WARNING/ERROR/CRITICAL）
+        self.log_console_level: str = os.getenv("LOG_CONSOLE_LEVEL", "DEBUG")
+        self.log_file_level: str = os.getenv("LOG_FILE_LEVEL", "DEBUG")
+        # 日志格式：text 或 json（结构化字段，便于日志管道解析）
+        self.log_format: str = os.getenv("LOG_FORMAT", "text")
+        # 高频事件的采样比例与每秒限流，格式 "事件=值,事件=值"；WARNING及以上不受影响
+        self.log_sample_rates: str = os.getenv(
+            "LOG_SAMPLE_RATES", "conversation_list_fetched=0.01,session_list_fetched=0.01,model_attempt=0.01"
+        )
+        self.log_rate_limits: str = os.getenv("LOG_RATE_LIMITS", "")
+        
+        # 模型API共享HTTP连接池
+        self.http_max_connections: int = int(os.getenv("HTTP_MAX_CONNECTIONS", 50))
+        self.http_max_keepalive_connections: int = int(os.getenv("HTTP_MAX_KEEPALIVE", 20))
+        self.http_keepalive_expiry: float = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", 60))  # 秒
+        self.http2_enabled: bool = os.getenv("HTTP2_ENABLED", "false").lower() == "true"  # 需安装h2
+        
+        # 是否在启动时预先创建模型客户端（默认首次调用时创建）
+        self.model_warm_up: bool = os.getenv("MODEL_WARM_UP", "false").lower() == "true"
         
         # API调用配置
         self.api_timeout: int = 120  # 秒
         self.api_max_retries: int = 3
         self.api_retry_delay: int = 2  # 秒
         
+        # JSON序列化：使用快速JSON提供器（安装orjson时自动启用orjson）
+        self.fast_json_enabled: bool = os.getenv("FAST_JSON_ENABLED", "true").lower() == "true"
+        
+        # 响应压缩配置（brotli需安装可选依赖brotli）
+        self.compression_enabled: bool = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+        self.compression_min_size: int = int(os.getenv("COMPRESSION_MIN_SIZE", 1024))  # 字节
+        self.compression_gzip_level: int = 6
+        self.compression_brotli_quality: int = 4
+        
+        # 用户记录缓存与登录时间写后缓冲
+        self.user_cache_ttl: int = 30  # 秒，0表示不缓存
+        self.last_login_flush_interval: int = 5  # 秒
+        self.last_login_batch_size: int = 200
+        
+        # /api/optimize 服务端保存结果的后台写入队列长度（写满时同步写入）
+        self.persist_queue_size: int = int(os.getenv("PERSIST_QUEUE_SIZE", 256))
+        
+        # 模型token用量台账（内存缓冲，批量写入明细表和按日汇总表）
+        self.usage_ledger_enabled: bool = os.getenv("USAGE_LEDGER_ENABLED", "true").lower() == "true"
+        self.usage_flush_interval: float = float(os.getenv("USAGE_FLUSH_INTERVAL", 5))  # 秒
+        self.usage_batch_size: int = int(os.getenv("USAGE_BATCH_SIZE", 500))
+        self.usage_max_buffer: int = int(os.getenv("USAGE_MAX_BUFFER", 20000))
+        # 管理员用户ID（逗号分隔），可查看全部用户的用量
+        self.admin_users: set = {
+            item.strip() for item in os.getenv("ADMIN_USERS", "").split(",") if item.strip()
+        }
+        
+        # 近似重复需求检测（基于字符n-gram的MinHash索引）
+        self.similarity_enabled: bool = os.getenv("SIMILARITY_ENABLED", "true").lower() == "true"
+        self.similarity_threshold: float = float(os.getenv("SIMILARITY_THRESHOLD", 0.85))
+        # 请求未指定dedup_mode时的默认模式：off（不检测）/reuse（直接复用）；offer须由请求明确指定
+        self.similarity_default_mode: str = os.getenv("SIMILARITY_DEFAULT_MODE", "off")
+        # 是否允许匹配其他用户的历史结果（默认只匹配本人的结果）
+        self.similarity_cross_user: bool = os.getenv("SIMILARITY_CROSS_USER", "false").lower() == "true"
+        self.similarity_index_file: Path = self.data_dir / "similarity_index.jsonl"
+        
+        # 大文本字段透明压缩（AI回复和三步优化结果；zstd需安装zstandard，否则使用zlib）
+        # 注意：压缩后的字段不再被全文搜索命中
+        self.text_compression_enabled: bool = os.getenv("TEXT_COMPRESSION_ENABLED", "false").lower() == "true"
+        self.text_compression_codec: str = os.getenv("TEXT_COMPRESSION_CODEC", "zstd")
+        self.text_compression_min_size: int = int(os.getenv("TEXT_COMPRESSION_MIN_SIZE", 1024))  # 字节
+        # 优化结果增量存储：Kimi结果存为相对DeepSeek结果的行级增量，Qwen结果相对Kimi结果（读取时自动还原）
+        self.result_delta_storage: bool = os.getenv("RESULT_DELTA_STORAGE", "false").lower() == "true"
+        
+        # 冷数据归档（archive_sessions.py 定期执行，读取时自动还原）
+        self.archive_enabled: bool = os.getenv("ARCHIVE_ENABLED", "true").lower() == "true"
+        self.archive_after_days: int = int(os.getenv("ARCHIVE_AFTER_DAYS", 30))
+        self.archive_batch_size: int = int(os.getenv("ARCHIVE_BATCH_SIZE", 50))  # 每批会话数
+        self.archive_pause: float = float(os.getenv("ARCHIVE_PAUSE", 0.5))  # 批次间暂停秒数
+        
+        # 模型流程调度（执行槽位，按用户公平排队）
+        self.scheduler_enabled: bool = os.getenv("SCHEDULER_ENABLED", "true").lower() == "true"
+        # 槽位和每用户上限在同一台机器的所有worker间共享（锁文件目录）；关闭后按进程分别计算
+        self.scheduler_shared: bool = os.getenv("SCHEDULER_SHARED", "true").lower() == "true"
+        self.scheduler_shared_dir: Path = self.data_dir / "scheduler"
+        self.scheduler_slots: int = int(os.getenv("SCHEDULER_SLOTS", 4))
+        self.scheduler_per_user_limit: int = int(os.getenv("SCHEDULER_PER_USER_LIMIT", 1))
+        self.scheduler_max_queue: int = int(os.getenv("SCHEDULER_MAX_QUEUE", 64))
+        self.scheduler_queue_timeout: float = float(os.getenv("SCHEDULER_QUEUE_TIMEOUT", 120))  # 秒
+        # 使用high优先级的用户ID（逗号分隔）
+        self.scheduler_priority_users: set = {
+            item.strip() for item in os.getenv("SCHEDULER_PRIORITY_USERS", "").split(",") if item.strip()
+        }
+        
+        # 自适应提前结束：后续步骤预计收益不足时跳过（请求可用 "adaptive" 参数覆盖默认值）
+        self.adaptive_pipeline_enabled: bool = os.getenv("ADAPTIVE_PIPELINE_ENABLED", "false").lower() == "true"
+        # 相邻两步输出的相似度不低于该值时视为没有改进
+        self.adaptive_skip_threshold: float = float(os.getenv("ADAPTIVE_SKIP_THRESHOLD", 0.9))
+        # 同一复杂度档位积累的样本数达到该值后才做预测跳过
+        self.adaptive_min_samples: int = int(os.getenv("ADAPTIVE_MIN_SAMPLES", 20))
+        # 满足预测跳过条件时仍执行的比例，用于持续更新统计
+        self.adaptive_explore_rate: float = float(os.getenv("ADAPTIVE_EXPLORE_RATE", 0.1))
+        
+        # 按需性能剖析（管理员通过 /api/admin/profiling 布置，未布置时不采集）
+        self.profiling_enabled: bool = os.getenv("PROFILING_ENABLED", "true").lower() == "true"
+        self.profiling_dir: Path = self.data_dir / "profiles"
+        self.profiling_max_profiles: int = int(os.getenv("PROFILING_MAX_PROFILES", 50))  # 保留的剖析结果数
+        self.profiling_interval_ms: float = float(os.getenv("PROFILING_INTERVAL_MS", 5))  # 默认采样间隔
+        self.profiling_tracemalloc_frames: int = int(os.getenv("PROFILING_TRACEMALLOC_FRAMES", 25))
+        self.profiling_max_duration: float = float(os.getenv("PROFILING_MAX_DURATION", 3600))  # 布置最长有效秒数
+        
         # UI配置
         self.max_display_length: int = 500  # 对话历史显示的最大长度
         self.summary_threshold: int = 2000  # 需要总结的阈值
+        # 超过阈值的AI回复的处理方式：extractive（本地抽取关键句）/ truncate（保留首尾各500字符）
+        self.summary_strategy: str = os.getenv("SUMMARY_STRATEGY", "extractive")
+        self.summary_budget: int = int(os.getenv("SUMMARY_BUDGET", 1000))  # 抽取摘要的字符预算
         
+    @staticmethod
+    def _split_env(name: str) -> List[str]:
+        """读取逗号分隔的环境变量列表"""
+        return [item.strip() for item in os.getenv(name, "").split(",") if item.strip()]
+    
+    def get_upstreams(self, provider: str) -> List[Dict]:
+        """获取模型提供方的全部上游（密钥 + 接口地址）"""
+        keys, bases = {
+            "deepseek": (self.deepseek_api_keys, self.deepseek_api_bases),
+            "kimi": (self.kimi_api_keys, self.kimi_api_bases),
+            "qwen": (self.dashscope_api_keys, self.qwen_api_bases),
+        }[provider]
+        return [
+            {"api_key": key, "api_base": bases[index % len(bases)]}
+            for index, key in enumerate(keys)
+        ]
+    
     def validate_api_keys(self) -> bool:
         """验证API密钥是否都已设置"""
         return all([
-            self.deepseek_api_key,
-            self.kimi_api_key,
-            self.dashscope_api_key
+            self.deepseek_api_keys,
+            self.kimi_api_keys,
+            self.dashscope_api_keys
         ])
     
     def get_missing_keys(self) -> list:
         """获取缺失的API密钥列表"""
         missing = []
-        if not self.deepseek_api_key:
+        if not self.deepseek_api_keys:
             missing.append("DEEPSEEK_API_KEY")
-        if not self.kimi_api_key:
+        if not self.kimi_api_keys:
             missing.append("KIMI_API_KEY")
-        if not self.dashscope_api_key:
+        if not self.dashscope_api_keys:
             missing.append("DASHSCOPE_API_KEY")
         return missing
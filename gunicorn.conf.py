@@ -0,0 +1,65 @@
+"""Gunicorn多worker部署配置
+
+用法（在本文件所在目录执行）:
+    pip install gunicorn
+    gunicorn -c gunicorn.conf.py
+
+worker数量默认等于CPU核数，每个worker使用线程处理并发请求
+（优化流程主要在等待模型API，线程即可覆盖I/O等待）。
+"""
+import multiprocessing
+import os
+import signal
+from pathlib import Path
+
+# 包以 prompt_optimizer 名称导入，需要把项目的上级目录加入路径
+pythonpath = str(Path(__file__).parent.parent)
+wsgi_app = "prompt_optimizer.app:create_app()"
+
+bind = os.getenv("WEB_BIND", "0.0.0.0:5000")
+workers = int(os.getenv("WEB_WORKERS", multiprocessing.cpu_count()))
+worker_class = "gthread"
+threads = int(os.getenv("WEB_THREADS", 8))
+
+# 三步优化流程可能持续数分钟（单次模型调用超时120秒）
+timeout = int(os.getenv("WEB_TIMEOUT", 420))
+graceful_timeout = int(os.getenv("WEB_GRACEFUL_TIMEOUT", 180))
+# worker退出时写出后台队列的最长等待时间
+flush_timeout = 10
+keepalive = 5
+
+# 默认每个worker独立加载应用；设为true时在主进程预加载，由post_worker_init重建进程内资源
+preload_app = os.getenv("WEB_PRELOAD", "false").lower() == "true"
+
+
+def post_worker_init(worker):
+    """worker完成应用加载后：重建数据库连接池和模型HTTP客户端，并在SIGTERM时先进入排空状态"""
+    from prompt_optimizer.app import begin_shutdown, init_worker
+    init_worker()
+
+    # gunicorn没有SIGTERM钩子：在worker自身的处理函数之前标记排空，
+    # 使关闭期间仍被接受的优化请求直接返回503
+    handle_exit = signal.getsignal(signal.SIGTERM)
+
+    def handle_term(signum, frame):
+        begin_shutdown()
+        if callable(handle_exit):
+            handle_exit(signum, frame)
+
+    signal.signal(signal.SIGTERM, handle_term)
+
+
+def worker_int(worker):
+    """worker收到SIGINT/SIGQUIT（快速退出）时同样停止接受新的优化请求"""
+    from prompt_optimizer.app import begin_shutdown
+    begin_shutdown()
+
+
+def worker_exit(server, worker):
+    """worker退出后写出缓冲数据
+
+    进行中的请求已由gthread在graceful_timeout内等待完成（超时的由主进程强制结束），
+    这里只关闭后台写入队列等资源，不再等待请求。
+    """
+    from prompt_optimizer.app import shutdown_app
+    shutdown_app(timeout=flush_timeout)
@@ -1,78 +1,52 @@
-"""数据库初始化脚本"""
-import mysql.connector
+"""数据库初始化与迁移脚本
+
+按版本执行 migrations/ 目录下尚未执行的迁移:
+    python init_db.py              # 执行所有未执行的迁移
+    python init_db.py --status     # 查看各迁移的执行状态
+    python init_db.py --target 3   # 只迁移到指定版本
+    python init_db.py --explain    # 用EXPLAIN检查DAO查询是否命中索引
+"""
+import argparse
+import sys
 from pathlib import Path
-from dotenv import load_dotenv
-import os
 
-load_dotenv()
+# 添加项目根目录到路径
+project_root = Path(__file__).parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from prompt_optimizer.src.utils.database import Database
+from prompt_optimizer.src.utils.migrations import MigrationRunner, explain_dao_queries
 
-#  数据库连接配置
-config = {
-    'host': os.getenv('MYSQL_HOST', 'localhost'),
-    'port': int(os.getenv('MYSQL_PORT', 3306)),
-    'user': os.getenv('MYSQL_USER', 'root'),
-    'password': os.getenv('MYSQL_PASSWORD'),
-    'database': os.getenv('MYSQL_DATABASE', 'prompt')
-}
+parser = argparse.ArgumentParser(description="数据库初始化与迁移")
+parser.add_argument("--status", action="store_true", help="只查看迁移状态")
+parser.add_argument("--target", type=int, default=None, help="迁移到指定版本")
+parser.add_argument("--explain", action="store_true", help="检查DAO查询的执行计划")
+args = parser.parse_args()
 
-print(f"正在连接数据库 {config['database']}...")
+db = Database(pool_size=0)
+print(f"正在连接数据库 {db.config['database']}...")
 
 try:
-    conn = mysql.connector.connect(**config)
-    cursor = conn.cursor()
-    
-    # 读取SQL文件
-    sql_file = Path(__file__).parent / 'init_database.sql'
-    with open(sql_file, 'r', encoding='utf-8') as f:
-        sql_content = f.read()
-    
-    # 分割SQL语句（按照DELIMITER分隔）
-    statements = []
-    current_statement = []
-    delimiter = ';'
-    
-    for line in sql_content.split('\n'):
-        line = line.strip()
-        
-        # 跳过注释和空行
-        if line.startswith('--') or not line:
-            continue
-            
-        # 处理DELIMITER命令
-        if line.startswith('DELIMITER'):
-            delimiter = line.split()[-1]
-            continue
-        
-        current_statement.append(line)
-        
-        # 如果行以当前delimiter结尾，执行语句
-        if line.endswith(delimiter):
-            stmt = ' '.join(current_statement)
-            stmt = stmt.rstrip(delimiter)
-            
-            if stmt.strip():
-                try:
-                    cursor.execute(stmt)
-                    # 消费结果
-                    try:
-                        cursor.fetchall()
-                    except:
-                        pass
-                    print(f"\u2713 执行成功: {stmt[:50]}...")
-                except mysql.connector.Error as e:
-                    print(f"\u2717 执行失败: {stmt[:50]}...")
-                    print(f"  错误: {e}")
-            
-            current_statement = []
-            delimiter = ';'
-    
-    conn.commit()
-    print("\n数据库初始化完成！")
-    
-except mysql.connector.Error as e:
+    runner = MigrationRunner(db)
+    if args.status:
+        for item in runner.status():
+            mark = {"applied": "✓", "pending": "·", "checksum_mismatch": "!"}[item["state"]]
+            print(f"{mark} {item['version']:04d}_{item['name']}  {item['state']}  {item['applied_at'] or ''}")
+    elif not args.explain:
+        executed = runner.migrate(target=args.target)
+        for migration in executed:
+            print(f"✓ 执行成功: {migration.path.name}")
+        print("\n数据库已是最新版本" if not executed else "\n数据库初始化完成！")
+
+    if args.explain:
+        failed = 0
+        for item in explain_dao_queries(db):
+            mark = "✓" if item["ok"] else "✗"
+            failed += 0 if item["ok"] else 1
+            print(f"{mark} {item['query']}: key={item['key']} expected={item['expected']} extra={item['extra']}")
+        if failed:
+            sys.exit(1)
+except Exception as e:
     print(f"数据库错误: {e}")
-finally:
-    if 'cursor' in locals():
-        cursor.close()
-    if 'conn' in locals():
-        conn.close()
+    sys.exit(1)
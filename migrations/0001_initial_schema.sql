@@ -1,5 +1,4 @@
--- 提示词优化工具数据库初始化脚本
-USE prompt;
+-- 初始表结构（与最初的 init_database.sql 一致，已有数据库重复执行无副作用）
 
 -- 1. 用户表
 CREATE TABLE IF NOT EXISTS users (
@@ -38,7 +37,7 @@ CREATE TABLE IF NOT EXISTS conversations (
     INDEX idx_turn_number (turn_number)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
--- 4. 优化结果表
+-- 4. 优化结果表（列名在 0002 中修正）
 CREATE TABLE IF NOT EXISTS optimization_results (
     id INT PRIMARY KEY AUTO_INCREMENT,
     session_id INT NOT NULL,
@@ -51,7 +50,7 @@ CREATE TABLE IF NOT EXISTS optimization_results (
     INDEX idx_created_at (created_at)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
--- 5. 创建视图：用户会话统计
+-- 5. 视图：用户会话统计
 CREATE OR REPLACE VIEW user_session_stats AS
 SELECT 
     u.id AS user_id,
@@ -64,7 +63,9 @@ LEFT JOIN sessions s ON u.id = s.user_id
 LEFT JOIN conversations c ON s.id = c.session_id
 GROUP BY u.id, u.username;
 
--- 6. 创建触发器：自动更新会话名称
+-- 6. 触发器：自动更新会话名称
+DROP TRIGGER IF EXISTS auto_name_session;
+
 DELIMITER $$
 CREATE TRIGGER auto_name_session
 BEFORE INSERT ON sessions
@@ -76,7 +77,9 @@ BEGIN
 END$$
 DELIMITER ;
 
--- 7. 创建存储过程：清理旧会话
+-- 7. 存储过程：清理旧会话
+DROP PROCEDURE IF EXISTS cleanup_old_sessions;
+
 DELIMITER $$
 CREATE PROCEDURE cleanup_old_sessions(IN days_old INT)
 BEGIN
@@ -86,11 +89,9 @@ BEGIN
 END$$
 DELIMITER ;
 
--- 8. 创建事件：每月自动清理90天前的非活跃会话
+-- 8. 事件：每月自动清理90天前的非活跃会话
 CREATE EVENT IF NOT EXISTS monthly_cleanup
 ON SCHEDULE EVERY 1 MONTH
 STARTS (TIMESTAMP(CURRENT_DATE) + INTERVAL 1 MONTH + INTERVAL 3 HOUR)
 DO
     CALL cleanup_old_sessions(90);
-
-SELECT '数据库初始化完成！' AS message;
@@ -0,0 +1,6 @@
+-- 优化结果表与 OptimizationResultDAO 对齐：补充原始需求列，三步输出列改名为 *_result
+ALTER TABLE optimization_results
+    ADD COLUMN original_prompt TEXT AFTER session_id,
+    CHANGE COLUMN deepseek_output deepseek_result TEXT,
+    CHANGE COLUMN kimi_output kimi_result TEXT,
+    CHANGE COLUMN qwen_output qwen_result TEXT;
@@ -0,0 +1,4 @@
+-- 全文索引：ngram分词器支持中文检索（/api/search 使用）
+ALTER TABLE sessions ADD FULLTEXT INDEX ft_session_text (session_name, initial_requirement) WITH PARSER ngram;
+ALTER TABLE conversations ADD FULLTEXT INDEX ft_conversation_text (user_message, ai_response) WITH PARSER ngram;
+ALTER TABLE optimization_results ADD FULLTEXT INDEX ft_result_text (original_prompt, deepseek_result, kimi_result, qwen_result) WITH PARSER ngram;
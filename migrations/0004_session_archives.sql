@@ -0,0 +1,34 @@
+-- 冷数据归档：长期未更新会话的对话和优化结果压缩后移入归档表
+ALTER TABLE sessions ADD COLUMN archived_at TIMESTAMP NULL;
+ALTER TABLE sessions ADD INDEX idx_archive_scan (archived_at, updated_at);
+
+CREATE TABLE IF NOT EXISTS session_archives (
+    session_id INT PRIMARY KEY,
+    user_id INT NOT NULL,
+    conversation_count INT NOT NULL DEFAULT 0,
+    result_count INT NOT NULL DEFAULT 0,
+    codec VARCHAR(16) NOT NULL DEFAULT 'zlib',
+    payload LONGBLOB NOT NULL,
+    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (session_id) REFERENCES sessions(id) ON DELETE CASCADE,
+    INDEX idx_user_id (user_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- 清理旧会话改为分批删除，避免一次级联删除产生长事务和大量锁
+DROP PROCEDURE IF EXISTS cleanup_old_sessions;
+
+DELIMITER $$
+CREATE PROCEDURE cleanup_old_sessions(IN days_old INT)
+BEGIN
+    DECLARE affected INT DEFAULT 1;
+    WHILE affected > 0 DO
+        DELETE FROM sessions 
+        WHERE is_active = FALSE 
+        AND updated_at < DATE_SUB(NOW(), INTERVAL days_old DAY)
+        ORDER BY id
+        LIMIT 500;
+        SET affected = ROW_COUNT();
+        DO SLEEP(0.1);
+    END WHILE;
+END$$
+DELIMITER ;
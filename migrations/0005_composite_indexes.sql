@@ -0,0 +1,18 @@
+-- 按DAO查询建立复合索引，使过滤和排序都由索引完成（无filesort）
+-- 先建新索引再删旧索引，保证外键列始终有可用索引
+
+-- SessionDAO.get_user_sessions: WHERE user_id = ? AND is_active = TRUE ORDER BY updated_at DESC
+ALTER TABLE sessions ADD INDEX idx_user_active_updated (user_id, is_active, updated_at);
+ALTER TABLE sessions DROP INDEX idx_user_id;
+
+-- ConversationDAO.get_session_conversations: WHERE session_id = ? ORDER BY turn_number
+ALTER TABLE conversations ADD INDEX idx_session_turn (session_id, turn_number);
+ALTER TABLE conversations DROP INDEX idx_session_id;
+ALTER TABLE conversations DROP INDEX idx_turn_number;
+
+-- OptimizationResultDAO.get_session_results: WHERE session_id = ? ORDER BY created_at DESC
+ALTER TABLE optimization_results ADD INDEX idx_session_created (session_id, created_at);
+ALTER TABLE optimization_results DROP INDEX idx_session_id;
+
+-- users.username 已有UNIQUE索引，idx_username 重复
+ALTER TABLE users DROP INDEX idx_username;
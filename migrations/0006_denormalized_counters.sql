@@ -0,0 +1,61 @@
+-- 反范式计数：会话的对话数/最后轮次 + 用户统计表，由DAO写入路径在同一事务中维护
+ALTER TABLE sessions ADD COLUMN conversation_count INT NOT NULL DEFAULT 0;
+ALTER TABLE sessions ADD COLUMN last_turn INT NOT NULL DEFAULT 0;
+
+CREATE TABLE IF NOT EXISTS user_stats (
+    user_id INT PRIMARY KEY,
+    total_sessions INT NOT NULL DEFAULT 0,
+    total_conversations INT NOT NULL DEFAULT 0,
+    total_results INT NOT NULL DEFAULT 0,
+    last_activity TIMESTAMP NULL,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- 回填已有数据（已归档会话的对话数取自归档表），显式保留updated_at
+UPDATE sessions s
+LEFT JOIN (
+    SELECT session_id, COUNT(*) AS cnt, MAX(turn_number) AS last_turn
+    FROM conversations GROUP BY session_id
+) c ON c.session_id = s.id
+LEFT JOIN session_archives a ON a.session_id = s.id
+SET s.conversation_count = COALESCE(c.cnt, 0) + COALESCE(a.conversation_count, 0),
+    s.last_turn = COALESCE(c.last_turn, a.conversation_count, 0),
+    s.updated_at = s.updated_at;
+
+INSERT INTO user_stats (user_id, total_sessions, total_conversations, total_results, last_activity)
+SELECT u.id,
+       COALESCE(s.total_sessions, 0),
+       COALESCE(s.total_conversations, 0),
+       COALESCE(r.total_results, 0) + COALESCE(a.archived_results, 0),
+       s.last_activity
+FROM users u
+LEFT JOIN (
+    SELECT user_id, COUNT(*) AS total_sessions, SUM(conversation_count) AS total_conversations,
+           MAX(updated_at) AS last_activity
+    FROM sessions GROUP BY user_id
+) s ON s.user_id = u.id
+LEFT JOIN (
+    SELECT s.user_id, COUNT(*) AS total_results
+    FROM optimization_results r JOIN sessions s ON s.id = r.session_id
+    GROUP BY s.user_id
+) r ON r.user_id = u.id
+LEFT JOIN (
+    SELECT user_id, SUM(result_count) AS archived_results
+    FROM session_archives GROUP BY user_id
+) a ON a.user_id = u.id
+ON DUPLICATE KEY UPDATE
+    total_sessions = VALUES(total_sessions),
+    total_conversations = VALUES(total_conversations),
+    total_results = VALUES(total_results),
+    last_activity = VALUES(last_activity);
+
+-- 统计视图改为读取计数表，查询不再随历史数据增长而变慢
+CREATE OR REPLACE VIEW user_session_stats AS
+SELECT 
+    u.id AS user_id,
+    u.username,
+    COALESCE(us.total_sessions, 0) AS total_sessions,
+    COALESCE(us.total_conversations, 0) AS total_conversations,
+    us.last_activity
+FROM users u
+LEFT JOIN user_stats us ON us.user_id = u.id;
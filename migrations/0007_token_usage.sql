@@ -0,0 +1,31 @@
+-- 模型token用量台账：明细表（批量多行写入）+ 按日预聚合的汇总表（统计查询只读汇总表）
+CREATE TABLE IF NOT EXISTS token_usage (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    user_id INT NULL,
+    request_id VARCHAR(64) NULL,
+    source VARCHAR(64) NULL COMMENT '发起调用的接口，如 optimize / summarize / create_session',
+    stage VARCHAR(64) NOT NULL COMMENT '调用步骤，如 DeepSeek / Kimi / Qwen (总结)',
+    provider VARCHAR(32) NOT NULL,
+    upstream VARCHAR(64) NULL COMMENT '使用的密钥/接口地址，如 deepseek#0',
+    input_tokens INT NOT NULL DEFAULT 0,
+    output_tokens INT NOT NULL DEFAULT 0,
+    cached_tokens INT NOT NULL DEFAULT 0,
+    duration_ms INT NULL,
+    created_at DATETIME NOT NULL,
+    INDEX idx_created (created_at),
+    INDEX idx_user_created (user_id, created_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- 未登录的调用记为 user_id = 0
+CREATE TABLE IF NOT EXISTS token_usage_daily (
+    day DATE NOT NULL,
+    user_id INT NOT NULL DEFAULT 0,
+    provider VARCHAR(32) NOT NULL,
+    stage VARCHAR(64) NOT NULL,
+    calls INT NOT NULL DEFAULT 0,
+    input_tokens BIGINT NOT NULL DEFAULT 0,
+    output_tokens BIGINT NOT NULL DEFAULT 0,
+    cached_tokens BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, user_id, provider, stage),
+    INDEX idx_user_day (user_id, day)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
@@ -0,0 +1,9 @@
+-- 会话版本号：每次写入对话时递增，用作对话列表的ETag并支持增量同步
+-- conversations.version 为该行最后一次写入时的会话版本；
+-- sessions.reset_version 为最近一次删除/清空对话时的版本，早于它的增量请求需要全量重新加载
+ALTER TABLE sessions ADD COLUMN version BIGINT NOT NULL DEFAULT 0;
+ALTER TABLE sessions ADD COLUMN reset_version BIGINT NOT NULL DEFAULT 0;
+ALTER TABLE conversations ADD COLUMN version BIGINT NOT NULL DEFAULT 0;
+
+-- ConversationDAO.get_conversations_since: WHERE session_id = ? AND version > ?
+ALTER TABLE conversations ADD INDEX idx_session_version (session_id, version);
@@ -0,0 +1,3 @@
+-- 记录会话最近一次从归档还原的时间：还原后 after_days 内不再被归档，
+-- 避免读取一次旧会话就触发一轮“还原-归档”（还原不修改updated_at，会话列表顺序不变）
+ALTER TABLE sessions ADD COLUMN rehydrated_at TIMESTAMP NULL;
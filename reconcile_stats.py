@@ -0,0 +1,28 @@
+"""统计计数校正脚本：按用户分批重算会话对话数和用户统计
+
+正常写入由DAO在事务中维护计数；硬删除（purge、cleanup_old_sessions）
+或手工修改数据后计数可能出现偏差，建议与归档任务一起定期执行:
+    python reconcile_stats.py
+    python reconcile_stats.py --batch-size 500 --pause 0.05
+"""
+import argparse
+import sys
+from pathlib import Path
+
+# 添加项目根目录到路径
+project_root = Path(__file__).parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from prompt_optimizer.src.utils.database import Database, StatsDAO
+
+parser = argparse.ArgumentParser(description="重算反范式统计计数")
+parser.add_argument("--batch-size", type=int, default=200, help="每批处理的用户ID数")
+parser.add_argument("--pause", type=float, default=0.1, help="批次之间暂停的秒数")
+args = parser.parse_args()
+
+print("正在校正统计计数...")
+totals = StatsDAO(Database(pool_size=0)).reconcile(batch_size=args.batch_size, pause=args.pause)
+print(f"✓ 检查用户ID范围 {totals['users']} 个")
+print(f"✓ 修正会话计数 {totals['sessions_fixed']} 行, 用户统计变更 {totals['user_stats_changed']} 行")
+print("\n校正完成！")
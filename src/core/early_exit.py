@@ -0,0 +1,125 @@
+"""三步优化流程的自适应提前结束
+
+简单需求经过DeepSeek后，Kimi和Qwen往往只返回几乎相同的提示词，却仍要付出两次模型调用。
+策略根据两类信号决定是否跳过后续步骤：
+- 收敛：上一步相对再上一步几乎没有改动（输出相似度不低于阈值），继续完善的收益很小
+- 预测：按输入复杂度分档统计每一步输出与上一步的相似度（指数移动平均），
+  样本足够且平均相似度不低于阈值时直接跳过；保留一定比例的探索调用，使统计随模型变化持续更新
+跳过率和估算节省的耗时按步骤记录，用于调整阈值。
+"""
+import random
+import threading
+from typing import Dict, Optional
+
+from .similarity import char_ngrams, normalize_text
+
+# 输入复杂度分档；complex档只在收敛时跳过，不做预测跳过
+COMPLEXITY_LEVELS = ("simple", "medium", "complex")
+
+
+def output_similarity(a: str, b: str, ngram: int = 3) -> float:
+    """两段输出的字符n-gram Jaccard相似度（忽略空白和标点）"""
+    grams_a = char_ngrams(normalize_text(a), ngram)
+    grams_b = char_ngrams(normalize_text(b), ngram)
+    if not grams_a and not grams_b:
+        return 1.0
+    return len(grams_a & grams_b) / len(grams_a | grams_b)
+
+
+def input_complexity(input_context: str, has_history: bool) -> str:
+    """按长度、行数和是否有对话历史粗略估计输入复杂度"""
+    if has_history:
+        return "complex"
+    text = (input_context or "").strip()
+    lines = len([line for line in text.splitlines() if line.strip()])
+    if len(text) <= 80 and lines <= 2:
+        return "simple"
+    if len(text) <= 500 and lines <= 10:
+        return "medium"
+    return "complex"
+
+
+class EarlyExitPolicy:
+    """决定是否跳过后续步骤，并统计跳过率和节省的耗时"""
+
+    def __init__(self, threshold: float = 0.9, min_samples: int = 20, explore_rate: float = 0.1,
+                 alpha: float = 0.1, rng: Optional[random.Random] = None):
+        self.threshold = threshold
+        self.min_samples = min_samples
+        self.explore_rate = explore_rate
+        self.alpha = alpha
+        self._rng = rng or random.Random()
+        self._lock = threading.Lock()
+        # (步骤, 复杂度) -> {"samples", "similarity"}
+        self._profiles: Dict[tuple, Dict] = {}
+        # 步骤 -> 运行/跳过次数、平均耗时和估算节省的耗时
+        self._stages: Dict[str, Dict] = {}
+
+    def _stage(self, stage: str) -> Dict:
+        return self._stages.setdefault(stage, {
+            "runs": 0, "skipped_converged": 0, "skipped_predicted": 0,
+            "avg_latency": None, "saved_seconds": 0.0,
+        })
+
+    def skip_reason(self, stage: str, complexity: str,
+                    previous_similarity: Optional[float] = None) -> Optional[str]:
+        """返回跳过原因（converged / predicted），需要执行时返回None
+
+        previous_similarity 为前两步输出之间的相似度（没有时传None）。
+        """
+        if previous_similarity is not None and previous_similarity >= self.threshold:
+            return "converged"
+        if complexity == "complex":
+            return None
+        with self._lock:
+            profile = self._profiles.get((stage, complexity))
+            if not profile or profile["samples"] < self.min_samples or profile["similarity"] < self.threshold:
+                return None
+        if self._rng.random() < self.explore_rate:
+            return None
+        return "predicted"
+
+    def record_run(self, stage: str, complexity: str, similarity: float, duration: float):
+        """记录一次实际执行：该步输出与上一步输出的相似度及耗时"""
+        with self._lock:
+            profile = self._profiles.setdefault((stage, complexity), {"samples": 0, "similarity": similarity})
+            profile["samples"] += 1
+            profile["similarity"] += self.alpha * (similarity - profile["similarity"])
+            stats = self._stage(stage)
+            stats["runs"] += 1
+            if stats["avg_latency"] is None:
+                stats["avg_latency"] = duration
+            else:
+                stats["avg_latency"] += self.alpha * (duration - stats["avg_latency"])
+
+    def record_skip(self, stage: str, reason: str):
+        """记录一次跳过，按该步骤的平均耗时估算节省的时间"""
+        with self._lock:
+            stats = self._stage(stage)
+            stats["skipped_" + reason] += 1
+            stats["saved_seconds"] += stats["avg_latency"] or 0.0
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            stages = {}
+            for stage, stats in self._stages.items():
+                skipped = stats["skipped_converged"] + stats["skipped_predicted"]
+                total = stats["runs"] + skipped
+                item = dict(stats)
+                item["skip_rate"] = round(skipped / total, 4) if total else None
+                item["avg_latency"] = round(stats["avg_latency"], 3) if stats["avg_latency"] is not None else None
+                item["saved_seconds"] = round(stats["saved_seconds"], 1)
+                item["similarity"] = {
+                    complexity: {
+                        "samples": profile["samples"],
+                        "avg": round(profile["similarity"], 4),
+                    }
+                    for (name, complexity), profile in self._profiles.items() if name == stage
+                }
+                stages[stage] = item
+            return {
+                "threshold": self.threshold,
+                "min_samples": self.min_samples,
+                "explore_rate": self.explore_rate,
+                "stages": stages,
+            }
@@ -0,0 +1,219 @@
+"""本地抽取式摘要
+
+对话历史中过长的AI回复原先只保留首尾各500字符，中间（往往正是用户追问的部分）被整段丢弃；
+调用 /api/summarize 又需要一次较慢的付费模型调用。这里在本地按句抽取：
+- 按中文/英文句末标点和换行切句，Markdown标题、列表项各自成句
+- 以字符二元组（中文）和单词（英文）为词项计算TF-IDF，句子之间按余弦相似度构图，
+  用TextRank（幂迭代）打分；安装numpy时向量化计算，否则退化为与全文中心向量的相似度
+- 按分数从高到低选句（跳过与已选句子高度重复的句子）直到字符预算用完，再按原文顺序输出，不连续处用省略号标记
+结果按内容哈希缓存，同一段历史在多轮优化中只计算一次。
+对话历史由客户端提交、长度不受限制，计算规模有上限：超过 max_input 的文本只取首尾各一半，
+句子数超过 max_sentences 时只对首尾的句子打分，词表只保留文档频率最高的 max_terms 个词项。
+"""
+import hashlib
+import math
+import re
+import time
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from ..utils.cache import TTLCache
+
+try:
+    import numpy as np
+except ImportError:  # numpy为可选依赖，缺失时使用纯Python实现
+    np = None
+
+_SENTENCE_PATTERN = re.compile(r"[^。！？!?；;\n]+(?:[。！？!?；;]+[”’」』）)]*)?")
+_WORD_PATTERN = re.compile(r"[a-zA-Z][a-zA-Z0-9_\-]+|\d+(?:\.\d+)?")
+_CJK_PATTERN = re.compile(r"[一-鿿]+")
+
+GAP_MARKER = "……"
+
+
+def split_sentences(text: str) -> List[str]:
+    """按句末标点和换行切句，去掉空白句"""
+    sentences = []
+    for match in _SENTENCE_PATTERN.finditer(text or ""):
+        sentence = match.group().strip()
+        if sentence:
+            sentences.append(sentence)
+    return sentences
+
+
+def sentence_terms(sentence: str) -> List[str]:
+    """句子的词项：中文字符二元组 + 英文单词/数字"""
+    terms = [word.lower() for word in _WORD_PATTERN.findall(sentence)]
+    for run in _CJK_PATTERN.findall(sentence):
+        if len(run) == 1:
+            terms.append(run)
+        else:
+            terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return terms
+
+
+def _textrank_numpy(term_lists: List[List[str]], damping: float, iterations: int,
+                    max_terms: int) -> List[float]:
+    # 只出现在一个句子中的词项不影响句子间的相似度，词表按文档频率截取
+    sentence_counts = Counter(term for terms in term_lists for term in set(terms))
+    vocabulary = {term: index for index, (term, _) in enumerate(sentence_counts.most_common(max_terms))}
+    matrix = np.zeros((len(term_lists), max(len(vocabulary), 1)), dtype=np.float64)
+    for row, terms in enumerate(term_lists):
+        for term, count in Counter(terms).items():
+            column = vocabulary.get(term)
+            if column is not None:
+                matrix[row, column] = count
+    # TF-IDF（平滑IDF）后按行归一化，点积即余弦相似度
+    document_frequency = (matrix > 0).sum(axis=0)
+    idf = np.log((1 + len(term_lists)) / (1 + document_frequency)) + 1
+    matrix *= idf
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    matrix /= norms
+    similarity = matrix @ matrix.T
+    np.fill_diagonal(similarity, 0)
+    # 行归一化为转移矩阵，孤立的句子均匀连接到其他句子
+    out_weight = similarity.sum(axis=1, keepdims=True)
+    transition = np.where(out_weight > 0, similarity / np.where(out_weight > 0, out_weight, 1),
+                          1 / len(term_lists))
+    scores = np.full(len(term_lists), 1 / len(term_lists))
+    for _ in range(iterations):
+        updated = (1 - damping) / len(term_lists) + damping * (transition.T @ scores)
+        if np.abs(updated - scores).sum() < 1e-6:
+            scores = updated
+            break
+        scores = updated
+    return scores.tolist()
+
+
+def _centroid_python(term_lists: List[List[str]]) -> List[float]:
+    document_frequency = Counter(term for terms in term_lists for term in set(terms))
+    total = len(term_lists)
+    vectors = []
+    centroid: Counter = Counter()
+    for terms in term_lists:
+        vector = {
+            term: count * (math.log((1 + total) / (1 + document_frequency[term])) + 1)
+            for term, count in Counter(terms).items()
+        }
+        norm = math.sqrt(sum(value * value for value in vector.values())) or 1
+        vector = {term: value / norm for term, value in vector.items()}
+        vectors.append(vector)
+        centroid.update(vector)
+    return [sum(value * centroid[term] for term, value in vector.items()) for vector in vectors]
+
+
+class ExtractiveSummarizer:
+    """按字符预算抽取关键句，结果按内容哈希缓存"""
+
+    def __init__(self, budget: int = 1000, damping: float = 0.85, iterations: int = 50,
+                 redundancy: float = 0.7, cache_size: int = 512, cache_ttl: float = 3600,
+                 max_input: int = 20000, max_sentences: int = 200, max_terms: int = 2000):
+        self.budget = budget
+        self.max_input = max_input
+        self.max_sentences = max_sentences
+        self.max_terms = max_terms
+        self.redundancy = redundancy
+        self.damping = damping
+        self.iterations = iterations
+        self._cache = TTLCache(ttl=cache_ttl, max_size=cache_size)
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "computed": 0, "compute_ms": 0.0}
+
+    def score(self, sentences: List[str]) -> List[float]:
+        """句子重要性分数；首尾句稍加权（开头通常是结论，结尾通常是总结）"""
+        term_lists = [sentence_terms(sentence) or [sentence] for sentence in sentences]
+        if np is not None:
+            scores = _textrank_numpy(term_lists, self.damping, self.iterations, self.max_terms)
+        else:
+            scores = _centroid_python(term_lists)
+        if scores:
+            top = max(scores) or 1
+            scores = [value / top for value in scores]
+            scores[0] += 0.2
+            scores[-1] += 0.1
+        return scores
+
+    def _candidates(self, text: str) -> Tuple[List[str], List[int]]:
+        """切句并限制计算规模，返回候选句子及其在原文句子中的序号（序号不连续处即省略处）"""
+        if len(text) > self.max_input:
+            half = self.max_input // 2
+            head, tail = split_sentences(text[:half]), split_sentences(text[-half:])
+            sentences = head + tail
+            positions = list(range(len(head))) + list(range(len(head) + 1, len(head) + 1 + len(tail)))
+        else:
+            sentences = split_sentences(text)
+            positions = list(range(len(sentences)))
+        if len(sentences) > self.max_sentences:
+            keep_head = self.max_sentences // 2
+            keep_tail = self.max_sentences - keep_head
+            sentences = sentences[:keep_head] + sentences[-keep_tail:]
+            positions = positions[:keep_head] + positions[-keep_tail:]
+        return sentences, positions
+
+    def _summarize(self, text: str, budget: int) -> str:
+        sentences, positions = self._candidates(text)
+        if len(sentences) <= 1:
+            return text[:budget]
+        scores = self.score(sentences)
+        term_sets = [set(sentence_terms(sentence)) or {sentence} for sentence in sentences]
+        chosen = []
+        used = 0
+        for index in sorted(range(len(sentences)), key=lambda i: scores[i], reverse=True):
+            length = len(sentences[index])
+            if used + length > budget:
+                continue
+            # 与已选句子高度重复的句子不再入选，把预算留给其他内容
+            if any(len(term_sets[index] & term_sets[other]) / len(term_sets[index] | term_sets[other])
+                   >= self.redundancy for other in chosen):
+                continue
+            chosen.append(index)
+            used += length
+        if not chosen:
+            # 单句就超过预算：截取得分最高的句子
+            best = max(range(len(sentences)), key=lambda i: scores[i])
+            return sentences[best][:budget]
+        chosen.sort()
+        parts = []
+        previous = None
+        if positions[chosen[0]] != 0:
+            parts.append(GAP_MARKER)
+        for index in chosen:
+            if previous is not None and positions[index] != positions[previous] + 1:
+                parts.append(GAP_MARKER)
+            parts.append(sentences[index])
+            previous = index
+        if previous != len(sentences) - 1:
+            parts.append(GAP_MARKER)
+        return "\n".join(parts)
+
+    def summarize(self, text: str, budget: Optional[int] = None) -> str:
+        """返回不超过预算（不计省略号）的摘要；原文不超过预算时原样返回"""
+        budget = budget or self.budget
+        if not text or len(text) <= budget:
+            return text
+        key = (hashlib.sha1(text.encode("utf-8")).hexdigest(), budget)
+        with self._lock:
+            self._stats["calls"] += 1
+        cached = self._cache.get(key)
+        if cached is not None:
+            return cached
+        start = time.perf_counter()
+        summary = self._summarize(text, budget)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self._cache.set(key, summary)
+        with self._lock:
+            self._stats["computed"] += 1
+            self._stats["compute_ms"] += elapsed_ms
+        return summary
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["cache_hits"] = stats["calls"] - stats["computed"]
+        stats["avg_ms"] = round(stats["compute_ms"] / stats["computed"], 3) if stats["computed"] else None
+        stats["compute_ms"] = round(stats["compute_ms"], 3)
+        stats["budget"] = self.budget
+        stats["backend"] = "numpy" if np is not None else "python"
+        return stats
@@ -1,14 +1,31 @@
 """核心优化逻辑"""
-from typing import Optional, Dict, Tuple
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
+import time
+from functools import lru_cache
+from typing import Optional, Dict, List, Tuple
 
 from ...config.settings import Config
+from .early_exit import EarlyExitPolicy, input_complexity, output_similarity
+from .extractive import ExtractiveSummarizer
 from .prompt_templates import PromptTemplates
 from ..models.ai_models import AIModelManager
 from ..utils.logger import Logger
 
 
+@lru_cache(maxsize=32)
+def _prompt_template(system_prompt: str, human_prompt: str):
+    """按模板内容缓存ChatPromptTemplate，避免每次请求重复解析
+    
+    模板不绑定模型：invoke_with_retry 每次尝试从上游池选择客户端后再拼接调用链，
+    模型返回的消息保留用量信息（含缓存命中的token数），统计后再取出文本内容。
+    """
+    from langchain_core.prompts import ChatPromptTemplate
+    
+    return ChatPromptTemplate.from_messages([
+        ("system", system_prompt),
+        ("human", human_prompt)
+    ])
+
+
 class PromptOptimizerCore:
     """提示词优化核心逻辑"""
     
@@ -17,6 +34,12 @@ class PromptOptimizerCore:
         self.model_manager = model_manager
         self.logger = logger or Logger()
         self.templates = PromptTemplates()
+        self.early_exit = EarlyExitPolicy(
+            threshold=config.adaptive_skip_threshold,
+            min_samples=config.adaptive_min_samples,
+            explore_rate=config.adaptive_explore_rate
+        )
+        self.summarizer = ExtractiveSummarizer(budget=config.summary_budget)
     
     def format_conversation_history(self, conversation_history: list) -> str:
         """格式化对话历史为字符串，对过长的AI回复进行总结"""
@@ -29,11 +52,11 @@ class PromptOptimizerCore:
         for i, turn in enumerate(conversation_history):
             # 验证数据格式
             if not isinstance(turn, dict):
-                self.logger.warning(f"跳过无效的对话条目（非字典类型）: {turn}")
+                self.logger.warning("跳过无效的对话条目（非字典类型）: %s", turn)
                 continue
             
             if 'user' not in turn or 'ai' not in turn:
-                self.logger.warning(f"跳过无效的对话条目（缺少必要字段）: {turn}")
+                self.logger.warning("跳过无效的对话条目（缺少必要字段）: %s", turn)
                 continue
             
             formatted += f"轮次 {i+1}:\n"
@@ -45,8 +68,12 @@ class PromptOptimizerCore:
                 ai_content = str(ai_content)
             
             if len(ai_content) > self.config.summary_threshold:
-                # 使用简化的总结方法（取前500字符 + 后500字符 + 说明）
-                summary = f"{ai_content[:500]}...\n[中间省略约{len(ai_content)-1000}字符]...\n{ai_content[-500:]}"
+                if self.config.summary_strategy == "extractive":
+                    # 本地抽取关键句（按内容哈希缓存）
+                    summary = self.summarizer.summarize(ai_content)
+                else:
+                    # 使用简化的总结方法（取前500字符 + 后500字符 + 说明）
+                    summary = f"{ai_content[:500]}...\n[中间省略约{len(ai_content)-1000}字符]...\n{ai_content[-500:]}"
                 formatted += f"AI: {summary}\n"
                 formatted += f"(原始回复共{len(ai_content)}字符，已进行摘要处理)\n"
             else:
@@ -83,16 +110,12 @@ class PromptOptimizerCore:
         self.logger.info("开始步骤1: DeepSeek处理")
         
         prompts = self.templates.get_deepseek_prompts(has_history)
-        prompt_template = ChatPromptTemplate.from_messages([
-            ("system", prompts["system"]),
-            ("human", prompts["human"])
-        ])
-        
-        chain = prompt_template | self.model_manager.deepseek_model | StrOutputParser()
+        chain = _prompt_template(prompts["system"], prompts["human"])
         result = self.model_manager.invoke_with_retry(
             chain,
             {"input": input_context},
-            "DeepSeek"
+            "DeepSeek",
+            provider="deepseek"
         )
         
         return result
@@ -102,19 +125,15 @@ class PromptOptimizerCore:
         self.logger.info("开始步骤2: Kimi完善")
         
         prompts = self.templates.get_kimi_prompts(has_history)
-        prompt_template = ChatPromptTemplate.from_messages([
-            ("system", prompts["system"]),
-            ("human", prompts["human"])
-        ])
-        
-        chain = prompt_template | self.model_manager.kimi_model | StrOutputParser()
+        chain = _prompt_template(prompts["system"], prompts["human"])
         result = self.model_manager.invoke_with_retry(
             chain,
             {
                 "input": input_context,
                 "deepseek_output": deepseek_output
             },
-            "Kimi"
+            "Kimi",
+            provider="kimi"
         )
         
         return result
@@ -124,12 +143,7 @@ class PromptOptimizerCore:
         self.logger.info("开始步骤3: Qwen最终完善")
         
         prompts = self.templates.get_qwen_prompts(has_history)
-        prompt_template = ChatPromptTemplate.from_messages([
-            ("system", prompts["system"]),
-            ("human", prompts["human"])
-        ])
-        
-        chain = prompt_template | self.model_manager.qwen_model | StrOutputParser()
+        chain = _prompt_template(prompts["system"], prompts["human"])
         result = self.model_manager.invoke_with_retry(
             chain,
             {
@@ -137,26 +151,69 @@ class PromptOptimizerCore:
                 "deepseek_output": deepseek_output,
                 "kimi_output": kimi_output
             },
-            "Qwen"
+            "Qwen",
+            provider="qwen"
         )
         
         return result
     
+    def run_pipeline(self, input_context: str, has_history: bool,
+                     adaptive: bool = False) -> Tuple[Dict[str, str], List[str]]:
+        """依次执行三步优化，返回 (各模型的结果, 被跳过的步骤)
+        
+        adaptive为True时，后续步骤预计收益不足会被跳过，其结果沿用上一步的输出。
+        即使不跳过也会记录各步输出的相似度，供自适应模式积累统计。
+        """
+        complexity = input_complexity(input_context, has_history)
+        results: Dict[str, str] = {}
+        skipped: List[str] = []
+        
+        self.logger.info("开始Step 1: DeepSeek优化", event="stage_start", stage="deepseek")
+        results['deepseek'] = self.optimize_step1_deepseek(input_context, has_history)
+        self.logger.debug("DeepSeek优化完成，结果长度: %s", len(results['deepseek']),
+                          event="stage_done", stage="deepseek", sizes={"output": len(results['deepseek'])})
+        
+        previous_similarity = None
+        stages = [
+            ("kimi", "Step 2: Kimi", lambda: self.optimize_step2_kimi(
+                input_context, results['deepseek'], has_history)),
+            ("qwen", "Step 3: Qwen", lambda: self.optimize_step3_qwen(
+                input_context, results['deepseek'], results['kimi'], has_history)),
+        ]
+        previous = 'deepseek'
+        for stage, label, run in stages:
+            reason = self.early_exit.skip_reason(stage, complexity, previous_similarity) if adaptive else None
+            if reason:
+                results[stage] = results[previous]
+                skipped.append(stage)
+                self.early_exit.record_skip(stage, reason)
+                self.logger.info("跳过%s（%s），沿用上一步结果", label, reason,
+                                 event="stage_skipped", stage=stage)
+            else:
+                self.logger.info("开始%s优化", label, event="stage_start", stage=stage)
+                start = time.perf_counter()
+                results[stage] = run()
+                duration = time.perf_counter() - start
+                previous_similarity = output_similarity(results[previous], results[stage])
+                self.early_exit.record_run(stage, complexity, previous_similarity, duration)
+                self.logger.debug("%s优化完成，结果长度: %s，与上一步相似度: %.3f", label, len(results[stage]),
+                                  previous_similarity, event="stage_done", stage=stage,
+                                  sizes={"output": len(results[stage])})
+            previous = stage
+        
+        return results, skipped
+    
     def summarize_text(self, content: str) -> str:
         """总结长文本"""
-        self.logger.info(f"开始总结文本，长度: {len(content)}字符")
-        
-        prompt_template = ChatPromptTemplate.from_messages([
-            ("system", self.templates.SUMMARY_SYSTEM),
-            ("human", self.templates.SUMMARY_HUMAN)
-        ])
+        self.logger.info("开始总结文本，长度: %d字符", len(content))
         
-        chain = prompt_template | self.model_manager.qwen_model | StrOutputParser()
+        chain = _prompt_template(self.templates.SUMMARY_SYSTEM, self.templates.SUMMARY_HUMAN)
         result = self.model_manager.invoke_with_retry(
             chain,
             {"content": content},
-            "Qwen (总结)"
+            "Qwen (总结)",
+            provider="qwen"
         )
         
-        self.logger.info(f"总结完成，原长度: {len(content)}字符，现长度: {len(result)}字符")
+        self.logger.info("总结完成，原长度: %d字符，现长度: %d字符", len(content), len(result))
         return result
@@ -1,9 +1,19 @@
 """提示词模板管理"""
+import hashlib
 from typing import Dict
 
 
 class PromptTemplates:
-    """提示词模板管理器"""
+    """提示词模板管理器
+    
+    为了命中模型服务商的前缀缓存（prefix cache），消息按"固定内容在前、
+    可变内容在后"组织：系统提示词完全静态，用户提示词先给出固定指令，
+    再依次拼接本次请求的输入和前序阶段输出。修改任何模板后需要递增
+    TEMPLATE_VERSION，便于按版本观察缓存命中率。
+    """
+    
+    # 模板版本号，模板内容变更时递增
+    TEMPLATE_VERSION = "2"
     
     # DeepSeek系统提示词（有对话历史）
     DEEPSEEK_SYSTEM_WITH_HISTORY = """你是一个专业的提示词工程师，擅长根据用户的多轮对话历史来分析和优化AI提示词。
@@ -48,11 +58,9 @@ class PromptTemplates:
 请将用户的需求转化为更具体、清晰、可执行的AI提示词，确保AI能够准确理解用户意图，降低幻觉率。注意，请以markdown格式输出最终的提示词正文，不要输出这个提示词可以实现什么样的效果之类的描述。"""
     
     # DeepSeek用户提示词（有对话历史）
-    DEEPSEEK_HUMAN_WITH_HISTORY = """请根据以下信息分析和优化提示词：
-
-{input}
+    DEEPSEEK_HUMAN_WITH_HISTORY = """请根据以下对话历史和需求分析和优化提示词，生成一个优化的AI提示词（必须严格遵循用户原意，不能偏离）：
 
-请基于以上对话历史和需求，生成一个优化的AI提示词（必须严格遵循用户原意，不能偏离）："""
+{input}"""
     
     # DeepSeek用户提示词（无对话历史）
     DEEPSEEK_HUMAN_NO_HISTORY = "请将以下自然语言需求转化为AI提示词（必须严格遵循用户原意，不能偏离）：{input}"
@@ -95,14 +103,14 @@ class PromptTemplates:
 请基于DeepSeek的输出结果和用户的原始需求，进一步优化提示词，使其更精确、更完整，确保AI能够充分理解用户需求并降低幻觉率。注意，请以markdown格式输出最终的提示词正文，不要输出这个提示词可以实现什么样的效果之类的描述。"""
     
     # Kimi用户提示词（有对话历史）
-    KIMI_HUMAN_WITH_HISTORY = """原始需求/对话历史：{input}
+    KIMI_HUMAN_WITH_HISTORY = """请基于以下信息完善提示词（必须严格遵循用户原始需求，不能偏离）：
 
-DeepSeek输出：{deepseek_output}
+原始需求/对话历史：{input}
 
-请基于以上信息完善提示词（必须严格遵循用户原始需求，不能偏离）："""
+DeepSeek输出：{deepseek_output}"""
     
     # Kimi用户提示词（无对话历史）
-    KIMI_HUMAN_NO_HISTORY = "原始需求：{input}\n\nDeepSeek输出：{deepseek_output}\n\n请基于以上信息完善提示词（必须严格遵循用户原始需求，不能偏离）："
+    KIMI_HUMAN_NO_HISTORY = "请基于以下信息完善提示词（必须严格遵循用户原始需求，不能偏离）：\n\n原始需求：{input}\n\nDeepSeek输出：{deepseek_output}"
     
     # Qwen系统提示词（有对话历史）
     QWEN_SYSTEM_WITH_HISTORY = """你是一个专业的提示词工程师，擅长在现有提示词基础上进行最终优化和完善，特别擅长根据多轮对话历史来生成最佳的提示词。
@@ -144,16 +152,16 @@ DeepSeek输出：{deepseek_output}
 请基于Kimi的输出结果和用户的原始需求，进行最终的提示词优化，确保提示词清晰、具体、可执行，以最大程度降低AI幻觉率。注意，请以markdown格式输出最终的提示词正文，不要输出这个提示词可以实现什么样的效果之类的描述。"""
     
     # Qwen用户提示词（有对话历史）
-    QWEN_HUMAN_WITH_HISTORY = """原始需求/对话历史：{input}
+    QWEN_HUMAN_WITH_HISTORY = """请基于以下信息进行最终的提示词优化（必须严格遵循用户原始需求，不能偏离）：
 
-DeepSeek输出：{deepseek_output}
+原始需求/对话历史：{input}
 
-Kimi输出：{kimi_output}
+DeepSeek输出：{deepseek_output}
 
-请基于以上信息进行最终的提示词优化（必须严格遵循用户原始需求，不能偏离）："""
+Kimi输出：{kimi_output}"""
     
     # Qwen用户提示词（无对话历史）
-    QWEN_HUMAN_NO_HISTORY = "原始需求：{input}\n\nDeepSeek输出：{deepseek_output}\n\nKimi输出：{kimi_output}\n\n请基于以上信息进行最终的提示词优化（必须严格遵循用户原始需求，不能偏离）："
+    QWEN_HUMAN_NO_HISTORY = "请基于以下信息进行最终的提示词优化（必须严格遵循用户原始需求，不能偏离）：\n\n原始需求：{input}\n\nDeepSeek输出：{deepseek_output}\n\nKimi输出：{kimi_output}"
     
     # 总结提示词
     SUMMARY_SYSTEM = "你是一个专业的文本总结助手。请将用户提供的长文本总结为简洁的要点，保留关键信息和核心内容。"
@@ -200,3 +208,37 @@ Kimi输出：{kimi_output}
                 "system": cls.QWEN_SYSTEM_NO_HISTORY,
                 "human": cls.QWEN_HUMAN_NO_HISTORY
             }
+    
+    @staticmethod
+    def stable_prefix(prompts: Dict[str, str]) -> str:
+        """获取一组模板中每次请求都相同的前缀（系统提示词 + 用户提示词中第一个变量之前的部分）"""
+        human = prompts["human"]
+        if "{" in human:
+            human = human[:human.index("{")]
+        return prompts["system"] + "\n" + human
+    
+    @classmethod
+    def fingerprints(cls) -> Dict[str, str]:
+        """各阶段固定前缀的指纹，用于监控前缀是否保持稳定"""
+        variants = {
+            "deepseek": cls.get_deepseek_prompts,
+            "kimi": cls.get_kimi_prompts,
+            "qwen": cls.get_qwen_prompts,
+        }
+        result = {}
+        for stage, getter in variants.items():
+            for has_history in (True, False):
+                key = f"{stage}_{'history' if has_history else 'no_history'}"
+                prefix = cls.stable_prefix(getter(has_history))
+                result[key] = hashlib.sha256(prefix.encode("utf-8")).hexdigest()[:12]
+        summary_prefix = cls.stable_prefix({"system": cls.SUMMARY_SYSTEM, "human": cls.SUMMARY_HUMAN})
+        result["summary"] = hashlib.sha256(summary_prefix.encode("utf-8")).hexdigest()[:12]
+        return result
+    
+    @classmethod
+    def fingerprint(cls) -> str:
+        """全部模板的整体指纹（版本号 + 各阶段前缀指纹）"""
+        combined = cls.TEMPLATE_VERSION + "|" + "|".join(
+            f"{key}={value}" for key, value in sorted(cls.fingerprints().items())
+        )
+        return f"v{cls.TEMPLATE_VERSION}-" + hashlib.sha256(combined.encode("utf-8")).hexdigest()[:12]
@@ -0,0 +1,385 @@
+"""多用户公平调度
+
+三步优化流程会长时间占用worker线程和模型API配额。调度器在进程内限制
+同时执行的流程数（槽位），并按用户公平排队：
+- 每个用户同时执行的流程数有上限，单个用户无法占满所有槽位
+- 排队请求按 (用户, 优先级) 分流，流之间使用赤字轮询（DRR）分配槽位，
+  优先级越高权重越大；请求成本按输入长度估算，长输入消耗更多配额
+- 排队中的请求可查询当前位置和预计等待时间
+
+多worker部署时传入shared_dir：槽位和每用户上限通过目录下的锁文件在进程间共享，
+各进程的排队状态也写入该目录，轮询请求落到任意worker都能查到。
+"""
+import itertools
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from pathlib import Path
+from typing import IO, Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # 非POSIX平台没有fcntl，只能在进程内限流
+    fcntl = None
+
+# 默认优先级权重：high 用于配置指定的用户，low 用于客户端声明的后台任务
+DEFAULT_PRIORITY_WEIGHTS = {"high": 4, "normal": 2, "low": 1}
+
+
+class SchedulerRejected(Exception):
+    """排队已满或等待超时"""
+
+    def __init__(self, message: str, position: Optional[int] = None,
+                 estimated_wait: Optional[float] = None):
+        super().__init__(message)
+        self.position = position
+        self.estimated_wait = estimated_wait
+
+
+class Ticket:
+    """一次排队请求"""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, user_key, priority: str, cost: float, request_id: Optional[str] = None):
+        self.id = next(self._ids)
+        self.user_key = user_key
+        self.priority = priority
+        self.cost = cost
+        self.request_id = request_id
+        self.enqueued_at = time.monotonic()
+        self.enqueued_wall = time.time()
+        self.started_at: Optional[float] = None
+        self.position_at_enqueue: Optional[int] = None
+        # 持有的跨进程名额锁文件，结束时关闭即释放
+        self.handles: List[IO] = []
+
+    @property
+    def flow(self) -> Tuple:
+        return self.user_key, self.priority
+
+    @property
+    def granted(self) -> bool:
+        return self.started_at is not None
+
+    @property
+    def wait_seconds(self) -> float:
+        end = self.started_at if self.started_at is not None else time.monotonic()
+        return end - self.enqueued_at
+
+
+class SharedSlots:
+    """跨进程的计数信号量与排队状态
+
+    每个名额对应目录下的一个锁文件，用flock非阻塞抢占；持有者关闭文件或进程退出时
+    自动释放，worker崩溃不会泄漏名额。各进程的排队请求写入 queue-<pid>.json。
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def _safe_name(key) -> str:
+        return re.sub(r"[^0-9A-Za-z_.-]", "_", str(key))
+
+    def try_acquire(self, key, count: int) -> Optional[IO]:
+        """抢占key的count个名额之一，成功返回持有锁的文件对象，名额已满返回None"""
+        name = self._safe_name(key)
+        for index in range(count):
+            handle = open(self.directory / f"{name}.{index}.lock", "a")
+            try:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                handle.close()
+                continue
+            return handle
+        return None
+
+    @staticmethod
+    def release(handle: IO):
+        handle.close()
+
+    def publish_queue(self, entries: List[Dict]):
+        """原子替换当前进程的排队状态文件"""
+        path = self.directory / f"queue-{os.getpid()}.json"
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entries, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def read_queues(self, user_key) -> List[Dict]:
+        """读取其他进程中指定用户的排队请求（清理已退出进程遗留的文件）"""
+        result = []
+        for path in self.directory.glob("queue-*.json"):
+            try:
+                pid = int(path.stem.split("-", 1)[1])
+            except ValueError:
+                continue
+            if pid == os.getpid():
+                continue
+            try:
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                path.unlink(missing_ok=True)
+                continue
+            except PermissionError:
+                pass
+            try:
+                entries = json.loads(path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                continue
+            result.extend(entry for entry in entries if entry.get("user_key") == str(user_key))
+        return result
+
+
+class FairScheduler:
+    """基于赤字轮询的多用户公平调度器
+
+    排队和DRR在进程内进行；指定shared_dir时slots和per_user_limit是所有进程合计的上限，
+    等待中的请求每隔poll_interval秒重试一次，以便拿到其他进程释放的名额。
+    """
+
+    def __init__(self, slots: int = 4, per_user_limit: int = 1, max_queue: int = 64,
+                 queue_timeout: float = 120, quantum: float = 1.0,
+                 priority_weights: Optional[Dict[str, int]] = None,
+                 shared_dir: Optional[Path] = None, poll_interval: float = 0.5):
+        self.slots = max(slots, 1)
+        self.per_user_limit = max(per_user_limit, 1)
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.quantum = quantum
+        self.priority_weights = dict(priority_weights or DEFAULT_PRIORITY_WEIGHTS)
+        self.poll_interval = poll_interval
+        self._shared = SharedSlots(shared_dir) if shared_dir is not None and fcntl is not None else None
+        self._cond = threading.Condition()
+        # 各流的排队请求；OrderedDict的顺序即轮询顺序
+        self._flows: "OrderedDict[Tuple, deque]" = OrderedDict()
+        self._deficits: Dict[Tuple, float] = {}
+        self._running: Dict = {}
+        self._running_total = 0
+        # 单次流程耗时的指数移动平均，用于估算等待时间
+        self._service_ewma: Optional[float] = None
+        self._stats = {"granted": 0, "rejected": 0, "timeouts": 0, "wait_total": 0.0, "wait_max": 0.0}
+
+    # ---------- 内部调度（调用方需持有锁） ----------
+
+    def _queued_count(self) -> int:
+        return sum(len(queue) for queue in self._flows.values())
+
+    def _weight(self, priority: str) -> int:
+        return self.priority_weights.get(priority, 1)
+
+    def _choose(self, eligible: List[Tuple]) -> Tuple:
+        """每轮为可调度的流补充配额，直到有流的队首请求成本不超过其赤字"""
+        while True:
+            for flow in eligible:
+                head = self._flows[flow][0]
+                if self._deficits.get(flow, 0) >= head.cost:
+                    return flow
+            for flow in eligible:
+                self._deficits[flow] = self._deficits.get(flow, 0) + self.quantum * self._weight(flow[1])
+
+    def _dispatch(self):
+        """有空闲槽位时按DRR选择下一个请求"""
+        granted = False
+        while self._running_total < self.slots and self._flows:
+            eligible = [flow for flow in self._flows
+                        if self._running.get(flow[0], 0) < self.per_user_limit]
+            if not eligible:
+                break
+            handles = []
+            if self._shared is not None:
+                slot_handle = self._shared.try_acquire("slot", self.slots)
+                if slot_handle is None:
+                    # 其他进程占满了槽位，等待下次轮询
+                    break
+                handles.append(slot_handle)
+            chosen = None
+            while eligible and chosen is None:
+                flow = self._choose(eligible)
+                if self._shared is not None:
+                    user_handle = self._shared.try_acquire(f"user-{flow[0]}", self.per_user_limit)
+                    if user_handle is None:
+                        # 该用户在其他进程中已达上限
+                        eligible.remove(flow)
+                        continue
+                    handles.append(user_handle)
+                chosen = flow
+            if chosen is None:
+                for handle in handles:
+                    self._shared.release(handle)
+                break
+            queue = self._flows[chosen]
+            ticket = queue.popleft()
+            ticket.handles = handles
+            self._deficits[chosen] -= ticket.cost
+            if queue:
+                # 已被服务的流移到队尾，保证轮询
+                self._flows.move_to_end(chosen)
+            else:
+                # 流清空后赤字归零，空闲用户不能积攒配额
+                del self._flows[chosen]
+                self._deficits.pop(chosen, None)
+            ticket.started_at = time.monotonic()
+            self._running[ticket.user_key] = self._running.get(ticket.user_key, 0) + 1
+            self._running_total += 1
+            self._stats["granted"] += 1
+            self._stats["wait_total"] += ticket.wait_seconds
+            self._stats["wait_max"] = max(self._stats["wait_max"], ticket.wait_seconds)
+            granted = True
+        if granted:
+            self._publish()
+            self._cond.notify_all()
+
+    def _remove(self, ticket: Ticket):
+        queue = self._flows.get(ticket.flow)
+        if queue is None:
+            return
+        try:
+            queue.remove(ticket)
+        except ValueError:
+            return
+        if not queue:
+            del self._flows[ticket.flow]
+            self._deficits.pop(ticket.flow, None)
+        self._publish()
+
+    def _queue_entries(self, user_key=None) -> List[Dict]:
+        entries = []
+        for flow, queue in self._flows.items():
+            if user_key is not None and flow[0] != user_key:
+                continue
+            for ticket in queue:
+                position = self._position(ticket)
+                entries.append({
+                    "user_key": str(ticket.user_key),
+                    "request_id": ticket.request_id,
+                    "priority": ticket.priority,
+                    "position": position,
+                    "enqueued_at": ticket.enqueued_wall,
+                    "estimated_wait": self._estimate_wait(position),
+                })
+        return entries
+
+    def _publish(self):
+        """把本进程的排队状态写入共享目录，供其他worker响应轮询"""
+        if self._shared is None:
+            return
+        try:
+            self._shared.publish_queue(self._queue_entries())
+        except OSError:
+            pass
+
+    def _position(self, ticket: Ticket) -> int:
+        """估算请求前面还有多少个请求（按DRR权重折算其他流的排队数）"""
+        queue = self._flows.get(ticket.flow)
+        if queue is None:
+            return 0
+        index = list(queue).index(ticket)
+        my_weight = self._weight(ticket.priority)
+        ahead = index
+        for flow, other in self._flows.items():
+            if flow == ticket.flow:
+                continue
+            share = math.ceil((index + 1) * self._weight(flow[1]) / my_weight)
+            ahead += min(len(other), share)
+        return ahead + 1
+
+    def _estimate_wait(self, position: int) -> Optional[float]:
+        if self._service_ewma is None:
+            return None
+        # 前面的请求按槽位数并行处理，每一轮约为一次流程的平均耗时
+        rounds = math.ceil(position / self.slots)
+        return round(rounds * self._service_ewma, 1)
+
+    # ---------- 对外接口 ----------
+
+    @contextmanager
+    def slot(self, user_key, priority: str = "normal", cost: float = 1.0,
+             request_id: Optional[str] = None):
+        """获取执行槽位，返回Ticket；排队已满或等待超时抛出SchedulerRejected"""
+        if priority not in self.priority_weights:
+            priority = "normal"
+        ticket = Ticket(user_key, priority, max(cost, 0.1), request_id)
+        with self._cond:
+            if self._queued_count() >= self.max_queue:
+                self._stats["rejected"] += 1
+                raise SchedulerRejected("排队人数已满，请稍后重试",
+                                        estimated_wait=self._estimate_wait(self.max_queue))
+            self._flows.setdefault(ticket.flow, deque()).append(ticket)
+            ticket.position_at_enqueue = self._position(ticket)
+            self._dispatch()
+            if not ticket.granted:
+                self._publish()
+            deadline = ticket.enqueued_at + self.queue_timeout
+            while not ticket.granted:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    position = self._position(ticket)
+                    self._remove(ticket)
+                    self._stats["timeouts"] += 1
+                    raise SchedulerRejected("排队等待超时，请稍后重试", position=position,
+                                            estimated_wait=self._estimate_wait(position))
+                if self._shared is None:
+                    self._cond.wait(remaining)
+                else:
+                    # 其他进程释放名额时不会通知本进程，定期重试
+                    self._cond.wait(min(remaining, self.poll_interval))
+                    self._dispatch()
+        try:
+            yield ticket
+        finally:
+            duration = time.monotonic() - ticket.started_at
+            for handle in ticket.handles:
+                SharedSlots.release(handle)
+            with self._cond:
+                self._running[ticket.user_key] -= 1
+                if not self._running[ticket.user_key]:
+                    del self._running[ticket.user_key]
+                self._running_total -= 1
+                self._service_ewma = (
+                    duration if self._service_ewma is None else 0.8 * self._service_ewma + 0.2 * duration
+                )
+                self._dispatch()
+
+    def queue_status(self, user_key) -> List[Dict]:
+        """指定用户正在排队的请求及其位置、预计等待时间（包括其他进程中的请求）"""
+        with self._cond:
+            entries = self._queue_entries(user_key)
+        if self._shared is not None:
+            entries.extend(self._shared.read_queues(user_key))
+        now = time.time()
+        return [
+            {
+                "request_id": entry["request_id"],
+                "priority": entry["priority"],
+                "position": entry["position"],
+                "waited": round(now - entry["enqueued_at"], 1),
+                "estimated_wait": entry["estimated_wait"],
+            }
+            for entry in entries
+        ]
+
+    def snapshot(self) -> Dict:
+        with self._cond:
+            stats = dict(self._stats)
+            wait_total = stats.pop("wait_total")
+            stats["avg_wait"] = round(wait_total / stats["granted"], 3) if stats["granted"] else None
+            stats["wait_max"] = round(stats["wait_max"], 3)
+            stats.update({
+                "slots": self.slots,
+                "shared": self._shared is not None,
+                "per_user_limit": self.per_user_limit,
+                "running": self._running_total,
+                "queued": self._queued_count(),
+                "active_users": len(self._running),
+                "queued_users": len({flow[0] for flow in self._flows}),
+                "avg_service": round(self._service_ewma, 3) if self._service_ewma is not None else None,
+            })
+            return stats
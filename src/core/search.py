@@ -0,0 +1,72 @@
+"""全文搜索辅助函数
+
+搜索由MySQL FULLTEXT索引（ngram分词器，适合中文）完成，
+这里负责把用户输入转换为BOOLEAN MODE查询串，并为命中记录生成摘要片段。
+"""
+import re
+from typing import Dict, List, Tuple
+
+# BOOLEAN MODE中有特殊含义的字符，用户输入中一律去除
+_OPERATOR_PATTERN = re.compile(r'[+\-<>()~*"@]+')
+
+# ngram分词的最小长度（MySQL默认 ngram_token_size=2）
+MIN_TERM_LENGTH = 2
+
+
+def parse_terms(text: str, max_terms: int = 8) -> List[str]:
+    """按空白切分搜索词，去除运算符和过短的词"""
+    terms = []
+    for term in _OPERATOR_PATTERN.sub(" ", text or "").split():
+        if len(term) >= MIN_TERM_LENGTH and term not in terms:
+            terms.append(term)
+    return terms[:max_terms]
+
+
+def build_boolean_query(terms: List[str]) -> str:
+    """每个词作为必须出现的短语，ngram分词下短语即连续的字符序列"""
+    return " ".join(f'+"{term}"' for term in terms)
+
+
+def make_snippet(text: str, terms: List[str], width: int = 60) -> Tuple[str, List[List[int]]]:
+    """截取首个命中词附近的片段，返回 (片段, 片段内各命中位置[起, 止])"""
+    text = text or ""
+    lowered = text.lower()
+    positions = [lowered.find(term.lower()) for term in terms]
+    positions = [pos for pos in positions if pos >= 0]
+    if positions:
+        start = max(min(positions) - width // 3, 0)
+    else:
+        start = 0
+    end = min(start + width * 2, len(text))
+    snippet = text[start:end].replace("\n", " ")
+
+    highlights = []
+    lowered_snippet = snippet.lower()
+    for term in terms:
+        needle = term.lower()
+        pos = lowered_snippet.find(needle)
+        while pos >= 0:
+            highlights.append([pos, pos + len(needle)])
+            pos = lowered_snippet.find(needle, pos + len(needle))
+    highlights.sort()
+
+    prefix = "…" if start > 0 else ""
+    suffix = "…" if end < len(text) else ""
+    if prefix:
+        highlights = [[s + 1, e + 1] for s, e in highlights]
+    return prefix + snippet + suffix, highlights
+
+
+def format_hit(row: Dict, terms: List[str], width: int = 60) -> Dict:
+    """把SearchDAO返回的行转换为接口输出"""
+    snippet, highlights = make_snippet(row.get("content"), terms, width)
+    return {
+        "source": row["source"],
+        "id": row["item_id"],
+        "session_id": row["session_id"],
+        "session_name": row.get("session_name"),
+        "score": round(float(row.get("score") or 0), 4),
+        "created_at": row.get("created_at"),
+        "snippet": snippet,
+        "highlights": highlights,
+    }
@@ -0,0 +1,264 @@
+"""近似重复需求检测
+
+对需求文本按字符n-gram（适合中文，无需分词）计算MinHash签名，
+使用LSH分桶快速找到候选，再用签名估计Jaccard相似度。
+索引以追加写的JSONL文件持久化：每保存一条优化结果追加一行，
+启动时顺序读取即可恢复；多进程部署时各进程通过读取文件新增部分保持同步。
+重建时在文件锁内写临时文件再原子替换，其他进程发现文件被替换后整体重新加载。
+"""
+import json
+import os
+import re
+import threading
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # numpy为可选依赖，缺失时使用纯Python实现
+    np = None
+
+try:
+    import fcntl
+except ImportError:  # 非POSIX平台没有fcntl，退化为仅进程内加锁
+    fcntl = None
+
+# 梅森素数2^31-1作为置换的模，保证 a*h+b 在uint64范围内不溢出
+_PRIME = (1 << 31) - 1
+_MAX_HASH = _PRIME
+
+_NORMALIZE_PATTERN = re.compile(r"[\s　，。！？、；：“”‘’（）《》【】,.!?;:'\"()\[\]<>\-_*#`~]+")
+
+
+def normalize_text(text: str) -> str:
+    """去除空白和标点并统一大小写，使措辞上的细小差异不影响相似度"""
+    return _NORMALIZE_PATTERN.sub("", text or "").lower()
+
+
+def char_ngrams(text: str, n: int = 3) -> Set[str]:
+    """字符n-gram集合，文本短于n时退化为整体"""
+    if len(text) <= n:
+        return {text} if text else set()
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+class MinHasher:
+    """MinHash签名生成器（参数由固定种子生成，保证跨进程一致）"""
+
+    def __init__(self, num_perm: int = 64, ngram: int = 3, seed: int = 20240601):
+        self.num_perm = num_perm
+        self.ngram = ngram
+        # 线性同余生成置换参数，不依赖random模块的实现细节
+        state = seed
+        self.params: List[Tuple[int, int]] = []
+        for _ in range(num_perm):
+            state = (state * 6364136223846793005 + 1442695040888963407) % (1 << 64)
+            a = (state >> 3) % (_PRIME - 1) + 1
+            state = (state * 6364136223846793005 + 1442695040888963407) % (1 << 64)
+            b = (state >> 3) % _PRIME
+            self.params.append((a, b))
+        if np is not None:
+            self._a = np.array([a for a, _ in self.params], dtype=np.uint64)[:, None]
+            self._b = np.array([b for _, b in self.params], dtype=np.uint64)[:, None]
+
+    def signature(self, text: str) -> List[int]:
+        """计算文本的MinHash签名"""
+        grams = char_ngrams(normalize_text(text), self.ngram)
+        if not grams:
+            return [_MAX_HASH] * self.num_perm
+        hashes = [zlib.crc32(gram.encode("utf-8")) % _PRIME for gram in grams]
+        if np is not None:
+            values = np.array(hashes, dtype=np.uint64)[None, :]
+            return ((self._a * values + self._b) % _PRIME).min(axis=1).tolist()
+        return [
+            min((a * h + b) % _PRIME for h in hashes)
+            for a, b in self.params
+        ]
+
+    @staticmethod
+    def similarity(sig_a: List[int], sig_b: List[int]) -> float:
+        """用签名估计Jaccard相似度"""
+        if not sig_a or len(sig_a) != len(sig_b):
+            return 0.0
+        return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / len(sig_a)
+
+
+class SimilarityIndex:
+    """基于MinHash + LSH的优化结果近似重复索引"""
+
+    def __init__(self, index_file: Optional[Path] = None, num_perm: int = 64,
+                 bands: int = 16, ngram: int = 3):
+        if num_perm % bands != 0:
+            raise ValueError("num_perm必须能被bands整除")
+        self.hasher = MinHasher(num_perm=num_perm, ngram=ngram)
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.index_file = Path(index_file) if index_file else None
+        self._entries: Dict[int, Dict] = {}
+        self._buckets: Dict[Tuple[int, int], Set[int]] = {}
+        self._lock = threading.RLock()
+        self._offset = 0
+        self._inode = None
+        self.sync()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _band_keys(self, signature: List[int]):
+        for band in range(self.bands):
+            chunk = signature[band * self.rows:(band + 1) * self.rows]
+            yield band, hash(tuple(chunk))
+
+    def _insert(self, entry: Dict):
+        result_id = entry["result_id"]
+        if result_id in self._entries:
+            return
+        self._entries[result_id] = entry
+        for key in self._band_keys(entry["signature"]):
+            self._buckets.setdefault(key, set()).add(result_id)
+
+    @contextmanager
+    def _file_lock(self):
+        """跨进程互斥（索引文件旁的.lock文件），同时持有进程内锁"""
+        with self._lock:
+            if self.index_file is None or fcntl is None:
+                yield
+                return
+            self.index_file.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.index_file.with_suffix(".lock"), "a") as lock_file:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _reset(self):
+        self._entries = {}
+        self._buckets = {}
+        self._offset = 0
+        self._inode = None
+
+    def sync(self):
+        """读取索引文件中新增的记录（包括其他worker写入的）"""
+        if self.index_file is None:
+            return
+        with self._lock:
+            try:
+                stat = self.index_file.stat()
+            except FileNotFoundError:
+                return
+            if stat.st_ino != self._inode or stat.st_size < self._offset:
+                # 文件已被其他进程重建替换，整体重新加载
+                self._reset()
+                self._inode = stat.st_ino
+            if stat.st_size <= self._offset:
+                return
+            with open(self.index_file, "r", encoding="utf-8") as f:
+                f.seek(self._offset)
+                for line in f:
+                    if not line.endswith("\n"):
+                        # 其他进程正在写入的半行，下次再读
+                        break
+                    self._offset += len(line.encode("utf-8"))
+                    try:
+                        self._insert(json.loads(line))
+                    except (ValueError, KeyError):
+                        continue
+
+    def add(self, result_id: int, text: str, user_id: Optional[int] = None,
+            session_id: Optional[int] = None) -> Dict:
+        """添加一条记录并追加写入索引文件"""
+        entry = {
+            "result_id": result_id,
+            "user_id": user_id,
+            "session_id": session_id,
+            "length": len(text or ""),
+            "signature": self.hasher.signature(text),
+        }
+        with self._file_lock():
+            if self.index_file is not None:
+                # 先追上文件中已有的记录，避免重建后的替换文件被当作新增部分重复读取
+                self.sync()
+            self._insert(entry)
+            if self.index_file is not None:
+                line = json.dumps(entry, separators=(",", ":")) + "\n"
+                with open(self.index_file, "a", encoding="utf-8") as f:
+                    f.write(line)
+                stat = self.index_file.stat()
+                if self._inode is None:
+                    self._inode = stat.st_ino
+                if stat.st_size == self._offset + len(line.encode("utf-8")):
+                    # 期间没有其他进程写入（持有文件锁时总是如此），直接前移偏移量避免重复读取
+                    self._offset = stat.st_size
+        return entry
+
+    def query(self, text: str, threshold: float = 0.85, user_id: Optional[int] = None,
+              limit: int = 1) -> List[Dict]:
+        """查找相似度不低于阈值的记录，按相似度降序返回
+
+        指定user_id时只在该用户自己的记录中查找。
+        """
+        self.sync()
+        signature = self.hasher.signature(text)
+        with self._lock:
+            candidates: Set[int] = set()
+            for key in self._band_keys(signature):
+                candidates.update(self._buckets.get(key, ()))
+            matches = []
+            for result_id in candidates:
+                entry = self._entries[result_id]
+                if user_id is not None and entry.get("user_id") != user_id:
+                    continue
+                score = MinHasher.similarity(signature, entry["signature"])
+                if score >= threshold:
+                    matches.append({
+                        "result_id": result_id,
+                        "session_id": entry.get("session_id"),
+                        "similarity": round(score, 4),
+                    })
+        matches.sort(key=lambda item: (item["similarity"], item["result_id"]), reverse=True)
+        return matches[:limit]
+
+    def rebuild(self, records) -> int:
+        """根据数据库中的记录重建索引文件，records为 (result_id, text, user_id, session_id) 序列
+
+        先写临时文件再原子替换，读取中的其他进程不会看到半成品。
+        """
+        with self._file_lock():
+            return self._rebuild_locked(records)
+
+    def build_if_missing(self, load_records) -> Optional[int]:
+        """索引文件不存在时从load_records()重建，返回记录数；已存在时只加载，返回None
+
+        多个worker同时启动时只有第一个拿到文件锁的进程构建，其余进程等待后直接加载。
+        """
+        with self._file_lock():
+            if self.index_file is not None and self.index_file.exists():
+                self.sync()
+                return None
+            return self._rebuild_locked(load_records())
+
+    def _rebuild_locked(self, records) -> int:
+        self._reset()
+        lines = []
+        for result_id, text, user_id, session_id in records:
+            entry = {
+                "result_id": result_id,
+                "user_id": user_id,
+                "session_id": session_id,
+                "length": len(text or ""),
+                "signature": self.hasher.signature(text),
+            }
+            self._insert(entry)
+            lines.append(json.dumps(entry, separators=(",", ":")) + "\n")
+        if self.index_file is not None:
+            tmp_file = self.index_file.with_name(f"{self.index_file.name}.{os.getpid()}.tmp")
+            with open(tmp_file, "w", encoding="utf-8") as f:
+                f.writelines(lines)
+            os.replace(tmp_file, self.index_file)
+            stat = self.index_file.stat()
+            self._offset = stat.st_size
+            self._inode = stat.st_ino
+        return len(lines)
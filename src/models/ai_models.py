@@ -1,96 +1,250 @@
 """AI模型管理器"""
+import threading
 import time
-from typing import Optional
-from langchain_openai import ChatOpenAI
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
+from typing import Callable, Optional, Dict
 
 from ...config.settings import Config
 from ..utils.logger import Logger
+from .http_pool import HTTPClientPool
+from .upstream_pool import Upstream, UpstreamPool
+
+
+def extract_usage(message) -> Dict[str, Optional[int]]:
+    """从模型返回的消息中提取token用量（含前缀缓存命中的token数）"""
+    usage = getattr(message, "usage_metadata", None) or {}
+    token_usage = (getattr(message, "response_metadata", None) or {}).get("token_usage") or {}
+    
+    cached_tokens = (usage.get("input_token_details") or {}).get("cache_read")
+    if cached_tokens is None:
+        # DeepSeek返回prompt_cache_hit_tokens，OpenAI兼容接口返回prompt_tokens_details.cached_tokens
+        cached_tokens = token_usage.get("prompt_cache_hit_tokens")
+    if cached_tokens is None:
+        cached_tokens = (token_usage.get("prompt_tokens_details") or {}).get("cached_tokens")
+    
+    return {
+        "input_tokens": usage.get("input_tokens", token_usage.get("prompt_tokens")),
+        "output_tokens": usage.get("output_tokens", token_usage.get("completion_tokens")),
+        "cached_tokens": cached_tokens,
+    }
+
+
+class PromptCacheStats:
+    """按模型累计输入token与缓存命中token，用于观察前缀缓存命中率"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+    
+    def record(self, model_name: str, usage: Dict[str, Optional[int]]):
+        with self._lock:
+            stats = self._stats.setdefault(model_name, {
+                "calls": 0, "input_tokens": 0, "cached_tokens": 0, "output_tokens": 0
+            })
+            stats["calls"] += 1
+            stats["input_tokens"] += usage.get("input_tokens") or 0
+            stats["cached_tokens"] += usage.get("cached_tokens") or 0
+            stats["output_tokens"] += usage.get("output_tokens") or 0
+    
+    def snapshot(self) -> Dict[str, Dict]:
+        with self._lock:
+            result = {}
+            for model_name, stats in self._stats.items():
+                item = dict(stats)
+                item["cache_hit_ratio"] = (
+                    round(stats["cached_tokens"] / stats["input_tokens"], 4) if stats["input_tokens"] else None
+                )
+                result[model_name] = item
+            return result
 
 
 class AIModelManager:
-    """AI模型管理器，负责管理三个AI模型的初始化和调用"""
+    """AI模型管理器，负责管理三个AI模型的初始化和调用
+    
+    模型客户端在首次使用时才创建（langchain_openai也在此时导入），
+    使只涉及数据库的接口、CLI和测试进程不必承担模型SDK的导入开销。
+    所有模型客户端共用 HTTPClientPool 中按主机划分的keep-alive连接池。
+    """
     
-    def __init__(self, config: Config, logger: Optional[Logger] = None):
+    def __init__(self, config: Config, logger: Optional[Logger] = None,
+                 http_pool: Optional[HTTPClientPool] = None):
         self.config = config
         self.logger = logger or Logger()
+        self.http_pool = http_pool or HTTPClientPool(
+            max_connections=config.http_max_connections,
+            max_keepalive_connections=config.http_max_keepalive_connections,
+            keepalive_expiry=config.http_keepalive_expiry,
+            http2=config.http2_enabled,
+            logger=self.logger
+        )
         
-        # 初始化模型
-        self.deepseek_model = None
-        self.kimi_model = None
-        self.qwen_model = None
-        self.deepseek_chain = None
+        # 各模型的token用量及前缀缓存命中统计
+        self.cache_stats = PromptCacheStats()
+        # 每次调用成功后回调 (步骤, 提供方, 上游, 用量, 耗时毫秒)，用于写入用量台账
+        self.usage_callback: Optional[Callable] = None
         
-        self._initialize_models()
+        # 各提供方的上游池和按上游缓存的模型客户端（均按需创建）
+        self._pools: Dict[str, UpstreamPool] = {}
+        self._models: Dict[str, object] = {}
+        self._models_lock = threading.Lock()
+    
+    # 各提供方使用的模型名
+    PROVIDER_MODELS = {"deepseek": "deepseek_model", "kimi": "kimi_model", "qwen": "qwen_model"}
+    
+    def get_pool(self, provider: str) -> UpstreamPool:
+        """获取提供方的上游池，首次调用时按配置创建"""
+        pool = self._pools.get(provider)
+        if pool is not None:
+            return pool
+        if provider not in self.PROVIDER_MODELS:
+            raise ValueError(f"未知模型: {provider}")
+        with self._models_lock:
+            pool = self._pools.get(provider)
+            if pool is None:
+                pool = UpstreamPool(provider, self.config.get_upstreams(provider))
+                self._pools[provider] = pool
+        return pool
+    
+    def _client(self, upstream: Upstream):
+        """获取上游对应的模型客户端，首次调用时创建"""
+        model = self._models.get(upstream.key)
+        if model is not None:
+            return model
+        with self._models_lock:
+            model = self._models.get(upstream.key)
+            if model is None:
+                try:
+                    from langchain_openai import ChatOpenAI
+                    model = ChatOpenAI(
+                        model=getattr(self.config, self.PROVIDER_MODELS[upstream.provider]),
+                        openai_api_key=upstream.api_key,
+                        openai_api_base=upstream.api_base,
+                        timeout=self.config.api_timeout,
+                        # 重试由invoke_with_retry负责，以便换用其他上游；SDK内部不再对同一密钥重试
+                        max_retries=0,
+                        http_client=self.http_pool.get_client(upstream.api_base),
+                    )
+                except Exception as e:
+                    self.logger.error("%s模型初始化失败: %s", upstream.key, e, exc_info=True)
+                    raise
+                self._models[upstream.key] = model
+                self.logger.debug("%s模型初始化成功", upstream.key)
+        return model
+    
+    def get_model(self, name: str):
+        """获取提供方第一个上游的模型客户端（不经过负载均衡）"""
+        return self._client(self.get_pool(name).upstreams[0])
+    
+    def reset_clients(self):
+        """丢弃已创建的模型客户端（fork后调用，避免与父进程共享HTTP连接）"""
+        with self._models_lock:
+            self._models = {}
+            self.http_pool.reset()
+    
+    def connection_stats(self) -> Dict[str, Dict]:
+        """各模型API主机的连接复用统计"""
+        return self.http_pool.stats()
+    
+    def upstream_stats(self) -> Dict[str, list]:
+        """各提供方每个上游的使用量和健康状态"""
+        return {provider: pool.snapshot() for provider, pool in self._pools.items()}
+    
+    def close(self):
+        """关闭共享的HTTP连接"""
+        self.http_pool.close()
+    
+    def warm_up(self):
+        """预先创建全部模型客户端（可在服务启动或worker fork后调用）"""
+        for name in self.PROVIDER_MODELS:
+            for upstream in self.get_pool(name).upstreams:
+                self._client(upstream)
+        self.logger.info("所有AI模型初始化完成 (DeepSeek, Kimi, Qwen)")
     
-    def _initialize_models(self):
-        """初始化三个AI模型"""
+    @property
+    def deepseek_model(self):
+        """DeepSeek模型"""
+        return self.get_model("deepseek")
+    
+    @property
+    def kimi_model(self):
+        """Kimi模型"""
+        return self.get_model("kimi")
+    
+    @property
+    def qwen_model(self):
+        """Qwen模型"""
+        return self.get_model("qwen")
+    
+    @property
+    def deepseek_chain(self):
+        """用于会话名称生成的DeepSeek模型"""
+        return self.get_model("deepseek")
+    
+    def _report_usage(self, model_name: str, provider: Optional[str], upstream: Optional[str],
+                      usage: Dict[str, Optional[int]], duration_ms: float):
+        if self.usage_callback is None:
+            return
         try:
-            # DeepSeek模型
-            self.deepseek_model = ChatOpenAI(
-                model=self.config.deepseek_model,
-                openai_api_key=self.config.deepseek_api_key,
-                openai_api_base=self.config.deepseek_api_base,
-                timeout=self.config.api_timeout,
-                max_retries=self.config.api_max_retries
-            )
-            self.logger.debug("DeepSeek模型初始化成功")
-            
-            # Kimi模型
-            self.kimi_model = ChatOpenAI(
-                model=self.config.kimi_model,
-                openai_api_key=self.config.kimi_api_key,
-                openai_api_base=self.config.kimi_api_base,
-                timeout=self.config.api_timeout,
-                max_retries=self.config.api_max_retries
-            )
-            self.logger.debug("Kimi模型初始化成功")
-            
-            # Qwen模型
-            self.qwen_model = ChatOpenAI(
-                model=self.config.qwen_model,
-                openai_api_key=self.config.dashscope_api_key,
-                openai_api_base=self.config.qwen_api_base,
-                timeout=self.config.api_timeout,
-                max_retries=self.config.api_max_retries
-            )
-            self.logger.debug("Qwen模型初始化成功")
-            
-            # 创建简单的deepseek链用于会话名称生成
-            self.deepseek_chain = self.deepseek_model
-            self.logger.debug("DeepSeek链初始化成功")
-            
-            # 所有模型初始化完成后，输出一条总结信息
-            self.logger.info("所有AI模型初始化完成 (DeepSeek, Kimi, Qwen)")
-            
+            self.usage_callback(model_name, provider, upstream, usage, duration_ms)
         except Exception as e:
-            self.logger.error(f"模型初始化失败: {e}", exc_info=True)
-            raise
+            # 用量记录失败不影响模型调用结果
+            self.logger.warning("记录%s模型用量失败: %s", model_name, e)
     
-    def invoke_with_retry(self, chain, input_data: dict, model_name: str, max_retries: int = None) -> str:
-        """带重试机制的模型调用"""
+    def invoke_with_retry(self, chain, input_data, model_name: str, max_retries: int = None,
+                          provider: str = None) -> str:
+        """带重试机制的模型调用
+        
+        指定provider时，chain为不含模型的提示词模板（为None时直接把input_data作为消息传给模型），
+        每次尝试都从该提供方的上游池中选择进行中请求最少的上游，失败后优先换用其他上游。
+        """
         max_retries = max_retries or self.config.api_max_retries
+        pool = self.get_pool(provider) if provider else None
+        failed = set()
         
         for attempt in range(max_retries):
             try:
-                self.logger.debug(f"调用{model_name}模型 (尝试 {attempt + 1}/{max_retries})")
+                self.logger.debug("调用%s模型 (尝试 %d/%d)", model_name, attempt + 1, max_retries,
+                                  event="model_attempt", stage=model_name)
                 start_time = time.time()
                 
-                result = chain.invoke(input_data)
+                upstream_key = None
+                if pool is None:
+                    result = chain.invoke(input_data)
+                else:
+                    with pool.acquire(exclude=failed) as upstream:
+                        try:
+                            model = self._client(upstream)
+                            runnable = model if chain is None else chain | model
+                            result = runnable.invoke(input_data)
+                            upstream_key = upstream.key
+                        except Exception:
+                            failed.add(upstream.key)
+                            raise
                 
                 elapsed_time = time.time() - start_time
-                self.logger.info(f"{model_name}模型调用成功，耗时 {elapsed_time:.2f}秒")
+                usage = None
+                if hasattr(result, "content"):
+                    # 链直接返回模型消息时，记录用量后取出文本
+                    usage = extract_usage(result)
+                    self.cache_stats.record(model_name, usage)
+                    self._report_usage(model_name, provider, upstream_key, usage, elapsed_time * 1000)
+                    result = result.content
+                self.logger.info("%s模型调用成功，耗时 %.2f秒", model_name, elapsed_time,
+                                 event="model_call_done", stage=model_name,
+                                 duration_ms=round(elapsed_time * 1000, 1), sizes=usage)
                 
                 return result
                 
             except Exception as e:
-                self.logger.warning(f"{model_name}模型调用失败 (尝试 {attempt + 1}/{max_retries}): {e}")
+                self.logger.warning("%s模型调用失败 (尝试 %d/%d): %s", model_name, attempt + 1, max_retries, e,
+                                    event="model_call_failed", stage=model_name)
                 
                 if attempt < max_retries - 1:
+                    if pool is not None and len(failed) < len(pool.upstreams):
+                        # 还有未失败的上游，立即换用，无需等待
+                        continue
                     wait_time = self.config.api_retry_delay * (attempt + 1)
-                    self.logger.debug(f"等待 {wait_time}秒后重试...")
+                    self.logger.debug("等待 %s秒后重试...", wait_time)
                     time.sleep(wait_time)
                 else:
-                    self.logger.error(f"{model_name}模型调用最终失败", exc_info=True)
+                    self.logger.error("%s模型调用最终失败", model_name, exc_info=True)
                     raise
@@ -0,0 +1,125 @@
+"""模型API共享HTTP连接池
+
+所有模型客户端（三步优化、会话命名、总结）共用按主机划分的httpx.Client，
+统一配置keep-alive、最大连接数和HTTP/2，避免每次调用重新建立TCP/TLS连接。
+通过httpcore的trace扩展统计新建连接和TLS握手次数，用于观察连接复用率。
+"""
+import threading
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+from ..utils.logger import Logger
+
+
+class HostStats:
+    """单个主机的连接统计"""
+
+    def __init__(self):
+        self.requests = 0
+        self.new_connections = 0
+        self.tls_handshakes = 0
+
+    def to_dict(self) -> Dict:
+        reused = max(self.requests - self.new_connections, 0)
+        return {
+            "requests": self.requests,
+            "new_connections": self.new_connections,
+            "tls_handshakes": self.tls_handshakes,
+            "reused_requests": reused,
+            "reuse_ratio": round(reused / self.requests, 4) if self.requests else None,
+        }
+
+
+class HTTPClientPool:
+    """按主机管理共享的httpx.Client"""
+
+    def __init__(self, max_connections: int = 50, max_keepalive_connections: int = 20,
+                 keepalive_expiry: float = 60, http2: bool = False,
+                 logger: Optional[Logger] = None):
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.logger = logger or Logger()
+        self.http2 = http2 and self._http2_available()
+        self._clients: Dict[str, object] = {}
+        self._stats: Dict[str, HostStats] = {}
+        self._lock = threading.Lock()
+
+    def _http2_available(self) -> bool:
+        try:
+            import h2  # noqa: F401
+            return True
+        except ImportError:
+            self.logger.warning("未安装h2，HTTP/2已禁用（pip install httpx[http2]）")
+            return False
+
+    @staticmethod
+    def host_key(base_url: str) -> str:
+        """从API地址中提取主机（含端口）作为连接池键"""
+        return urlparse(base_url).netloc or base_url
+
+    def get_client(self, base_url: str):
+        """获取指定API地址所在主机的共享客户端"""
+        host = self.host_key(base_url)
+        client = self._clients.get(host)
+        if client is not None:
+            return client
+        with self._lock:
+            client = self._clients.get(host)
+            if client is None:
+                client = self._create_client(host)
+                self._clients[host] = client
+        return client
+
+    def _create_client(self, host: str):
+        import httpx
+
+        stats = self._stats.setdefault(host, HostStats())
+        lock = self._lock
+
+        # 回调在各请求线程中执行，计数需在连接池的锁内更新
+        def trace(event_name: str, info: Dict):
+            if event_name == "connection.connect_tcp.started":
+                with lock:
+                    stats.new_connections += 1
+            elif event_name == "connection.start_tls.complete":
+                with lock:
+                    stats.tls_handshakes += 1
+
+        def on_request(request):
+            with lock:
+                stats.requests += 1
+            request.extensions["trace"] = trace
+
+        client = httpx.Client(
+            http2=self.http2,
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive_connections,
+                keepalive_expiry=self.keepalive_expiry,
+            ),
+            event_hooks={"request": [on_request]},
+        )
+        self.logger.debug("创建HTTP连接池 - 主机: %s, HTTP/2: %s", host, self.http2)
+        return client
+
+    def stats(self) -> Dict[str, Dict]:
+        """各主机的请求数、新建连接数、TLS握手数和复用率"""
+        with self._lock:
+            return {host: stats.to_dict() for host, stats in self._stats.items()}
+
+    def reset(self):
+        """丢弃现有客户端（fork后调用，不关闭从父进程继承的连接）"""
+        with self._lock:
+            self._clients = {}
+            self._stats = {}
+
+    def close(self):
+        """关闭所有客户端及其连接"""
+        with self._lock:
+            clients, self._clients = self._clients, {}
+        for client in clients.values():
+            try:
+                client.close()
+            except Exception:
+                pass
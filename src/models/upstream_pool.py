@@ -0,0 +1,152 @@
+"""模型API上游（密钥 + 接口地址）池
+
+每个模型提供方可以配置多组API密钥和接口地址，调用时选择进行中请求数最少的上游，
+吞吐量随密钥数量线性扩展。返回429（限流）或401/403（密钥无效）的上游会被暂时剔除，
+冷却期结束后自动恢复；所有上游都被剔除时退而使用最早恢复的一个，而不是直接失败。
+"""
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+# 限流后的冷却时间（秒），连续限流时按指数退避
+RATE_LIMIT_COOLDOWN = 30
+MAX_COOLDOWN = 600
+# 密钥无效后的冷却时间（秒），期间人工更换密钥后重启即可
+AUTH_COOLDOWN = 600
+
+
+def error_status(error: Exception) -> Optional[int]:
+    """从SDK异常中提取HTTP状态码"""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """读取响应中的Retry-After（秒）"""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class Upstream:
+    """单个上游及其使用统计"""
+
+    def __init__(self, provider: str, index: int, api_key: str, api_base: str):
+        self.provider = provider
+        self.index = index
+        self.api_key = api_key
+        self.api_base = api_base
+        self.outstanding = 0
+        self.requests = 0
+        self.successes = 0
+        self.failures = 0
+        self.rate_limited = 0
+        self.unauthorized = 0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.last_error: Optional[str] = None
+        self.latency_total = 0.0
+
+    @property
+    def key(self) -> str:
+        return f"{self.provider}#{self.index}"
+
+    def healthy(self, now: float) -> bool:
+        return now >= self.ejected_until
+
+    def to_dict(self, now: float) -> Dict:
+        return {
+            "upstream": self.key,
+            "api_base": self.api_base,
+            # 只显示密钥末4位
+            "api_key": f"...{self.api_key[-4:]}" if self.api_key else None,
+            "healthy": self.healthy(now),
+            "ejected_for": round(max(self.ejected_until - now, 0), 1),
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "successes": self.successes,
+            "failures": self.failures,
+            "rate_limited": self.rate_limited,
+            "unauthorized": self.unauthorized,
+            "avg_latency": round(self.latency_total / self.successes, 3) if self.successes else None,
+            "last_error": self.last_error,
+        }
+
+
+class UpstreamPool:
+    """单个提供方的上游池，按最少进行中请求数选择"""
+
+    def __init__(self, provider: str, credentials: List[Dict]):
+        if not credentials:
+            raise ValueError(f"{provider}未配置API密钥")
+        self.provider = provider
+        self.upstreams = [
+            Upstream(provider, index, item["api_key"], item["api_base"])
+            for index, item in enumerate(credentials)
+        ]
+        self._lock = threading.Lock()
+        self._cursor = 0
+
+    def _choose(self, exclude) -> Upstream:
+        now = time.monotonic()
+        healthy = [u for u in self.upstreams if u.healthy(now)]
+        if not healthy:
+            # 全部被剔除：使用最早恢复的上游
+            return min(self.upstreams, key=lambda u: u.ejected_until)
+        # 优先换一个本次调用还没失败过的上游
+        candidates = [u for u in healthy if u.key not in exclude] or healthy
+        # 进行中请求数相同时轮流选择，避免总是落到第一个上游
+        self._cursor = (self._cursor + 1) % len(self.upstreams)
+        return min(candidates, key=lambda u: (u.outstanding, (u.index - self._cursor) % len(self.upstreams)))
+
+    @contextmanager
+    def acquire(self, exclude=()):
+        """选择上游并在调用期间计入进行中请求数，exclude为本次调用已失败的上游"""
+        with self._lock:
+            upstream = self._choose(set(exclude))
+            upstream.outstanding += 1
+            upstream.requests += 1
+        start = time.monotonic()
+        try:
+            yield upstream
+        except Exception as e:
+            self.report_failure(upstream, e)
+            raise
+        else:
+            with self._lock:
+                upstream.successes += 1
+                upstream.consecutive_failures = 0
+                upstream.latency_total += time.monotonic() - start
+        finally:
+            with self._lock:
+                upstream.outstanding -= 1
+
+    def report_failure(self, upstream: Upstream, error: Exception):
+        """记录失败，429/401/403时剔除该上游一段时间"""
+        status = error_status(error)
+        with self._lock:
+            upstream.failures += 1
+            upstream.consecutive_failures += 1
+            upstream.last_error = f"{status or type(error).__name__}: {str(error)[:200]}"
+            now = time.monotonic()
+            if status == 429:
+                upstream.rate_limited += 1
+                cooldown = retry_after(error) or min(
+                    RATE_LIMIT_COOLDOWN * 2 ** (upstream.consecutive_failures - 1), MAX_COOLDOWN
+                )
+                upstream.ejected_until = now + cooldown
+            elif status in (401, 403):
+                upstream.unauthorized += 1
+                upstream.ejected_until = now + AUTH_COOLDOWN
+
+    def snapshot(self) -> List[Dict]:
+        now = time.monotonic()
+        with self._lock:
+            return [upstream.to_dict(now) for upstream in self.upstreams]
@@ -0,0 +1,221 @@
+"""冷数据归档
+
+长期未更新的会话，其对话记录和优化结果从热表移入 session_archives，
+按会话整体序列化为JSON并压缩存储；会话被重新打开时自动还原回热表。
+归档按批次进行，每个会话一个事务，批次之间暂停，避免长事务和大量锁等待。
+"""
+import json
+import time
+import zlib
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from .database import Database
+from .json_provider import _default
+from .logger import Logger
+
+# 归档表中需要还原的数据表（按外键依赖顺序）
+ARCHIVED_TABLES = ("conversations", "optimization_results")
+
+
+def pack_rows(tables: Dict[str, List[Dict]], level: int = 6) -> Tuple[bytes, int]:
+    """把各表的行序列化并压缩，返回 (压缩数据, 原始字节数)"""
+    raw = json.dumps(tables, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return zlib.compress(raw, level), len(raw)
+
+
+def unpack_rows(payload: bytes) -> Dict[str, List[Dict]]:
+    """解压归档数据，created_at 还原为datetime"""
+    tables = json.loads(zlib.decompress(payload).decode("utf-8"))
+    for rows in tables.values():
+        for row in rows:
+            if isinstance(row.get("created_at"), str):
+                row["created_at"] = datetime.fromisoformat(row["created_at"])
+    return tables
+
+
+class SessionArchiver:
+    """会话冷数据归档与还原"""
+
+    def __init__(self, db: Database, after_days: int = 30, batch_size: int = 50,
+                 pause: float = 0.5, logger: Optional[Logger] = None):
+        self.db = db
+        self.after_days = after_days
+        self.batch_size = batch_size
+        self.pause = pause
+        self.logger = logger or Logger()
+
+    def find_candidates(self, limit: int) -> List[int]:
+        """查找超过 after_days 未更新、尚未归档且 after_days 内没有被还原过的会话"""
+        query = """
+            SELECT id FROM sessions
+            WHERE archived_at IS NULL
+              AND updated_at < DATE_SUB(NOW(), INTERVAL %s DAY)
+              AND (rehydrated_at IS NULL OR rehydrated_at < DATE_SUB(NOW(), INTERVAL %s DAY))
+            ORDER BY updated_at ASC
+            LIMIT %s
+        """
+        params = (self.after_days, self.after_days, limit)
+        return [row['id'] for row in self.db.execute_query(query, params)]
+
+    def archive_session(self, session_id: int) -> Optional[Dict]:
+        """在一个事务中归档单个会话，会话已被更新或已归档时返回None"""
+        with self.db.get_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            # 锁住会话行：并发写入对话时的外键检查会等待本事务完成
+            cursor.execute(
+                """
+                SELECT id, user_id FROM sessions
+                WHERE id = %s AND archived_at IS NULL
+                  AND updated_at < DATE_SUB(NOW(), INTERVAL %s DAY)
+                  AND (rehydrated_at IS NULL OR rehydrated_at < DATE_SUB(NOW(), INTERVAL %s DAY))
+                FOR UPDATE
+                """,
+                (session_id, self.after_days, self.after_days)
+            )
+            session_row = cursor.fetchone()
+            if session_row is None:
+                cursor.close()
+                return None
+
+            tables = {}
+            for table in ARCHIVED_TABLES:
+                cursor.execute(f"SELECT * FROM {table} WHERE session_id = %s ORDER BY id", (session_id,))
+                tables[table] = cursor.fetchall()
+
+            stats = {
+                "conversations": len(tables["conversations"]),
+                "results": len(tables["optimization_results"]),
+                "raw_bytes": 0,
+                "compressed_bytes": 0,
+            }
+            if stats["conversations"] or stats["results"]:
+                payload, stats["raw_bytes"] = pack_rows(tables)
+                stats["compressed_bytes"] = len(payload)
+                cursor.execute(
+                    """
+                    INSERT INTO session_archives
+                    (session_id, user_id, conversation_count, result_count, codec, payload)
+                    VALUES (%s, %s, %s, %s, 'zlib', %s)
+                    """,
+                    (session_id, session_row['user_id'], stats["conversations"], stats["results"], payload)
+                )
+                for table in reversed(ARCHIVED_TABLES):
+                    cursor.execute(f"DELETE FROM {table} WHERE session_id = %s", (session_id,))
+
+            # 空会话也打标记，避免每批都重新选中；rehydrate 遇到没有归档行的标记会直接清除
+            # 显式保留updated_at，避免 ON UPDATE CURRENT_TIMESTAMP 把会话变成“刚更新”
+            cursor.execute(
+                "UPDATE sessions SET archived_at = NOW(), updated_at = updated_at WHERE id = %s",
+                (session_id,)
+            )
+            cursor.close()
+            return stats
+
+    def run(self, max_sessions: Optional[int] = None) -> Dict:
+        """分批归档所有符合条件的会话，返回汇总统计"""
+        totals = {"sessions": 0, "conversations": 0, "results": 0, "raw_bytes": 0, "compressed_bytes": 0}
+        while max_sessions is None or totals["sessions"] < max_sessions:
+            limit = self.batch_size
+            if max_sessions is not None:
+                limit = min(limit, max_sessions - totals["sessions"])
+            candidates = self.find_candidates(limit)
+            if not candidates:
+                break
+            for session_id in candidates:
+                try:
+                    stats = self.archive_session(session_id)
+                except Exception as e:
+                    self.logger.error("归档会话失败 - 会话ID: %s, 错误: %s", session_id, e)
+                    continue
+                if stats is None:
+                    continue
+                totals["sessions"] += 1
+                for key in ("conversations", "results", "raw_bytes", "compressed_bytes"):
+                    totals[key] += stats[key]
+            self.logger.info("归档批次完成 - 累计会话: %s, 对话: %s, 结果: %s",
+                             totals["sessions"], totals["conversations"], totals["results"],
+                             event="archive_batch")
+            if len(candidates) < limit:
+                break
+            time.sleep(self.pause)
+        return totals
+
+    def rehydrate(self, session_id: int) -> bool:
+        """把已归档会话的数据还原回热表，没有归档数据时返回False
+
+        归档时没有对话和结果的会话只打了 archived_at 标记、没有归档行，这里直接清除标记。
+        还原时记录 rehydrated_at（不修改updated_at，会话列表顺序不变），find_candidates
+        在 after_days 内跳过该会话，避免每次读取旧会话都重新归档一遍。
+        """
+        # 先做无锁的主键查询，未归档会话的读取不需要加锁
+        rows = self.db.execute_query(
+            """
+            SELECT s.archived_at, a.session_id AS archive_id
+            FROM sessions s
+            LEFT JOIN session_archives a ON a.session_id = s.id
+            WHERE s.id = %s
+            """,
+            (session_id,)
+        )
+        if not rows:
+            return False
+        if rows[0]['archive_id'] is None:
+            if rows[0]['archived_at'] is not None:
+                self.db.execute_update(
+                    "UPDATE sessions SET archived_at = NULL, rehydrated_at = NOW(), updated_at = updated_at "
+                    "WHERE id = %s AND archived_at IS NOT NULL",
+                    (session_id,)
+                )
+            return False
+        with self.db.get_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            # 并发请求同时还原同一会话时，后到者在此等待并发现归档已被取走
+            cursor.execute(
+                "SELECT payload FROM session_archives WHERE session_id = %s FOR UPDATE",
+                (session_id,)
+            )
+            row = cursor.fetchone()
+            if row is None:
+                cursor.close()
+                return False
+
+            tables = unpack_rows(bytes(row['payload']))
+            for table in ARCHIVED_TABLES:
+                rows = tables.get(table) or []
+                if not rows:
+                    continue
+                columns = list(rows[0].keys())
+                column_list = ", ".join(f"`{column}`" for column in columns)
+                placeholders = ", ".join(["%s"] * len(columns))
+                cursor.executemany(
+                    f"INSERT INTO {table} ({column_list}) VALUES ({placeholders})",
+                    [tuple(item.get(column) for column in columns) for item in rows]
+                )
+            cursor.execute("DELETE FROM session_archives WHERE session_id = %s", (session_id,))
+            cursor.execute(
+                "UPDATE sessions SET archived_at = NULL, rehydrated_at = NOW(), updated_at = updated_at "
+                "WHERE id = %s",
+                (session_id,)
+            )
+            cursor.close()
+        self.logger.info("已还原归档会话 - 会话ID: %s", session_id, event="archive_rehydrated")
+        return True
+
+    def purge_inactive(self, days: int, chunk_size: int = 500) -> int:
+        """分批删除已软删除且超过days天未更新的会话（替代一次性级联删除）"""
+        query = """
+            DELETE FROM sessions
+            WHERE is_active = FALSE
+              AND updated_at < DATE_SUB(NOW(), INTERVAL %s DAY)
+            ORDER BY id
+            LIMIT %s
+        """
+        total = 0
+        while True:
+            deleted = self.db.execute_update(query, (days, chunk_size))
+            total += deleted
+            if deleted < chunk_size:
+                break
+            time.sleep(self.pause)
+        return total
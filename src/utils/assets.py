@@ -0,0 +1,167 @@
+"""静态资源构建与预压缩
+
+构建步骤为 script.js、style.css 生成带内容哈希的文件名以及 gzip/brotli
+预压缩版本，并改写 index.html、login.html 中的引用，输出到 static/dist/。
+运行时由 AssetManifest 根据 Accept-Encoding 选择预压缩文件，无需在请求中压缩。
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import re
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # brotli为可选依赖，缺失时只生成gzip版本
+    brotli = None
+
+DIST_DIR_NAME = "dist"
+MANIFEST_NAME = "manifest.json"
+
+# 需要指纹化的静态资源和需要改写引用的页面
+FINGERPRINTED_ASSETS = ("style.css", "script.js")
+HTML_PAGES = ("index.html", "login.html")
+
+# Content-Encoding -> 预压缩文件后缀
+ENCODING_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+
+def _content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _write_variants(target: Path, data: bytes) -> List[str]:
+    """写出原始文件及其预压缩版本，返回可用的编码列表"""
+    target.write_bytes(data)
+    encodings = []
+    if brotli is not None:
+        target.with_name(target.name + ".br").write_bytes(brotli.compress(data, quality=11))
+        encodings.append("br")
+    # mtime=0 使相同内容的构建产物字节一致
+    target.with_name(target.name + ".gz").write_bytes(gzip.compress(data, compresslevel=9, mtime=0))
+    encodings.append("gzip")
+    return encodings
+
+
+def build_assets(static_dir: Path) -> Dict:
+    """构建静态资源，返回写入manifest.json的内容"""
+    static_dir = Path(static_dir)
+    dist_dir = static_dir / DIST_DIR_NAME
+    dist_dir.mkdir(parents=True, exist_ok=True)
+
+    # 清理旧的构建产物
+    for old_file in dist_dir.iterdir():
+        if old_file.is_file():
+            old_file.unlink()
+
+    manifest: Dict[str, Dict] = {}
+    url_map: Dict[str, str] = {}
+
+    for name in FINGERPRINTED_ASSETS:
+        source = static_dir / name
+        if not source.exists():
+            continue
+        data = source.read_bytes()
+        digest = _content_hash(data)
+        stem, suffix = name.rsplit(".", 1)
+        hashed_name = f"{stem}.{digest[:10]}.{suffix}"
+        encodings = _write_variants(dist_dir / hashed_name, data)
+        manifest[name] = {
+            "file": hashed_name,
+            "etag": digest[:32],
+            "immutable": True,
+            "encodings": encodings,
+        }
+        url_map[f"/static/{name}"] = f"/static/{DIST_DIR_NAME}/{hashed_name}"
+
+    for page in HTML_PAGES:
+        source = static_dir / page
+        if not source.exists():
+            continue
+        html = source.read_text(encoding="utf-8")
+        for original_url, hashed_url in url_map.items():
+            html = re.sub(r'(["\'])' + re.escape(original_url) + r'\1', r'\1' + hashed_url + r'\1', html)
+        data = html.encode("utf-8")
+        encodings = _write_variants(dist_dir / page, data)
+        manifest[page] = {
+            "file": page,
+            "etag": _content_hash(data)[:32],
+            "immutable": False,
+            "encodings": encodings,
+        }
+
+    (dist_dir / MANIFEST_NAME).write_text(
+        json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8"
+    )
+    return manifest
+
+
+def parse_accept_encoding(header: Optional[str]) -> Dict[str, float]:
+    """解析Accept-Encoding请求头，返回 编码 -> q值"""
+    accepted: Dict[str, float] = {}
+    if not header:
+        return accepted
+    for part in header.split(","):
+        pieces = part.strip().split(";")
+        coding = pieces[0].strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in pieces[1:]:
+            param = param.strip()
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        accepted[coding] = q
+    return accepted
+
+
+class AssetManifest:
+    """已构建静态资源的查询表"""
+
+    def __init__(self, static_dir: Path):
+        self.static_dir = Path(static_dir)
+        self.dist_dir = self.static_dir / DIST_DIR_NAME
+        self.entries: Dict[str, Dict] = {}
+        self.by_file: Dict[str, Dict] = {}
+        self.reload()
+
+    def reload(self):
+        """重新加载manifest.json，不存在时视为未构建"""
+        manifest_path = self.dist_dir / MANIFEST_NAME
+        if manifest_path.exists():
+            self.entries = json.loads(manifest_path.read_text(encoding="utf-8"))
+        else:
+            self.entries = {}
+        self.by_file = {entry["file"]: entry for entry in self.entries.values()}
+
+    @property
+    def available(self) -> bool:
+        return bool(self.entries)
+
+    def page(self, name: str) -> Optional[Dict]:
+        """获取页面（index.html/login.html）的构建信息"""
+        return self.entries.get(name)
+
+    def dist_file(self, filename: str) -> Optional[Dict]:
+        """获取dist目录中某个构建产物的信息"""
+        return self.by_file.get(filename)
+
+    def resolve(self, entry: Dict, accept_encoding: Optional[str]) -> Tuple[Path, Optional[str], str, str]:
+        """根据Accept-Encoding选择文件
+
+        返回 (文件路径, Content-Encoding或None, ETag, MIME类型)
+        """
+        accepted = parse_accept_encoding(accept_encoding)
+        path = self.dist_dir / entry["file"]
+        mimetype = mimetypes.guess_type(entry["file"])[0] or "application/octet-stream"
+        for encoding in ("br", "gzip"):
+            q = accepted.get(encoding, accepted.get("*", 0.0))
+            if encoding in entry.get("encodings", []) and q > 0:
+                suffix = ENCODING_SUFFIXES[encoding]
+                return path.with_name(path.name + suffix), encoding, f'{entry["etag"]}-{encoding}', mimetype
+        return path, None, entry["etag"], mimetype
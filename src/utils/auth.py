@@ -8,9 +8,10 @@ from .database import Database, UserDAO
 class AuthService:
     """用户认证服务"""
     
-    def __init__(self):
-        self.db = Database()
-        self.user_dao = UserDAO(self.db)
+    def __init__(self, db: Optional[Database] = None, user_dao: Optional[UserDAO] = None):
+        # 与应用共用同一个Database实例，避免重复创建连接配置
+        self.db = db or Database()
+        self.user_dao = user_dao or UserDAO(self.db)
     
     @staticmethod
     def hash_password(password: str) -> str:
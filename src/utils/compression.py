@@ -0,0 +1,135 @@
+"""HTTP响应压缩中间件
+
+对较大的JSON/文本响应按Accept-Encoding进行gzip或brotli压缩：
+- 低于阈值或不在类型白名单内的响应保持原样
+- 已设置Content-Encoding的响应（如预压缩静态资源）不会重复压缩
+- 流式响应按块压缩并逐块flush，text/event-stream（SSE）始终不压缩
+"""
+import gzip
+import zlib
+from typing import Iterable, Iterator, Optional, Sequence
+
+from .assets import parse_accept_encoding
+
+try:
+    import brotli
+except ImportError:  # brotli为可选依赖
+    brotli = None
+
+DEFAULT_MIMETYPES = (
+    "application/json",
+    "text/html",
+    "text/plain",
+    "text/css",
+    "text/markdown",
+    "application/javascript",
+    "text/javascript",
+)
+
+# 这些类型需要逐条实时送达，压缩缓冲会破坏其语义
+NEVER_COMPRESS_MIMETYPES = ("text/event-stream",)
+
+
+def compress_bytes(data: bytes, encoding: str, gzip_level: int = 6, brotli_quality: int = 4) -> bytes:
+    """按指定编码压缩完整的响应体"""
+    if encoding == "br":
+        return brotli.compress(data, quality=brotli_quality)
+    return gzip.compress(data, compresslevel=gzip_level, mtime=0)
+
+
+def compress_stream(chunks: Iterable[bytes], encoding: str,
+                    gzip_level: int = 6, brotli_quality: int = 4) -> Iterator[bytes]:
+    """流式压缩：每个数据块压缩后立即flush，保证客户端能及时收到"""
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=brotli_quality)
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode("utf-8")
+            data = compressor.process(chunk) + compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
+        return
+
+    compressor = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode("utf-8")
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush(zlib.Z_FINISH)
+
+
+class ResponseCompressor:
+    """Flask响应压缩扩展"""
+
+    def __init__(self, app=None, min_size: int = 1024,
+                 mimetypes: Sequence[str] = DEFAULT_MIMETYPES,
+                 gzip_level: int = 6, brotli_quality: int = 4,
+                 enable_brotli: bool = True):
+        self.min_size = min_size
+        self.mimetypes = tuple(mimetypes)
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.enable_brotli = enable_brotli and brotli is not None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """注册after_request钩子"""
+        app.after_request(self.after_request)
+
+    def choose_encoding(self, accept_encoding: Optional[str]) -> Optional[str]:
+        """根据Accept-Encoding选择压缩算法，优先brotli"""
+        accepted = parse_accept_encoding(accept_encoding)
+        candidates = ("br", "gzip") if self.enable_brotli else ("gzip",)
+        for encoding in candidates:
+            if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+                return encoding
+        return None
+
+    def _should_compress(self, response) -> bool:
+        if response.status_code < 200 or response.status_code in (204, 206, 304):
+            return False
+        if "Content-Encoding" in response.headers:
+            return False
+        mimetype = response.mimetype or ""
+        if mimetype in NEVER_COMPRESS_MIMETYPES:
+            return False
+        if mimetype not in self.mimetypes:
+            return False
+        if response.direct_passthrough:
+            # 文件直传的响应（send_file）交给静态资源管线处理
+            return False
+        return True
+
+    def after_request(self, response):
+        """压缩符合条件的响应"""
+        from flask import request
+
+        if not self._should_compress(response):
+            return response
+
+        encoding = self.choose_encoding(request.headers.get("Accept-Encoding"))
+        response.vary.add("Accept-Encoding")
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            response.response = compress_stream(
+                response.response, encoding, self.gzip_level, self.brotli_quality
+            )
+            response.headers.pop("Content-Length", None)
+        else:
+            body = response.get_data()
+            if len(body) < self.min_size:
+                return response
+            response.set_data(compress_bytes(body, encoding, self.gzip_level, self.brotli_quality))
+
+        response.headers["Content-Encoding"] = encoding
+        # 压缩后的字节与原ETag不再一致，降级为弱ETag
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
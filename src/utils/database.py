@@ -1,18 +1,30 @@
 """数据库操作层"""
-import mysql.connector
-from mysql.connector import Error
 from typing import Optional, List, Dict, Tuple
+import atexit
 import os
+import threading
+from datetime import datetime
 from dotenv import load_dotenv
 from contextlib import contextmanager
 
+from .cache import TTLCache
+from . import stage_delta
+
 load_dotenv()
 
 
 class Database:
-    """数据库连接管理"""
+    """数据库连接管理
+    
+    pool_size > 0 时使用连接池。连接池按进程创建：在prefork服务器中
+    fork出的worker首次使用时会自动建立自己的连接池，不会共享父进程的连接。
+    """
     
-    def __init__(self):
+    def __init__(self, pool_size: Optional[int] = None):
+        self.pool_size = pool_size if pool_size is not None else int(os.getenv('MYSQL_POOL_SIZE', 5))
+        self._pool = None
+        self._pool_pid = None
+        self._pool_lock = threading.Lock()
         self.config = {
             'host': os.getenv('MYSQL_HOST', 'localhost'),
             'port': int(os.getenv('MYSQL_PORT', 3306)),
@@ -23,16 +35,52 @@ class Database:
             'collation': 'utf8mb4_unicode_ci'
         }
     
+    def _get_pool(self):
+        """获取当前进程的连接池（fork后自动重建）"""
+        pid = os.getpid()
+        if self._pool is not None and self._pool_pid == pid:
+            return self._pool
+        with self._pool_lock:
+            if self._pool is None or self._pool_pid != pid:
+                from mysql.connector import pooling
+                self._pool = pooling.MySQLConnectionPool(
+                    pool_name=f"prompt_pool_{pid}_{id(self)}",
+                    pool_size=self.pool_size,
+                    **self.config
+                )
+                self._pool_pid = pid
+        return self._pool
+    
+    def reset_pool(self):
+        """丢弃当前连接池，下次使用时重新建立（用于worker fork之后）"""
+        with self._pool_lock:
+            self._pool = None
+            self._pool_pid = None
+    
+    def _connect(self):
+        """从连接池获取连接，连接池耗尽时临时新建连接"""
+        import mysql.connector
+        if self.pool_size <= 0:
+            return mysql.connector.connect(**self.config)
+        from mysql.connector.errors import PoolError
+        try:
+            return self._get_pool().get_connection()
+        except PoolError:
+            return mysql.connector.connect(**self.config)
+    
     @contextmanager
     def get_connection(self):
         """获取数据库连接（上下文管理器）"""
+        # 驱动在首次连接时才导入，不影响进程启动速度
+        from mysql.connector import Error
+        
         conn = None
         max_retries = 3
         retry_delay = 1
         
         for attempt in range(max_retries):
             try:
-                conn = mysql.connector.connect(**self.config)
+                conn = self._connect()
                 yield conn
                 conn.commit()
                 return
@@ -79,35 +127,185 @@ class Database:
             last_id = cursor.lastrowid
             cursor.close()
             return last_id
+    
+    def execute_many(self, query: str, params_list: List[tuple]) -> int:
+        """在同一事务中批量执行语句并返回影响的行数"""
+        if not params_list:
+            return 0
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.executemany(query, params_list)
+            affected_rows = cursor.rowcount
+            cursor.close()
+            return affected_rows
+
+
+class LastLoginWriteBehind:
+    """最后登录时间的写后缓冲
+
+    登录时只在内存中记录时间，同一用户的多次登录合并为一条，
+    由后台线程按固定间隔或缓冲达到批量大小时批量写入数据库。
+    """
+    
+    def __init__(self, db: Database, flush_interval: float = 5, batch_size: int = 200):
+        self.db = db
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._pending: Dict[int, datetime] = {}
+        self._lock = threading.Lock()
+        self._start()
+        atexit.register(self.close)
+        # fork出的子进程中重新启动后台线程（父进程的缓冲由父进程负责写出）
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._restart_after_fork)
+    
+    def _start(self):
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="last-login-writer", daemon=True)
+        self._thread.start()
+    
+    def _restart_after_fork(self):
+        if self._stopped.is_set():
+            return
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._start()
+    
+    def record(self, user_id: int, login_time: Optional[datetime] = None):
+        """记录一次登录（同一用户只保留最新时间）"""
+        with self._lock:
+            self._pending[user_id] = login_time or datetime.now()
+            pending_count = len(self._pending)
+        if pending_count >= self.batch_size:
+            self._wakeup.set()
+    
+    def flush(self) -> int:
+        """立即将缓冲区写入数据库，返回写入的用户数"""
+        with self._lock:
+            if not self._pending:
+                return 0
+            batch, self._pending = self._pending, {}
+        query = "UPDATE users SET last_login = %s WHERE id = %s"
+        try:
+            self.db.execute_many(query, [(ts, uid) for uid, ts in batch.items()])
+        except Exception:
+            # 写入失败时放回缓冲区，保留较新的时间，下次重试
+            with self._lock:
+                for uid, ts in batch.items():
+                    if uid not in self._pending or self._pending[uid] < ts:
+                        self._pending[uid] = ts
+            raise
+        return len(batch)
+    
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                pass
+    
+    def close(self):
+        """停止后台线程并写出剩余数据"""
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        self._wakeup.set()
+        self._thread.join(timeout=self.flush_interval + 1)
+        try:
+            self.flush()
+        except Exception:
+            pass
 
 
 class UserDAO:
-    """用户数据访问对象"""
+    """用户数据访问对象
     
-    def __init__(self, db: Database):
+    用户记录按ID和用户名缓存较短时间，写操作时失效；
+    提供 write_behind 时，最后登录时间通过写后缓冲批量更新。
+    """
+    
+    def __init__(self, db: Database, cache_ttl: float = 0,
+                 write_behind: Optional[LastLoginWriteBehind] = None):
         self.db = db
+        self.cache = TTLCache(ttl=cache_ttl)
+        self.write_behind = write_behind
+    
+    def _cache_user(self, user: Optional[Dict]):
+        if user:
+            self.cache.set(("id", user['id']), user)
+            self.cache.set(("username", user['username']), user)
+    
+    def _invalidate(self, user_id: int = None, username: str = None):
+        if user_id is not None:
+            cached = self.cache.get(("id", user_id))
+            if cached:
+                username = username or cached['username']
+            self.cache.delete(("id", user_id))
+        if username is not None:
+            self.cache.delete(("username", username))
     
     def create_user(self, username: str, password_hash: str) -> int:
         """创建用户"""
         query = "INSERT INTO users (username, password_hash) VALUES (%s, %s)"
-        return self.db.execute_insert(query, (username, password_hash))
+        user_id = self.db.execute_insert(query, (username, password_hash))
+        self._invalidate(user_id, username)
+        return user_id
     
     def get_user_by_username(self, username: str) -> Optional[Dict]:
         """通过用户名获取用户"""
+        cached = self.cache.get(("username", username))
+        if cached is not None:
+            return dict(cached)
         query = "SELECT * FROM users WHERE username = %s"
         results = self.db.execute_query(query, (username,))
-        return results[0] if results else None
+        user = results[0] if results else None
+        self._cache_user(user)
+        return dict(user) if user else None
     
     def get_user_by_id(self, user_id: int) -> Optional[Dict]:
         """通过ID获取用户"""
+        cached = self.cache.get(("id", user_id))
+        if cached is not None:
+            return dict(cached)
         query = "SELECT * FROM users WHERE id = %s"
         results = self.db.execute_query(query, (user_id,))
-        return results[0] if results else None
+        user = results[0] if results else None
+        self._cache_user(user)
+        return dict(user) if user else None
     
     def update_last_login(self, user_id: int):
         """更新最后登录时间"""
+        if self.write_behind is not None:
+            login_time = datetime.now()
+            self.write_behind.record(user_id, login_time)
+            # 缓存中的记录同步更新，避免读到旧的登录时间
+            cached = self.cache.get(("id", user_id))
+            if cached is not None:
+                self._cache_user(dict(cached, last_login=login_time))
+            return
         query = "UPDATE users SET last_login = NOW() WHERE id = %s"
         self.db.execute_update(query, (user_id,))
+        self._invalidate(user_id)
+
+
+def _bump_user_stats(cursor, column: str, delta: int, session_id: int = None, user_id: int = None):
+    """在调用方的事务中调整用户统计计数（按用户ID或会话ID定位用户）"""
+    if user_id is not None:
+        source, key = "SELECT id, GREATEST(%s, 0), NOW() FROM users WHERE id = %s", user_id
+    else:
+        source, key = "SELECT user_id, GREATEST(%s, 0), NOW() FROM sessions WHERE id = %s", session_id
+    cursor.execute(
+        f"""
+        INSERT INTO user_stats (user_id, {column}, last_activity) {source}
+        ON DUPLICATE KEY UPDATE
+            {column} = GREATEST({column} + %s, 0),
+            last_activity = IF(%s > 0, NOW(), last_activity)
+        """,
+        (delta, key, delta, delta)
+    )
 
 
 class SessionDAO:
@@ -118,12 +316,18 @@ class SessionDAO:
     
     def create_session(self, user_id: int, session_name: str = None, 
                       initial_requirement: str = None) -> int:
-        """创建会话"""
+        """创建会话（同一事务中更新用户会话数）"""
         query = """
             INSERT INTO sessions (user_id, session_name, initial_requirement) 
             VALUES (%s, %s, %s)
         """
-        return self.db.execute_insert(query, (user_id, session_name, initial_requirement))
+        with self.db.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, (user_id, session_name, initial_requirement))
+            session_id = cursor.lastrowid
+            _bump_user_stats(cursor, "total_sessions", 1, user_id=user_id)
+            cursor.close()
+            return session_id
     
     def get_user_sessions(self, user_id: int) -> List[Dict]:
         """获取用户的所有会话"""
@@ -162,20 +366,109 @@ class SessionDAO:
 
 
 class ConversationDAO:
-    """对话数据访问对象"""
+    """对话数据访问对象
     
-    def __init__(self, db: Database):
+    传入archiver时，读取已归档会话会先把数据还原回热表；
+    传入compressor（TextCompressor）时，ai_response超过阈值后压缩存储，读取时透明解压；
+    delta_results为True时，add_turn_with_result写入的Kimi/Qwen结果按增量存储（见OptimizationResultDAO）。
+    """
+    
+    COMPRESSED_FIELDS = ("ai_response",)
+    
+    def __init__(self, db: Database, archiver=None, compressor=None, delta_results: bool = False):
         self.db = db
+        self.archiver = archiver
+        self.compressor = compressor
+        self.delta_results = delta_results
     
     def add_conversation(self, session_id: int, turn_number: int,
                         user_message: str, ai_response: str) -> int:
-        """添加对话记录"""
+        """添加对话记录（同一事务中更新会话和用户的计数）"""
         query = """
-            INSERT INTO conversations (session_id, turn_number, user_message, ai_response)
-            VALUES (%s, %s, %s, %s)
+            INSERT INTO conversations (session_id, turn_number, user_message, ai_response, version)
+            VALUES (%s, %s, %s, %s, %s)
         """
-        return self.db.execute_insert(query, (session_id, turn_number, user_message, ai_response))
+        if self.archiver is not None:
+            # 已归档会话先还原，否则热表有了新行后，读取时不再还原归档中的历史
+            self.archiver.rehydrate(session_id)
+        if self.compressor is not None:
+            ai_response = self.compressor.encode(ai_response)
+        with self.db.get_connection() as conn:
+            cursor = conn.cursor()
+            # 先递增会话版本（同时锁定会话行），新对话记录该版本
+            cursor.execute(
+                """
+                UPDATE sessions
+                SET conversation_count = conversation_count + 1, last_turn = GREATEST(last_turn, %s),
+                    version = version + 1
+                WHERE id = %s
+                """,
+                (turn_number, session_id)
+            )
+            cursor.execute("SELECT version FROM sessions WHERE id = %s", (session_id,))
+            row = cursor.fetchone()
+            version = row[0] if row else 0
+            cursor.execute(query, (session_id, turn_number, user_message, ai_response, version))
+            conversation_id = cursor.lastrowid
+            _bump_user_stats(cursor, "total_conversations", 1, session_id=session_id)
+            cursor.close()
+            return conversation_id
     
+    def add_turn_with_result(self, session_id: int, user_message: str, ai_response: str,
+                             original_prompt: str, deepseek_result: str, kimi_result: str,
+                             qwen_result: str) -> Tuple[int, int, int]:
+        """在同一事务中追加一轮对话和对应的优化结果，返回 (轮次, 对话ID, 结果ID)
+
+        轮次号在锁定会话行后按 last_turn + 1 分配，并发写入同一会话时不会重复。
+        """
+        if self.archiver is not None:
+            # 已归档会话先还原，保证新轮次接在已有历史之后
+            self.archiver.rehydrate(session_id)
+        if self.delta_results:
+            deepseek_result, kimi_result, qwen_result = stage_delta.encode_results(
+                deepseek_result, kimi_result, qwen_result
+            )
+        if self.compressor is not None:
+            ai_response, deepseek_result, kimi_result, qwen_result = (
+                self.compressor.encode(text) for text in (ai_response, deepseek_result, kimi_result, qwen_result)
+            )
+        with self.db.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT last_turn, version FROM sessions WHERE id = %s FOR UPDATE", (session_id,))
+            row = cursor.fetchone()
+            if row is None:
+                cursor.close()
+                raise ValueError(f"会话不存在: {session_id}")
+            turn_number, version = row[0] + 1, row[1] + 1
+            cursor.execute(
+                """
+                INSERT INTO conversations (session_id, turn_number, user_message, ai_response, version)
+                VALUES (%s, %s, %s, %s, %s)
+                """,
+                (session_id, turn_number, user_message, ai_response, version)
+            )
+            conversation_id = cursor.lastrowid
+            cursor.execute(
+                """
+                UPDATE sessions SET conversation_count = conversation_count + 1, last_turn = %s, version = %s
+                WHERE id = %s
+                """,
+                (turn_number, version, session_id)
+            )
+            _bump_user_stats(cursor, "total_conversations", 1, session_id=session_id)
+            cursor.execute(
+                """
+                INSERT INTO optimization_results
+                (session_id, original_prompt, deepseek_result, kimi_result, qwen_result)
+                VALUES (%s, %s, %s, %s, %s)
+                """,
+                (session_id, original_prompt, deepseek_result, kimi_result, qwen_result)
+            )
+            result_id = cursor.lastrowid
+            _bump_user_stats(cursor, "total_results", 1, session_id=session_id)
+            cursor.close()
+            return turn_number, conversation_id, result_id
+
     def get_session_conversations(self, session_id: int) -> List[Dict]:
         """获取会话的所有对话"""
         query = """
@@ -183,24 +476,97 @@ class ConversationDAO:
             WHERE session_id = %s
             ORDER BY turn_number ASC
         """
-        return self.db.execute_query(query, (session_id,))
+        rows = self.db.execute_query(query, (session_id,))
+        if not rows and self.archiver is not None and self.archiver.rehydrate(session_id):
+            rows = self.db.execute_query(query, (session_id,))
+        if self.compressor is not None:
+            for row in rows:
+                self.compressor.decode_row(row, *self.COMPRESSED_FIELDS)
+        return rows
+    
+    def get_conversations_since(self, session_id: int, since_version: Optional[int] = None,
+                                since_turn: Optional[int] = None) -> List[Dict]:
+        """增量获取会话中版本号大于since_version或轮次大于since_turn的对话"""
+        if since_version is not None:
+            condition, value = "version > %s", since_version
+        else:
+            condition, value = "turn_number > %s", since_turn or 0
+        query = f"""
+            SELECT * FROM conversations
+            WHERE session_id = %s AND {condition}
+            ORDER BY turn_number ASC
+        """
+        rows = self.db.execute_query(query, (session_id, value))
+        if self.compressor is not None:
+            for row in rows:
+                self.compressor.decode_row(row, *self.COMPRESSED_FIELDS)
+        return rows
     
     def delete_conversation(self, conversation_id: int):
         """删除对话记录"""
-        query = "DELETE FROM conversations WHERE id = %s"
-        self.db.execute_update(query, (conversation_id,))
+        with self.db.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT session_id FROM conversations WHERE id = %s FOR UPDATE", (conversation_id,))
+            row = cursor.fetchone()
+            if row is None:
+                cursor.close()
+                return
+            session_id = row[0]
+            cursor.execute("DELETE FROM conversations WHERE id = %s", (conversation_id,))
+            # MySQL按从左到右的顺序赋值，reset_version取递增后的版本
+            cursor.execute(
+                """
+                UPDATE sessions
+                SET conversation_count = GREATEST(conversation_count - 1, 0),
+                    version = version + 1, reset_version = version
+                WHERE id = %s
+                """,
+                (session_id,)
+            )
+            _bump_user_stats(cursor, "total_conversations", -1, session_id=session_id)
+            cursor.close()
     
     def clear_session_conversations(self, session_id: int):
         """清空会话的所有对话"""
-        query = "DELETE FROM conversations WHERE session_id = %s"
-        self.db.execute_update(query, (session_id,))
+        if self.archiver is not None:
+            # 归档中的对话也要清掉，否则下次读取时会被还原
+            self.archiver.rehydrate(session_id)
+        with self.db.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM conversations WHERE session_id = %s", (session_id,))
+            deleted = cursor.rowcount
+            if deleted:
+                cursor.execute(
+                    """
+                    UPDATE sessions
+                    SET conversation_count = 0, last_turn = 0, version = version + 1, reset_version = version
+                    WHERE id = %s
+                    """,
+                    (session_id,)
+                )
+                _bump_user_stats(cursor, "total_conversations", -deleted, session_id=session_id)
+            cursor.close()
 
 
 class OptimizationResultDAO:
-    """优化结果数据访问对象"""
+    """优化结果数据访问对象（compressor用法同ConversationDAO，压缩三步输出）
     
-    def __init__(self, db: Database):
+    delta_results为True时，Kimi结果存为相对DeepSeek结果的行级增量、Qwen结果相对Kimi结果
+    （增量不够短时仍存全文），再按需压缩；读取时先解压再还原增量，与开关当前状态无关。
+    """
+    
+    COMPRESSED_FIELDS = ("deepseek_result", "kimi_result", "qwen_result")
+    
+    def __init__(self, db: Database, archiver=None, compressor=None, delta_results: bool = False):
         self.db = db
+        self.archiver = archiver
+        self.compressor = compressor
+        self.delta_results = delta_results
+    
+    def _decode(self, row: Optional[Dict]) -> Optional[Dict]:
+        if self.compressor is not None:
+            self.compressor.decode_row(row, *self.COMPRESSED_FIELDS)
+        return stage_delta.decode_row(row)
     
     def save_result(self, session_id: int, original_prompt: str,
                    deepseek_result: str, kimi_result: str, qwen_result: str) -> int:
@@ -210,8 +576,44 @@ class OptimizationResultDAO:
             (session_id, original_prompt, deepseek_result, kimi_result, qwen_result)
             VALUES (%s, %s, %s, %s, %s)
         """
-        return self.db.execute_insert(query, 
-            (session_id, original_prompt, deepseek_result, kimi_result, qwen_result))
+        if self.archiver is not None:
+            # 同 add_conversation：写入热表前先还原归档数据
+            self.archiver.rehydrate(session_id)
+        if self.delta_results:
+            deepseek_result, kimi_result, qwen_result = stage_delta.encode_results(
+                deepseek_result, kimi_result, qwen_result
+            )
+        if self.compressor is not None:
+            deepseek_result, kimi_result, qwen_result = (
+                self.compressor.encode(text) for text in (deepseek_result, kimi_result, qwen_result)
+            )
+        with self.db.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, (session_id, original_prompt, deepseek_result, kimi_result, qwen_result))
+            result_id = cursor.lastrowid
+            _bump_user_stats(cursor, "total_results", 1, session_id=session_id)
+            cursor.close()
+            return result_id
+    
+    def get_result(self, result_id: int) -> Optional[Dict]:
+        """获取单条优化结果"""
+        query = "SELECT * FROM optimization_results WHERE id = %s"
+        results = self.db.execute_query(query, (result_id,))
+        return self._decode(results[0]) if results else None
+    
+    def get_index_records(self) -> List[Tuple]:
+        """获取构建相似度索引所需的记录 (结果ID, 原始需求, 用户ID, 会话ID)"""
+        query = """
+            SELECT r.id, r.original_prompt, s.user_id, r.session_id
+            FROM optimization_results r
+            JOIN sessions s ON s.id = r.session_id
+            WHERE s.is_active = TRUE
+            ORDER BY r.id ASC
+        """
+        return [
+            (row['id'], row['original_prompt'] or '', row['user_id'], row['session_id'])
+            for row in self.db.execute_query(query)
+        ]
     
     def get_session_results(self, session_id: int) -> List[Dict]:
         """获取会话的优化结果"""
@@ -220,4 +622,192 @@ class OptimizationResultDAO:
             WHERE session_id = %s
             ORDER BY created_at DESC
         """
-        return self.db.execute_query(query, (session_id,))
+        rows = self.db.execute_query(query, (session_id,))
+        if not rows and self.archiver is not None and self.archiver.rehydrate(session_id):
+            rows = self.db.execute_query(query, (session_id,))
+        for row in rows:
+            self._decode(row)
+        return rows
+
+
+class SearchDAO:
+    """全文搜索数据访问对象（依赖迁移 0003 中的ngram FULLTEXT索引）
+    
+    已压缩的字段无法被全文索引命中，但仍会解压后用于生成摘要片段。
+    增量存储的结果仍可被命中（插入的文本以原文形式保存在JSON中），摘要片段中省略这些增量。
+    已归档会话的对话和结果在 session_archives 中压缩保存，不参与搜索（会话本身仍可按名称命中）。
+    """
+    
+    def __init__(self, db: Database, compressor=None):
+        self.db = db
+        self.compressor = compressor
+    
+    def search(self, user_id: int, boolean_query: str, limit: int = 20,
+               offset: int = 0) -> List[Dict]:
+        """在用户的会话、对话记录和优化结果中搜索，按相关度降序返回
+        
+        每个子查询只取ID和分数，按用户过滤并排序后各保留前 offset+limit 条，合并分页后
+        才回表读取这一页的正文。InnoDB的FULLTEXT索引无法与user_id索引组合，MATCH仍会
+        枚举所有用户的命中行，开销随全库命中数增长，数据量很大时需改用按用户分区的搜索服务。
+        """
+        query = """
+            SELECT hits.source, hits.item_id, hits.session_id, s.session_name,
+                   CASE hits.source
+                       WHEN 'session' THEN s.initial_requirement
+                       WHEN 'conversation' THEN CONCAT(c.user_message, '\n', c.ai_response)
+                       ELSE CONCAT_WS('\n', r.original_prompt, r.qwen_result, r.kimi_result, r.deepseek_result)
+                   END AS content,
+                   hits.created_at, hits.score
+            FROM (
+                (SELECT 'session' AS source, s.id AS item_id, s.id AS session_id, s.updated_at AS created_at,
+                        MATCH(s.session_name, s.initial_requirement) AGAINST (%s IN BOOLEAN MODE) AS score
+                 FROM sessions s
+                 WHERE MATCH(s.session_name, s.initial_requirement) AGAINST (%s IN BOOLEAN MODE)
+                   AND s.user_id = %s AND s.is_active = TRUE
+                 ORDER BY score DESC, s.updated_at DESC, s.id DESC
+                 LIMIT %s)
+                UNION ALL
+                (SELECT 'conversation', c.id, c.session_id, c.created_at,
+                        MATCH(c.user_message, c.ai_response) AGAINST (%s IN BOOLEAN MODE) AS score
+                 FROM conversations c
+                 JOIN sessions s ON s.id = c.session_id
+                 WHERE MATCH(c.user_message, c.ai_response) AGAINST (%s IN BOOLEAN MODE)
+                   AND s.user_id = %s AND s.is_active = TRUE
+                 ORDER BY score DESC, c.created_at DESC, c.id DESC
+                 LIMIT %s)
+                UNION ALL
+                (SELECT 'result', r.id, r.session_id, r.created_at,
+                        MATCH(r.original_prompt, r.deepseek_result, r.kimi_result, r.qwen_result)
+                            AGAINST (%s IN BOOLEAN MODE) AS score
+                 FROM optimization_results r
+                 JOIN sessions s ON s.id = r.session_id
+                 WHERE MATCH(r.original_prompt, r.deepseek_result, r.kimi_result, r.qwen_result)
+                           AGAINST (%s IN BOOLEAN MODE)
+                   AND s.user_id = %s AND s.is_active = TRUE
+                 ORDER BY score DESC, r.created_at DESC, r.id DESC
+                 LIMIT %s)
+                ORDER BY score DESC, created_at DESC, source, item_id DESC
+                LIMIT %s OFFSET %s
+            ) hits
+            JOIN sessions s ON s.id = hits.session_id
+            LEFT JOIN conversations c ON hits.source = 'conversation' AND c.id = hits.item_id
+            LEFT JOIN optimization_results r ON hits.source = 'result' AND r.id = hits.item_id
+            ORDER BY hits.score DESC, hits.created_at DESC, hits.source, hits.item_id DESC
+        """
+        params = (boolean_query, boolean_query, user_id, offset + limit) * 3 + (limit, offset)
+        rows = self.db.execute_query(query, params)
+        # 压缩值是单行base64、增量是单行JSON，按换行拆开即可逐段解压；
+        # 增量缺少基准无法单独还原，从摘要内容中去掉（同一结果的DeepSeek全文仍在）
+        for row in rows:
+            if row.get('content'):
+                parts = row['content'].split("\n")
+                if self.compressor is not None:
+                    parts = [self.compressor.decode(part) for part in parts]
+                row['content'] = "\n".join(part for part in parts if not stage_delta.is_encoded(part))
+        return rows
+
+
+class StatsDAO:
+    """用户及会话统计（读取反范式计数，O(1)），并提供计数校正"""
+    
+    # 按用户ID区间重算会话计数（未归档会话以热表为准，已归档会话以归档表为准）
+    RECONCILE_SESSIONS = """
+        UPDATE sessions s
+        LEFT JOIN (
+            SELECT c.session_id, COUNT(*) AS cnt, MAX(c.turn_number) AS last_turn
+            FROM conversations c
+            JOIN sessions cs ON cs.id = c.session_id
+            WHERE cs.user_id BETWEEN %s AND %s
+            GROUP BY c.session_id
+        ) c ON c.session_id = s.id
+        SET s.conversation_count = COALESCE(c.cnt, 0),
+            s.last_turn = COALESCE(c.last_turn, 0),
+            s.updated_at = s.updated_at
+        WHERE s.user_id BETWEEN %s AND %s
+          AND NOT EXISTS (SELECT 1 FROM session_archives a WHERE a.session_id = s.id)
+    """
+    RECONCILE_ARCHIVED_SESSIONS = """
+        UPDATE sessions s
+        JOIN session_archives a ON a.session_id = s.id
+        SET s.conversation_count = a.conversation_count, s.updated_at = s.updated_at
+        WHERE s.user_id BETWEEN %s AND %s
+    """
+    RECONCILE_USERS = """
+        INSERT INTO user_stats (user_id, total_sessions, total_conversations, total_results, last_activity)
+        SELECT u.id,
+               COALESCE(s.total_sessions, 0),
+               COALESCE(s.total_conversations, 0),
+               COALESCE(r.total_results, 0) + COALESCE(a.archived_results, 0),
+               s.last_activity
+        FROM users u
+        LEFT JOIN (
+            SELECT user_id, COUNT(*) AS total_sessions, SUM(conversation_count) AS total_conversations,
+                   MAX(updated_at) AS last_activity
+            FROM sessions WHERE user_id BETWEEN %s AND %s GROUP BY user_id
+        ) s ON s.user_id = u.id
+        LEFT JOIN (
+            SELECT rs.user_id, COUNT(*) AS total_results
+            FROM optimization_results r JOIN sessions rs ON rs.id = r.session_id
+            WHERE rs.user_id BETWEEN %s AND %s GROUP BY rs.user_id
+        ) r ON r.user_id = u.id
+        LEFT JOIN (
+            SELECT user_id, SUM(result_count) AS archived_results
+            FROM session_archives WHERE user_id BETWEEN %s AND %s GROUP BY user_id
+        ) a ON a.user_id = u.id
+        WHERE u.id BETWEEN %s AND %s
+        ON DUPLICATE KEY UPDATE
+            total_sessions = VALUES(total_sessions),
+            total_conversations = VALUES(total_conversations),
+            total_results = VALUES(total_results),
+            last_activity = VALUES(last_activity)
+    """
+    
+    def __init__(self, db: Database):
+        self.db = db
+    
+    def get_user_stats(self, user_id: int) -> Dict:
+        """获取用户统计（主键查询）"""
+        query = """
+            SELECT total_sessions, total_conversations, total_results, last_activity
+            FROM user_stats WHERE user_id = %s
+        """
+        results = self.db.execute_query(query, (user_id,))
+        if results:
+            return results[0]
+        return {"total_sessions": 0, "total_conversations": 0, "total_results": 0, "last_activity": None}
+    
+    def get_session_counters(self, session_id: int) -> Optional[Dict]:
+        """获取会话的对话数和最后轮次"""
+        query = "SELECT conversation_count, last_turn FROM sessions WHERE id = %s"
+        results = self.db.execute_query(query, (session_id,))
+        return results[0] if results else None
+    
+    def reconcile(self, batch_size: int = 200, pause: float = 0.1) -> Dict:
+        """按用户ID区间分批重算计数，修正硬删除等绕过DAO的写入造成的偏差
+        
+        返回各类被修正的行数（MySQL只统计值发生变化的行）。
+        """
+        import time
+        
+        bounds = self.db.execute_query("SELECT MIN(id) AS min_id, MAX(id) AS max_id FROM users")[0]
+        totals = {"users": 0, "sessions_fixed": 0, "user_stats_changed": 0}
+        if bounds['min_id'] is None:
+            return totals
+        
+        start = bounds['min_id']
+        while start <= bounds['max_id']:
+            end = start + batch_size - 1
+            with self.db.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(self.RECONCILE_SESSIONS, (start, end, start, end))
+                totals["sessions_fixed"] += cursor.rowcount
+                cursor.execute(self.RECONCILE_ARCHIVED_SESSIONS, (start, end))
+                totals["sessions_fixed"] += cursor.rowcount
+                cursor.execute(self.RECONCILE_USERS, (start, end) * 4)
+                # ON DUPLICATE KEY UPDATE：插入计1，更新计2，未变化计0
+                totals["user_stats_changed"] += cursor.rowcount
+                cursor.close()
+            totals["users"] += min(end, bounds['max_id']) - start + 1
+            start = end + 1
+            time.sleep(pause)
+        return totals
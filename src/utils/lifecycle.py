@@ -0,0 +1,54 @@
+"""进程生命周期管理：跟踪进行中的请求并支持优雅退出"""
+import threading
+import time
+from contextlib import contextmanager
+
+
+class InFlightTracker:
+    """跟踪进行中的长耗时任务（如三步优化流程）
+
+    进入排空状态后拒绝新任务，并可等待已有任务全部完成。
+    """
+
+    def __init__(self):
+        self._count = 0
+        self._draining = False
+        self._cond = threading.Condition()
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    @property
+    def draining(self) -> bool:
+        return self._draining
+
+    @contextmanager
+    def track(self):
+        """在任务执行期间计数；排空状态下抛出RuntimeError"""
+        with self._cond:
+            if self._draining:
+                raise RuntimeError("服务正在关闭，暂不接受新的任务")
+            self._count += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._count -= 1
+                self._cond.notify_all()
+
+    def stop_accepting(self):
+        """进入排空状态但不等待（可在信号处理函数中调用，不获取锁）"""
+        self._draining = True
+
+    def drain(self, timeout: float = 30) -> bool:
+        """进入排空状态并等待进行中的任务完成，超时返回False"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._draining = True
+            while self._count > 0:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
@@ -1,80 +1,315 @@
 """日志系统"""
+import atexit
+import copy
+import json
 import logging
+import os
+import queue
+import random
 import sys
+import threading
+import time
+from contextvars import ContextVar
+from datetime import datetime
 from pathlib import Path
-from logging.handlers import RotatingFileHandler
-from typing import Optional
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
+from typing import Optional, Union, Dict, Any
+
+# 当前请求的日志上下文（request_id、user_id等），由Web层在请求开始时设置
+_log_context: ContextVar[Dict[str, Any]] = ContextVar("log_context", default={})
+
+# JSON日志中固定输出的字段，缺失时为null，便于下游按字段解析
+JSON_FIELDS = ("event", "request_id", "user_id", "stage", "duration_ms", "sizes")
+
+
+def _parse_level(level: Union[str, int, None], default: int = logging.DEBUG) -> int:
+    """将字符串/数字日志级别转换为logging级别常量"""
+    if level is None or level == "":
+        return default
+    if isinstance(level, int):
+        return level
+    if str(level).isdigit():
+        return int(level)
+    value = logging.getLevelName(str(level).upper())
+    return value if isinstance(value, int) else default
+
+
+def parse_event_rates(spec: Optional[str]) -> Dict[str, float]:
+    """解析 "event_a=0.01,event_b=5" 形式的事件配置"""
+    rates: Dict[str, float] = {}
+    if not spec:
+        return rates
+    for item in spec.split(','):
+        if '=' not in item:
+            continue
+        name, value = item.split('=', 1)
+        try:
+            rates[name.strip()] = float(value)
+        except ValueError:
+            continue
+    return rates
+
+
+class JsonFormatter(logging.Formatter):
+    """结构化JSON日志格式化器，每条日志输出一行JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": datetime.fromtimestamp(record.created).strftime('%Y-%m-%d %H:%M:%S.%f')[:-3],
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "func": record.funcName,
+            "line": record.lineno,
+        }
+        for field in JSON_FIELDS:
+            payload[field] = getattr(record, field, None)
+        extra_fields = getattr(record, "fields", None)
+        if extra_fields:
+            payload["fields"] = extra_fields
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            # 经过StructuredQueueHandler时异常已在入队前渲染为文本
+            payload["exc"] = record.exc_text
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class StructuredQueueHandler(QueueHandler):
+    """保留异常信息的QueueHandler
+
+    标准QueueHandler.prepare()会把异常堆栈拼进message并清空exc_info，JSON日志因此
+    没有exc字段。这里只合并消息参数，把堆栈预先渲染到exc_text（traceback对象不能
+    安全地跨线程保留），文本和JSON格式化器都会读取它。
+    """
+
+    _exc_formatter = logging.Formatter()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self._exc_formatter.formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+
+class EventSamplingFilter(logging.Filter):
+    """按事件采样和限流的过滤器
+
+    只作用于带 event 名称且级别低于WARNING的日志，警告和错误始终保留。
+    sample_rates: 事件 -> 保留比例（0~1）
+    rate_limits: 事件 -> 每秒最多保留条数（令牌桶）
+    同时负责把当前请求上下文写入日志记录。
+    """
+
+    def __init__(self, sample_rates: Optional[Dict[str, float]] = None,
+                 rate_limits: Optional[Dict[str, float]] = None):
+        super().__init__()
+        self.sample_rates = sample_rates or {}
+        self.rate_limits = rate_limits or {}
+        self._buckets: Dict[str, list] = {}
+        self._lock = threading.Lock()
+        self.dropped: Dict[str, int] = {}
+
+    def _take_token(self, event: str, limit: float) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(event)
+            if bucket is None:
+                bucket = self._buckets[event] = [limit, now]
+            tokens = min(limit, bucket[0] + (now - bucket[1]) * limit)
+            bucket[1] = now
+            if tokens < 1:
+                bucket[0] = tokens
+                return False
+            bucket[0] = tokens - 1
+            return True
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        for key, value in _log_context.get().items():
+            if getattr(record, key, None) is None:
+                setattr(record, key, value)
+
+        event = getattr(record, "event", None)
+        if not event or record.levelno >= logging.WARNING:
+            return True
+
+        rate = self.sample_rates.get(event)
+        if rate is not None and random.random() >= rate:
+            self._count_drop(event)
+            return False
+
+        limit = self.rate_limits.get(event)
+        if limit is not None and not self._take_token(event, limit):
+            self._count_drop(event)
+            return False
+        return True
+
+    def _count_drop(self, event: str):
+        with self._lock:
+            self.dropped[event] = self.dropped.get(event, 0) + 1
 
 
 class Logger:
-    """日志管理器"""
-    
+    """日志管理器
+
+    业务线程只负责把日志记录放入内存队列，真正的格式化和终端/文件写入
+    （包括文件轮转）由后台QueueListener线程完成，不会阻塞请求线程。
+    日志方法支持 `%` 风格的惰性参数，例如 `logger.debug("长度: %d", n)`，
+    只有在级别生效时才会格式化消息。
+    可通过 event 及 stage/duration_ms/sizes 等关键字参数附加结构化字段，
+    配合 log_format="json" 输出稳定字段，并按事件进行采样和限流。
+    """
+
     _instance: Optional['Logger'] = None
-    
-    def __new__(cls, log_file: Optional[Path] = None):
+
+    def __new__(cls, log_file: Optional[Path] = None, **kwargs):
         if cls._instance is None:
             cls._instance = super().__new__(cls)
         return cls._instance
-    
-    def __init__(self, log_file: Optional[Path] = None):
+
+    def __init__(self, log_file: Optional[Path] = None,
+                 console_level: Union[str, int, None] = None,
+                 file_level: Union[str, int, None] = None,
+                 queue_size: int = -1,
+                 log_format: str = "text",
+                 sample_rates: Optional[Dict[str, float]] = None,
+                 rate_limits: Optional[Dict[str, float]] = None):
         if hasattr(self, '_initialized'):
             return
-        
+
         self.log_file = log_file
+        self.console_level = _parse_level(console_level)
+        self.file_level = _parse_level(file_level)
+        self.queue_size = queue_size
+        self.log_format = (log_format or "text").lower()
+        self.listener: Optional[QueueListener] = None
+        self.sampling_filter = EventSamplingFilter(sample_rates, rate_limits)
+
         self.logger = logging.getLogger("PromptOptimizer")
-        self.logger.setLevel(logging.DEBUG)
-        
+        # logger本身的级别取各handler中最低的，避免生成无人消费的记录
+        self.logger.setLevel(min(self.console_level, self.file_level) if log_file else self.console_level)
+        self.logger.propagate = False
+
         # 避免重复添加handler
         if not self.logger.handlers:
             self._setup_handlers()
-        
+
         self._initialized = True
-    
+
     def _setup_handlers(self):
         """设置日志处理器"""
-        
+        handlers = []
+
         # 终端处理器
         console_handler = logging.StreamHandler(sys.stdout)
-        console_handler.setLevel(logging.DEBUG)
-        console_formatter = logging.Formatter(
-            '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-            datefmt='%Y-%m-%d %H:%M:%S'
-        )
+        console_handler.setLevel(self.console_level)
+        if self.log_format == "json":
+            console_formatter = JsonFormatter()
+        else:
+            console_formatter = logging.Formatter(
+                '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+                datefmt='%Y-%m-%d %H:%M:%S'
+            )
         console_handler.setFormatter(console_formatter)
-        self.logger.addHandler(console_handler)
-        
+        handlers.append(console_handler)
+
         # 文件处理器（仅保留logs目录的app.log）
         if self.log_file:
-            file_formatter = logging.Formatter(
-                '%(asctime)s - %(name)s - %(levelname)s - %(funcName)s:%(lineno)d - %(message)s',
-                datefmt='%Y-%m-%d %H:%M:%S'
-            )
+            if self.log_format == "json":
+                file_formatter = JsonFormatter()
+            else:
+                file_formatter = logging.Formatter(
+                    '%(asctime)s - %(name)s - %(levelname)s - %(funcName)s:%(lineno)d - %(message)s',
+                    datefmt='%Y-%m-%d %H:%M:%S'
+                )
             file_handler = RotatingFileHandler(
                 self.log_file,
                 maxBytes=10*1024*1024,
                 backupCount=5,
                 encoding='utf-8'
             )
-            file_handler.setLevel(logging.DEBUG)
+            file_handler.setLevel(self.file_level)
             file_handler.setFormatter(file_formatter)
-            self.logger.addHandler(file_handler)
+            handlers.append(file_handler)
+
+        # 请求线程只入队，后台监听线程负责实际I/O；采样在入队前完成
+        log_queue: queue.Queue = queue.Queue(self.queue_size)
+        queue_handler = StructuredQueueHandler(log_queue)
+        queue_handler.addFilter(self.sampling_filter)
+        self.logger.addHandler(queue_handler)
+        self._log_queue = log_queue
+        self._handlers = handlers
+        self.listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        self.listener.start()
+        atexit.register(self.shutdown)
+        # fork出的子进程（如prefork worker）中后台线程不存在，需要重新启动
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._restart_listener)
     
-    def debug(self, message: str):
+    def _restart_listener(self):
+        """在子进程中重新启动后台监听线程"""
+        if self.listener is None:
+            return
+        self.listener = QueueListener(self._log_queue, *self._handlers, respect_handler_level=True)
+        self.listener.start()
+
+    def shutdown(self):
+        """停止后台监听线程，并将队列中剩余的日志全部写出"""
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+    @staticmethod
+    def set_context(**fields):
+        """设置当前请求的日志上下文（如request_id、user_id），覆盖之前的值"""
+        _log_context.set({k: v for k, v in fields.items() if v is not None})
+
+    @staticmethod
+    def update_context(**fields):
+        """在当前请求的日志上下文中追加字段"""
+        context = dict(_log_context.get())
+        context.update({k: v for k, v in fields.items() if v is not None})
+        _log_context.set(context)
+
+    @staticmethod
+    def _extra(event: Optional[str], fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """将事件名和结构化字段转换为logging的extra参数"""
+        if event is None and not fields:
+            return None
+        extra = {"event": event}
+        for field in JSON_FIELDS[1:]:
+            if field in fields:
+                extra[field] = fields.pop(field)
+        if fields:
+            extra["fields"] = fields
+        return extra
+
+    def is_enabled_for(self, level: int) -> bool:
+        """判断指定级别是否会被记录，用于跳过昂贵的日志参数计算"""
+        return self.logger.isEnabledFor(level)
+
+    def debug(self, message: str, *args, event: Optional[str] = None, **fields):
         """记录调试信息"""
-        self.logger.debug(message)
-    
-    def info(self, message: str):
+        self.logger.debug(message, *args, extra=self._extra(event, fields), stacklevel=2)
+
+    def info(self, message: str, *args, event: Optional[str] = None, **fields):
         """记录信息"""
-        self.logger.info(message)
-    
-    def warning(self, message: str):
+        self.logger.info(message, *args, extra=self._extra(event, fields), stacklevel=2)
+
+    def warning(self, message: str, *args, event: Optional[str] = None, **fields):
         """记录警告"""
-        self.logger.warning(message)
-    
-    def error(self, message: str, exc_info=False):
+        self.logger.warning(message, *args, extra=self._extra(event, fields), stacklevel=2)
+
+    def error(self, message: str, *args, exc_info=False, event: Optional[str] = None, **fields):
         """记录错误"""
-        self.logger.error(message, exc_info=exc_info)
-    
-    def critical(self, message: str, exc_info=False):
+        self.logger.error(message, *args, exc_info=exc_info,
+                          extra=self._extra(event, fields), stacklevel=2)
+
+    def critical(self, message: str, *args, exc_info=False, event: Optional[str] = None, **fields):
         """记录严重错误"""
-        self.logger.critical(message, exc_info=exc_info)
+        self.logger.critical(message, *args, exc_info=exc_info,
+                             extra=self._extra(event, fields), stacklevel=2)
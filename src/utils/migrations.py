@@ -0,0 +1,242 @@
+"""版本化数据库迁移
+
+migrations/ 目录下的 NNNN_描述.sql 按编号顺序执行，已执行的版本及其校验和
+记录在 schema_migrations 表中，每次只执行尚未执行的迁移。
+SQL解析支持 DELIMITER 指令（触发器、存储过程）以及字符串中的分隔符。
+"""
+import hashlib
+import re
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from .database import Database
+from .logger import Logger
+
+MIGRATIONS_DIR = Path(__file__).parent.parent.parent / "migrations"
+
+_FILENAME_PATTERN = re.compile(r"^(\d+)_(.+)\.sql$")
+
+# 对象已存在/已删除时的错误码：表已存在、列重复、索引重复、索引不存在。
+# 旧版 init_db.py 可能已执行过部分语句，遇到这些错误视为该步骤已完成。
+IDEMPOTENT_ERRORS = {1050, 1060, 1061, 1091}
+
+
+def split_statements(sql: str) -> List[str]:
+    """把SQL脚本拆分为单条语句
+
+    - 整行 -- 注释被忽略，语句内的换行保留
+    - DELIMITER 指令切换分隔符（用于触发器、存储过程主体中的分号）
+    - 引号内的分隔符不会拆分语句
+    """
+    statements = []
+    delimiter = ";"
+    buffer: List[str] = []
+    quote: Optional[str] = None
+
+    for line in sql.splitlines():
+        stripped = line.strip()
+        if quote is None and not "".join(buffer).strip():
+            if not stripped or stripped.startswith("--"):
+                continue
+            if stripped.upper().startswith("DELIMITER "):
+                delimiter = stripped.split(None, 1)[1]
+                continue
+
+        current = []
+        i = 0
+        while i < len(line):
+            char = line[i]
+            if quote is not None:
+                current.append(char)
+                if char == "\\" and i + 1 < len(line):
+                    current.append(line[i + 1])
+                    i += 2
+                    continue
+                if char == quote:
+                    quote = None
+            elif char in ("'", '"', "`"):
+                quote = char
+                current.append(char)
+            elif line.startswith("--", i) and (i + 2 == len(line) or line[i + 2].isspace()):
+                break
+            elif line.startswith(delimiter, i):
+                buffer.append("".join(current))
+                statement = "\n".join(buffer).strip()
+                if statement:
+                    statements.append(statement)
+                buffer, current = [], []
+                i += len(delimiter)
+                continue
+            else:
+                current.append(char)
+            i += 1
+        buffer.append("".join(current))
+
+    statement = "\n".join(buffer).strip()
+    if statement:
+        statements.append(statement)
+    return statements
+
+
+class Migration:
+    """单个迁移文件"""
+
+    def __init__(self, path: Path):
+        match = _FILENAME_PATTERN.match(path.name)
+        if not match:
+            raise ValueError(f"迁移文件名格式错误: {path.name}")
+        self.path = path
+        self.version = int(match.group(1))
+        self.name = match.group(2)
+        self.sql = path.read_text(encoding="utf-8")
+        self.checksum = hashlib.sha256(self.sql.encode("utf-8")).hexdigest()
+
+    def statements(self) -> List[str]:
+        return split_statements(self.sql)
+
+
+class MigrationRunner:
+    """按版本顺序执行迁移并记录到 schema_migrations"""
+
+    def __init__(self, db: Database, migrations_dir: Path = MIGRATIONS_DIR,
+                 logger: Optional[Logger] = None):
+        self.db = db
+        self.migrations_dir = Path(migrations_dir)
+        self.logger = logger or Logger()
+
+    def discover(self) -> List[Migration]:
+        migrations = [Migration(path) for path in self.migrations_dir.glob("*.sql")]
+        migrations.sort(key=lambda migration: migration.version)
+        versions = [migration.version for migration in migrations]
+        if len(versions) != len(set(versions)):
+            raise ValueError("存在重复的迁移版本号")
+        return migrations
+
+    def _ensure_table(self):
+        self.db.execute_update("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INT PRIMARY KEY,
+                name VARCHAR(255) NOT NULL,
+                checksum CHAR(64) NOT NULL,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+        """)
+
+    def applied(self) -> Dict[int, Dict]:
+        self._ensure_table()
+        rows = self.db.execute_query("SELECT version, name, checksum, applied_at FROM schema_migrations")
+        return {row['version']: row for row in rows}
+
+    def status(self) -> List[Dict]:
+        """各迁移的执行状态，已执行但文件被修改的标记为checksum_mismatch"""
+        applied = self.applied()
+        result = []
+        for migration in self.discover():
+            record = applied.get(migration.version)
+            if record is None:
+                state = "pending"
+            elif record['checksum'] != migration.checksum:
+                state = "checksum_mismatch"
+            else:
+                state = "applied"
+            result.append({
+                "version": migration.version,
+                "name": migration.name,
+                "state": state,
+                "applied_at": record['applied_at'] if record else None,
+            })
+        return result
+
+    def apply(self, migration: Migration):
+        """执行单个迁移（MySQL的DDL会隐式提交，失败时需按提示手动处理）"""
+        from mysql.connector import Error
+
+        with self.db.get_connection() as conn:
+            cursor = conn.cursor()
+            for statement in migration.statements():
+                try:
+                    cursor.execute(statement)
+                    if cursor.with_rows:
+                        cursor.fetchall()
+                except Error as e:
+                    if e.errno in IDEMPOTENT_ERRORS:
+                        self.logger.warning("迁移 %04d 中的语句已生效，跳过: %s", migration.version, e.msg)
+                        continue
+                    raise RuntimeError(
+                        f"迁移 {migration.path.name} 执行失败: {e}\n语句: {statement[:200]}"
+                    ) from e
+            cursor.execute(
+                "INSERT INTO schema_migrations (version, name, checksum) VALUES (%s, %s, %s)",
+                (migration.version, migration.name, migration.checksum)
+            )
+            cursor.close()
+
+    def migrate(self, target: Optional[int] = None) -> List[Migration]:
+        """执行所有未执行的迁移（可指定目标版本），返回本次执行的迁移"""
+        applied = self.applied()
+        executed = []
+        for migration in self.discover():
+            if target is not None and migration.version > target:
+                break
+            record = applied.get(migration.version)
+            if record is not None:
+                if record['checksum'] != migration.checksum:
+                    self.logger.warning("已执行的迁移文件被修改: %s", migration.path.name)
+                continue
+            self.logger.info("执行迁移: %s", migration.path.name)
+            self.apply(migration)
+            executed.append(migration)
+        return executed
+
+
+# 各DAO查询的EXPLAIN检查：(名称, SQL, 参数, 期望使用的索引)
+DAO_QUERY_PLANS = [
+    ("UserDAO.get_user_by_username",
+     "SELECT * FROM users WHERE username = %s", ("admin",), "username"),
+    ("SessionDAO.get_user_sessions",
+     "SELECT * FROM sessions WHERE user_id = %s AND is_active = TRUE ORDER BY updated_at DESC",
+     (1,), "idx_user_active_updated"),
+    ("ConversationDAO.get_session_conversations",
+     "SELECT * FROM conversations WHERE session_id = %s ORDER BY turn_number ASC",
+     (1,), "idx_session_turn"),
+    ("OptimizationResultDAO.get_session_results",
+     "SELECT * FROM optimization_results WHERE session_id = %s ORDER BY created_at DESC",
+     (1,), "idx_session_created"),
+    ("SessionArchiver.find_candidates",
+     "SELECT id FROM sessions WHERE archived_at IS NULL "
+     "AND updated_at < DATE_SUB(NOW(), INTERVAL %s DAY) "
+     "AND (rehydrated_at IS NULL OR rehydrated_at < DATE_SUB(NOW(), INTERVAL %s DAY)) "
+     "ORDER BY updated_at ASC LIMIT %s",
+     (30, 30, 50), "idx_archive_scan"),
+    ("ConversationDAO.get_conversations_since",
+     "SELECT * FROM conversations WHERE session_id = %s AND version > %s ORDER BY turn_number ASC",
+     (1, 0), "idx_session_version"),
+    ("UsageDAO.summary",
+     "SELECT day, provider, SUM(calls) FROM token_usage_daily WHERE day >= %s AND user_id = %s "
+     "GROUP BY day, provider ORDER BY day, provider",
+     ("2024-01-01", 1), "idx_user_day"),
+]
+
+
+def explain_dao_queries(db: Database) -> List[Dict]:
+    """对DAO的主要查询执行EXPLAIN，检查实际使用的索引（key）是否为期望的索引且没有filesort
+
+    表中数据很少时优化器可能选择全表扫描，结果会显示为未通过；应在有代表性数据量的库上执行
+    （测试中先写入样本数据并 ANALYZE TABLE）。
+    """
+    results = []
+    for name, query, params, expected in DAO_QUERY_PLANS:
+        plan = db.execute_query("EXPLAIN " + query, params)[0]
+        key = plan.get('key') or ""
+        possible_keys = plan.get('possible_keys') or ""
+        extra = plan.get('Extra') or ""
+        ok = key == expected and "filesort" not in extra
+        results.append({
+            "query": name,
+            "expected": expected,
+            "key": key or None,
+            "possible_keys": possible_keys or None,
+            "extra": extra or None,
+            "ok": ok,
+        })
+    return results
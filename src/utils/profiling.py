@@ -0,0 +1,374 @@
+"""按需采样性能剖析
+
+管理员为指定接口布置一次剖析任务（接下来N个请求，或按比例抽样），命中的请求在执行期间：
+- 由独立的采样线程按固定间隔读取请求线程的调用栈（sys._current_frames），
+  按两次采样之间的墙钟时间和该线程的CPU时间（pthread CPU时钟）累计到当前栈上
+- 可选用tracemalloc记录请求期间新增且未释放的内存分配（按分配位置的调用栈汇总）和峰值
+结果以折叠栈格式（flamegraph.pl / speedscope 可直接读取，数值单位为微秒或字节）写入目录，
+任意worker进程都能下载。布置状态同样保存在该目录中，各进程每秒最多检查一次，
+未布置时每个请求只多一次时钟读取和比较。
+"""
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from .logger import Logger
+
+KINDS = ("wall", "cpu", "alloc")
+
+ARM_FILE = "armed.json"
+
+_ID_PATTERN = re.compile(r"^[0-9a-f]+(?:-[0-9a-f]+)?$")
+
+
+def _frame_label(code) -> str:
+    """栈帧标签：函数名 (上级目录/文件名:定义行)，去掉折叠栈格式的分隔符"""
+    path = "/".join(code.co_filename.replace("\\", "/").rsplit("/", 2)[-2:])
+    return f"{code.co_name} ({path}:{code.co_firstlineno})".replace(";", ",")
+
+
+def _thread_cpu_clock(ident: int):
+    """返回读取指定线程CPU时间的函数，平台不支持时返回None"""
+    try:
+        clock_id = time.pthread_getcpuclockid(ident)
+        time.clock_gettime(clock_id)
+    except (AttributeError, OSError):
+        return None
+    return lambda: time.clock_gettime(clock_id)
+
+
+def format_collapsed(stacks: Counter) -> str:
+    return "".join(f"{stack} {int(value)}\n" for stack, value in stacks.most_common() if value >= 1)
+
+
+class _Sampler(threading.Thread):
+    """按间隔采样目标线程的调用栈，累计墙钟和CPU微秒数"""
+
+    def __init__(self, ident: int, interval: float, with_cpu: bool):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.target_ident = ident
+        self.interval = interval
+        self.wall: Counter = Counter()
+        self.cpu: Counter = Counter()
+        self.samples = 0
+        self._cpu_clock = _thread_cpu_clock(ident) if with_cpu else None
+        self._labels: Dict = {}
+        self._stop_event = threading.Event()
+
+    def _collapse(self, frame) -> str:
+        stack = []
+        labels = self._labels
+        while frame is not None:
+            code = frame.f_code
+            label = labels.get(code)
+            if label is None:
+                label = labels[code] = _frame_label(code)
+            stack.append(label)
+            frame = frame.f_back
+        stack.reverse()
+        return ";".join(stack)
+
+    def run(self):
+        last_wall = time.perf_counter()
+        last_cpu = self._cpu_clock() if self._cpu_clock else 0.0
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.target_ident)
+            now = time.perf_counter()
+            if frame is None:
+                return
+            stack = self._collapse(frame)
+            del frame
+            self.samples += 1
+            self.wall[stack] += (now - last_wall) * 1e6
+            last_wall = now
+            if self._cpu_clock:
+                cpu_now = self._cpu_clock()
+                self.cpu[stack] += (cpu_now - last_cpu) * 1e6
+                last_cpu = cpu_now
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    @property
+    def cpu_supported(self) -> bool:
+        return self._cpu_clock is not None
+
+
+class _Capture:
+    """一个被剖析请求的采集状态"""
+
+    def __init__(self, profile_id: str, arm: Dict, endpoint: Optional[str], path: str, method: str):
+        self.profile_id = profile_id
+        self.arm = arm
+        self.endpoint = endpoint
+        self.path = path
+        self.method = method
+        self.sampler: Optional[_Sampler] = None
+        self.alloc_start = None
+        self.started = time.perf_counter()
+        self.created_at = datetime.now().isoformat(timespec="seconds")
+
+
+class RequestProfiler:
+    """按布置条件剖析请求，结果写入directory
+
+    tracemalloc是进程级的：并发执行的其他请求的分配也会计入；开启后Python代码明显变慢，
+    wall/cpu剖析的耗时会被放大，需要准确耗时时应单独布置alloc剖析。
+    """
+
+    def __init__(self, directory: Path, max_profiles: int = 50, interval_ms: float = 5,
+                 tracemalloc_frames: int = 25, max_duration: float = 3600,
+                 logger: Optional[Logger] = None):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_profiles = max_profiles
+        self.interval_ms = interval_ms
+        self.tracemalloc_frames = tracemalloc_frames
+        self.max_duration = max_duration
+        self.logger = logger or Logger()
+        self._lock = threading.Lock()
+        self._arm: Optional[Dict] = None
+        self._arm_mtime: Optional[float] = None
+        self._completed = 0  # 当前布置已完成的剖析数（所有进程，来自目录）
+        self._inflight = 0   # 当前进程中正在剖析的请求数
+        self._next_check = 0.0
+        self._tracemalloc_users = 0
+        self._tracemalloc_owned = False
+
+    @property
+    def _arm_path(self) -> Path:
+        return self.directory / ARM_FILE
+
+    def arm(self, endpoint: str, count: int = 10, rate: Optional[float] = None,
+            kinds=KINDS, duration: Optional[float] = None, interval_ms: Optional[float] = None) -> Dict:
+        """布置剖析任务：endpoint为Flask视图名、请求路径或 *；剖析count个请求，rate为抽样比例"""
+        kinds = [kind for kind in kinds if kind in KINDS]
+        if not endpoint or not kinds:
+            raise ValueError("需要指定接口和至少一种剖析类型（wall/cpu/alloc）")
+        if count < 1 or (rate is not None and not 0 < rate <= 1):
+            raise ValueError("count需大于0，rate需在(0, 1]之间")
+        duration = min(duration or self.max_duration, self.max_duration)
+        # 已完成数按目录中的结果统计，不能超过保留上限
+        count = min(int(count), self.max_profiles)
+        arm = {
+            "id": uuid.uuid4().hex[:8],
+            "endpoint": endpoint,
+            "count": count,
+            "rate": rate,
+            "kinds": kinds,
+            "interval_ms": max(float(interval_ms or self.interval_ms), 1.0),
+            "expires_at": time.time() + duration,
+        }
+        temp_path = self._arm_path.with_suffix(f".{os.getpid()}.tmp")
+        temp_path.write_text(json.dumps(arm), encoding="utf-8")
+        os.replace(temp_path, self._arm_path)
+        self._next_check = 0.0
+        self.logger.info("已布置性能剖析 - 接口: %s, 数量: %s, 比例: %s, 类型: %s",
+                         endpoint, count, rate, ",".join(kinds), event="profiling_armed")
+        return arm
+
+    def disarm(self):
+        try:
+            self._arm_path.unlink()
+        except FileNotFoundError:
+            pass
+        self._next_check = 0.0
+
+    def _refresh(self, now: float):
+        """重新读取布置状态（每秒最多一次）"""
+        self._next_check = now + 1.0
+        try:
+            mtime = self._arm_path.stat().st_mtime
+        except FileNotFoundError:
+            self._arm, self._arm_mtime = None, None
+            return
+        if mtime != self._arm_mtime:
+            try:
+                self._arm = json.loads(self._arm_path.read_text(encoding="utf-8"))
+                self._arm_mtime = mtime
+            except (OSError, ValueError):
+                self._arm = None
+                return
+        if self._arm and time.time() >= self._arm["expires_at"]:
+            self.disarm()
+            self._arm = None
+            return
+        if self._arm:
+            self._completed = len(list(self.directory.glob(f"{self._arm['id']}-*.json")))
+
+    def maybe_start(self, endpoint: Optional[str], path: str, method: str = "GET") -> Optional[_Capture]:
+        """请求开始时调用：满足布置条件时开始剖析并返回采集状态，否则返回None"""
+        now = time.monotonic()
+        if now >= self._next_check:
+            self._refresh(now)
+        arm = self._arm
+        if arm is None or arm["endpoint"] not in ("*", endpoint, path):
+            return None
+        if arm["rate"] is not None and random.random() >= arm["rate"]:
+            return None
+        with self._lock:
+            # 多进程各自计数，总数可能略超count
+            if self._completed + self._inflight >= arm["count"]:
+                return None
+            self._inflight += 1
+        capture = _Capture(f"{arm['id']}-{uuid.uuid4().hex[:8]}", arm, endpoint, path, method)
+        try:
+            if "wall" in arm["kinds"] or "cpu" in arm["kinds"]:
+                capture.sampler = _Sampler(threading.get_ident(), arm["interval_ms"] / 1000,
+                                           "cpu" in arm["kinds"])
+                capture.sampler.start()
+            if "alloc" in arm["kinds"]:
+                self._start_tracemalloc()
+                capture.alloc_start = tracemalloc.take_snapshot()
+        except Exception as e:
+            self.logger.warning("启动性能剖析失败: %s", e)
+            self._release(capture)
+            return None
+        capture.started = time.perf_counter()
+        return capture
+
+    def _start_tracemalloc(self):
+        with self._lock:
+            self._tracemalloc_users += 1
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(self.tracemalloc_frames)
+                self._tracemalloc_owned = True
+            if self._tracemalloc_users == 1 and hasattr(tracemalloc, "reset_peak"):
+                tracemalloc.reset_peak()
+
+    def _stop_tracemalloc(self):
+        with self._lock:
+            self._tracemalloc_users -= 1
+            if self._tracemalloc_users == 0 and self._tracemalloc_owned:
+                tracemalloc.stop()
+                self._tracemalloc_owned = False
+
+    def _release(self, capture: _Capture):
+        if capture.sampler is not None and capture.sampler.is_alive():
+            capture.sampler.stop()
+        if capture.alloc_start is not None:
+            capture.alloc_start = None
+            self._stop_tracemalloc()
+        with self._lock:
+            self._inflight -= 1
+
+    def _allocations(self, start) -> Tuple[Counter, int]:
+        """请求期间新增且未释放的分配，按分配调用栈（由外到内）汇总字节数"""
+        ignored = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__, all_frames=True)]
+        end = tracemalloc.take_snapshot().filter_traces(ignored)
+        peak = tracemalloc.get_traced_memory()[1]
+        stacks: Counter = Counter()
+        for stat in end.compare_to(start.filter_traces(ignored), "traceback"):
+            if stat.size_diff <= 0:
+                continue
+            frames = [
+                f"{'/'.join(frame.filename.replace(chr(92), '/').rsplit('/', 2)[-2:])}:{frame.lineno}"
+                for frame in stat.traceback
+            ]
+            stacks[";".join(frames)] += stat.size_diff
+        return stacks, peak
+
+    def finish(self, capture: _Capture, status: Optional[int] = None, error: Optional[BaseException] = None):
+        """请求结束时调用：停止采集并写出结果"""
+        duration_ms = (time.perf_counter() - capture.started) * 1000
+        outputs: Dict[str, Counter] = {}
+        meta = {
+            "id": capture.profile_id,
+            "arm_id": capture.arm["id"],
+            "endpoint": capture.endpoint,
+            "path": capture.path,
+            "method": capture.method,
+            "status": status if error is None else 500,
+            "duration_ms": round(duration_ms, 2),
+            "created_at": capture.created_at,
+            "pid": os.getpid(),
+        }
+        try:
+            if capture.sampler is not None:
+                capture.sampler.stop()
+                meta["samples"] = capture.sampler.samples
+                meta["interval_ms"] = capture.arm["interval_ms"]
+                if "wall" in capture.arm["kinds"]:
+                    outputs["wall"] = capture.sampler.wall
+                if "cpu" in capture.arm["kinds"] and capture.sampler.cpu_supported:
+                    outputs["cpu"] = capture.sampler.cpu
+                    meta["cpu_ms"] = round(sum(capture.sampler.cpu.values()) / 1000, 2)
+            if capture.alloc_start is not None:
+                outputs["alloc"], meta["alloc_peak_bytes"] = self._allocations(capture.alloc_start)
+                meta["alloc_bytes"] = sum(outputs["alloc"].values())
+            meta["kinds"] = sorted(outputs)
+            for kind, stacks in outputs.items():
+                (self.directory / f"{capture.profile_id}.{kind}.folded").write_text(
+                    format_collapsed(stacks), encoding="utf-8"
+                )
+            (self.directory / f"{capture.profile_id}.json").write_text(json.dumps(meta), encoding="utf-8")
+            self.logger.info("性能剖析完成 - 接口: %s, 耗时: %.1fms, 采样数: %s",
+                             capture.endpoint, duration_ms, meta.get("samples"), event="profile_captured")
+        except Exception as e:
+            self.logger.warning("写出性能剖析结果失败: %s", e)
+        finally:
+            self._release(capture)
+        with self._lock:
+            self._completed += 1
+            done = self._arm is not None and self._arm["id"] == capture.arm["id"] \
+                and self._completed >= self._arm["count"]
+        if done:
+            self.disarm()
+        self._prune()
+
+    def _prune(self):
+        metas = sorted(self.directory.glob("*-*.json"), key=lambda path: path.stat().st_mtime)
+        for meta_path in metas[:max(len(metas) - self.max_profiles, 0)]:
+            profile_id = meta_path.stem
+            for path in [meta_path] + list(self.directory.glob(f"{profile_id}.*.folded")):
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+
+    def list_profiles(self) -> List[Dict]:
+        profiles = []
+        for path in self.directory.glob("*-*.json"):
+            try:
+                profiles.append(json.loads(path.read_text(encoding="utf-8")))
+            except (OSError, ValueError):
+                continue
+        profiles.sort(key=lambda item: item.get("created_at", ""), reverse=True)
+        return profiles
+
+    def collapsed(self, profile_id: str, kind: str) -> Optional[str]:
+        """读取折叠栈；profile_id为布置ID时合并该布置下的全部剖析，不存在时返回None"""
+        if kind not in KINDS or not _ID_PATTERN.match(profile_id or ""):
+            return None
+        pattern = f"{profile_id}.{kind}.folded" if "-" in profile_id else f"{profile_id}-*.{kind}.folded"
+        paths = list(self.directory.glob(pattern))
+        if not paths:
+            return None
+        if len(paths) == 1:
+            return paths[0].read_text(encoding="utf-8")
+        merged: Counter = Counter()
+        for path in paths:
+            for line in path.read_text(encoding="utf-8").splitlines():
+                stack, _, value = line.rpartition(" ")
+                if stack:
+                    merged[stack] += int(value)
+        return format_collapsed(merged)
+
+    def status(self) -> Dict:
+        self._refresh(time.monotonic())
+        return {
+            "armed": dict(self._arm, completed=self._completed) if self._arm else None,
+            "inflight": self._inflight,
+            "tracemalloc": tracemalloc.is_tracing(),
+        }
@@ -0,0 +1,118 @@
+"""多步优化结果的增量编码
+
+Kimi和Qwen的结果通常在上一步的基础上只改动少数几行。增量格式以上一步结果为基准，
+按行记录操作序列（JSON数组）：
+- 正整数 n：从基准的当前位置复制 n 行
+- 负整数 -n：跳过基准的 n 行
+- 字符串：插入这段文本（可包含多行）
+还原只需顺序扫描一遍基准，前端和存储层共用同一格式。
+
+存储时以控制字符 \\x1e 加 "delta:" 作为标记（与TextCompressor的 \\x1f 标记区分），
+JSON不转义中文且换行被转义为单行，插入的文本仍可被全文搜索命中。
+"""
+import difflib
+import json
+import re
+from typing import Dict, List, Optional, Tuple, Union
+
+MARKER = "\x1e"
+PREFIX = MARKER + "delta:"
+
+# 各步骤及其基准步骤
+STAGE_BASES = (("kimi", "deepseek"), ("qwen", "kimi"))
+
+# 增量编码后不足原文该比例时才使用增量，否则保留原文
+MAX_RATIO = 0.8
+
+_LINE_PATTERN = re.compile(r"[^\n]*\n|[^\n]+")
+
+Ops = List[Union[int, str]]
+
+
+def split_lines(text: str) -> List[str]:
+    """按换行切分并保留行尾换行符（与前端的切分方式一致）"""
+    return _LINE_PATTERN.findall(text or "")
+
+
+def diff_ops(base: str, target: str) -> Ops:
+    """计算把base变为target的行级操作序列"""
+    base_lines, target_lines = split_lines(base), split_lines(target)
+    matcher = difflib.SequenceMatcher(None, base_lines, target_lines, autojunk=False)
+    ops: Ops = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            ops.append(i2 - i1)
+            continue
+        if i2 > i1:
+            ops.append(i1 - i2)
+        if j2 > j1:
+            ops.append("".join(target_lines[j1:j2]))
+    return ops
+
+
+def apply_ops(base: str, ops: Ops) -> str:
+    """按操作序列从base还原目标文本"""
+    base_lines = split_lines(base)
+    parts = []
+    position = 0
+    for op in ops:
+        if isinstance(op, str):
+            parts.append(op)
+        elif op >= 0:
+            parts.extend(base_lines[position:position + op])
+            position += op
+        else:
+            position -= op
+    return "".join(parts)
+
+
+def _dumps(ops: Ops) -> str:
+    return json.dumps(ops, ensure_ascii=False, separators=(",", ":"))
+
+
+def is_encoded(value) -> bool:
+    return isinstance(value, str) and value.startswith(PREFIX)
+
+
+def encode(base: Optional[str], target: Optional[str]) -> Optional[str]:
+    """增量编码后明显更短时返回带标记的增量，否则原样返回"""
+    if not base or not target or is_encoded(target):
+        return target
+    encoded = PREFIX + _dumps(diff_ops(base, target))
+    return encoded if len(encoded) < len(target) * MAX_RATIO else target
+
+
+def decode(base: Optional[str], value):
+    """还原带标记的增量，非增量值原样返回"""
+    if not is_encoded(value):
+        return value
+    return apply_ops(base or "", json.loads(value[len(PREFIX):]))
+
+
+def encode_results(deepseek: str, kimi: str, qwen: str) -> Tuple[str, str, str]:
+    """存储用：Kimi以DeepSeek为基准、Qwen以Kimi为基准编码"""
+    return deepseek, encode(deepseek, kimi), encode(kimi, qwen)
+
+
+def decode_row(row: Optional[Dict]) -> Optional[Dict]:
+    """就地还原一行优化结果中的增量字段（需先解压）"""
+    if row:
+        for stage, base in STAGE_BASES:
+            field, base_field = f"{stage}_result", f"{base}_result"
+            if field in row:
+                row[field] = decode(row.get(base_field), row[field])
+    return row
+
+
+def encode_response(results: Dict[str, str]) -> Dict:
+    """响应用：第一步为全文，后续步骤在更短时为 {"base": 上一步, "ops": [...]}"""
+    encoded: Dict = dict(results)
+    for stage, base in STAGE_BASES:
+        target, base_text = results.get(stage), results.get(base)
+        if not target or not base_text:
+            continue
+        ops = diff_ops(base_text, target)
+        if len(_dumps(ops)) < len(target) * MAX_RATIO:
+            encoded[stage] = {"base": base, "ops": ops}
+    return encoded
+
@@ -0,0 +1,122 @@
+"""大文本字段的透明压缩
+
+三步优化结果和AI回复是大段重复度很高的中文Markdown，超过阈值时压缩后存储。
+压缩值仍写入原TEXT列：以控制字符 \\x1f 加编码名作为格式标记，内容为base64，
+没有标记的旧数据按原文读取，因此可以随时开启、关闭或分批回填。
+安装 zstandard 时使用zstd，否则回退到标准库zlib；读取时两种格式都支持。
+"""
+import base64
+import threading
+import time
+import zlib
+from typing import Dict, Optional
+
+try:
+    import zstandard
+except ImportError:  # zstandard为可选依赖
+    zstandard = None
+
+# 压缩值的前缀标记，正常文本不会以该控制字符开头
+MARKER = "\x1f"
+
+
+class TextCompressor:
+    """按阈值压缩/解压文本字段并统计压缩率和CPU耗时"""
+
+    def __init__(self, codec: str = "zstd", min_size: int = 1024, level: Optional[int] = None,
+                 enabled: bool = True):
+        # enabled为False时只解压不压缩，用于关闭压缩后继续读取已有数据
+        self.enabled = enabled
+        if codec == "zstd" and zstandard is None:
+            codec = "zlib"
+        self.codec = codec
+        self.min_size = min_size
+        self.level = level if level is not None else (6 if codec == "zlib" else 3)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._stats = {
+            "compressed": 0, "skipped": 0, "decompressed": 0,
+            "raw_bytes": 0, "stored_bytes": 0,
+            "compress_ms": 0.0, "decompress_ms": 0.0,
+        }
+
+    def _zstd_compressor(self):
+        # zstd的压缩/解压对象不是线程安全的，每个线程各自持有
+        compressor = getattr(self._local, "compressor", None)
+        if compressor is None:
+            compressor = self._local.compressor = zstandard.ZstdCompressor(level=self.level)
+        return compressor
+
+    def _zstd_decompressor(self):
+        decompressor = getattr(self._local, "decompressor", None)
+        if decompressor is None:
+            decompressor = self._local.decompressor = zstandard.ZstdDecompressor()
+        return decompressor
+
+    @staticmethod
+    def is_encoded(value) -> bool:
+        return isinstance(value, str) and value.startswith(MARKER)
+
+    def encode(self, text: Optional[str]) -> Optional[str]:
+        """超过阈值且压缩有收益时返回带标记的压缩值，否则原样返回"""
+        if not self.enabled or not text or self.is_encoded(text):
+            return text
+        raw = text.encode("utf-8")
+        if len(raw) < self.min_size:
+            return text
+        start = time.perf_counter()
+        if self.codec == "zstd":
+            compressed = self._zstd_compressor().compress(raw)
+        else:
+            compressed = zlib.compress(raw, self.level)
+        value = f"{MARKER}{self.codec}:" + base64.b64encode(compressed).decode("ascii")
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self._stats["compress_ms"] += elapsed_ms
+            if len(value) >= len(raw):
+                self._stats["skipped"] += 1
+                return text
+            self._stats["compressed"] += 1
+            self._stats["raw_bytes"] += len(raw)
+            self._stats["stored_bytes"] += len(value)
+        return value
+
+    def decode(self, value):
+        """还原压缩值，非压缩值原样返回"""
+        if not self.is_encoded(value):
+            return value
+        start = time.perf_counter()
+        codec, _, data = value[1:].partition(":")
+        compressed = base64.b64decode(data)
+        if codec == "zstd":
+            if zstandard is None:
+                raise RuntimeError("数据使用zstd压缩，需要安装zstandard")
+            raw = self._zstd_decompressor().decompress(compressed)
+        elif codec == "zlib":
+            raw = zlib.decompress(compressed)
+        else:
+            raise ValueError(f"未知的压缩格式: {codec}")
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self._stats["decompressed"] += 1
+            self._stats["decompress_ms"] += elapsed_ms
+        return raw.decode("utf-8")
+
+    def decode_row(self, row: Optional[Dict], *fields: str) -> Optional[Dict]:
+        """就地解压一行中的指定字段"""
+        if row:
+            for field in fields:
+                if field in row:
+                    row[field] = self.decode(row[field])
+        return row
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["enabled"] = self.enabled
+        stats["codec"] = self.codec
+        stats["min_size"] = self.min_size
+        stats["ratio"] = round(stats["stored_bytes"] / stats["raw_bytes"], 4) if stats["raw_bytes"] else None
+        stats["compress_ms"] = round(stats["compress_ms"], 3)
+        stats["decompress_ms"] = round(stats["decompress_ms"], 3)
+        return stats
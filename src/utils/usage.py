@@ -0,0 +1,199 @@
+"""模型token用量台账
+
+每次模型调用的用量先缓存在内存中，由后台线程按固定间隔或缓冲达到批量大小时
+以多行INSERT写入 token_usage 明细表，并在同一事务中把按 (日期, 用户, 提供方, 步骤)
+预聚合的结果累加到 token_usage_daily 汇总表。按用户/日期/提供方的统计查询只读汇总表，
+不扫描明细。
+"""
+import atexit
+import os
+import threading
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from .database import Database
+
+# 明细表的列，与record()的字段一一对应
+USAGE_COLUMNS = (
+    "user_id", "request_id", "source", "stage", "provider", "upstream",
+    "input_tokens", "output_tokens", "cached_tokens", "duration_ms", "created_at",
+)
+
+# 汇总查询允许的分组维度
+GROUP_COLUMNS = {"day": "day", "user": "user_id", "provider": "provider", "stage": "stage"}
+
+
+class UsageLedger:
+    """token用量的内存缓冲与批量写入"""
+
+    def __init__(self, db: Database, flush_interval: float = 5, batch_size: int = 500,
+                 max_buffer: int = 20000):
+        self.db = db
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        # 数据库长时间不可用时最多缓存的条数，超出后丢弃最早的记录
+        self.max_buffer = max_buffer
+        self._pending: List[Tuple] = []
+        self._lock = threading.Lock()
+        self._stats = {"recorded": 0, "flushed": 0, "dropped": 0, "flushes": 0, "failures": 0}
+        self._start()
+        atexit.register(self.close)
+        # fork出的子进程中重新启动后台线程（父进程的缓冲由父进程负责写出）
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._restart_after_fork)
+
+    def _start(self):
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="usage-ledger", daemon=True)
+        self._thread.start()
+
+    def _restart_after_fork(self):
+        if self._stopped.is_set():
+            return
+        self._lock = threading.Lock()
+        self._pending = []
+        self._start()
+
+    def record(self, stage: str, provider: Optional[str], usage: Dict[str, Optional[int]],
+               user_id: Optional[int] = None, request_id: Optional[str] = None,
+               source: Optional[str] = None, upstream: Optional[str] = None,
+               duration_ms: Optional[float] = None, created_at: Optional[datetime] = None):
+        """记录一次模型调用的用量"""
+        row = (
+            user_id, request_id, source, stage, provider or "unknown", upstream,
+            usage.get("input_tokens") or 0, usage.get("output_tokens") or 0, usage.get("cached_tokens") or 0,
+            int(duration_ms) if duration_ms is not None else None, created_at or datetime.now(),
+        )
+        with self._lock:
+            self._pending.append(row)
+            self._stats["recorded"] += 1
+            overflow = len(self._pending) - self.max_buffer
+            if overflow > 0:
+                del self._pending[:overflow]
+                self._stats["dropped"] += overflow
+            pending_count = len(self._pending)
+        if pending_count >= self.batch_size:
+            self._wakeup.set()
+
+    @staticmethod
+    def rollup(rows: List[Tuple]) -> Dict[Tuple, List[int]]:
+        """按 (日期, 用户, 提供方, 步骤) 预聚合：调用次数、输入、输出、缓存命中token"""
+        totals: Dict[Tuple, List[int]] = {}
+        for row in rows:
+            user_id, stage, provider, created_at = row[0], row[3], row[4], row[10]
+            key = (created_at.date(), user_id or 0, provider, stage)
+            item = totals.setdefault(key, [0, 0, 0, 0])
+            item[0] += 1
+            item[1] += row[6]
+            item[2] += row[7]
+            item[3] += row[8]
+        return totals
+
+    def _write(self, conn, rows: List[Tuple]):
+        cursor = conn.cursor()
+        placeholders = "(" + ", ".join(["%s"] * len(USAGE_COLUMNS)) + ")"
+        cursor.execute(
+            f"INSERT INTO token_usage ({', '.join(USAGE_COLUMNS)}) VALUES "
+            + ", ".join([placeholders] * len(rows)),
+            [value for row in rows for value in row]
+        )
+        totals = self.rollup(rows)
+        cursor.execute(
+            "INSERT INTO token_usage_daily "
+            "(day, user_id, provider, stage, calls, input_tokens, output_tokens, cached_tokens) VALUES "
+            + ", ".join(["(%s, %s, %s, %s, %s, %s, %s, %s)"] * len(totals))
+            + " ON DUPLICATE KEY UPDATE calls = calls + VALUES(calls), "
+              "input_tokens = input_tokens + VALUES(input_tokens), "
+              "output_tokens = output_tokens + VALUES(output_tokens), "
+              "cached_tokens = cached_tokens + VALUES(cached_tokens)",
+            [value for key, item in totals.items() for value in key + tuple(item)]
+        )
+        cursor.close()
+
+    def flush(self) -> int:
+        """立即将缓冲区写入数据库，返回写入的条数"""
+        with self._lock:
+            if not self._pending:
+                return 0
+            batch, self._pending = self._pending, []
+        written = 0
+        try:
+            for start in range(0, len(batch), self.batch_size):
+                chunk = batch[start:start + self.batch_size]
+                # 明细与汇总在同一事务中写入，汇总不会重复累加或遗漏
+                with self.db.get_connection() as conn:
+                    self._write(conn, chunk)
+                written += len(chunk)
+        except Exception:
+            # 未写入的部分放回缓冲区头部，下次重试
+            with self._lock:
+                self._pending[:0] = batch[written:]
+                self._stats["failures"] += 1
+                self._stats["flushed"] += written
+            raise
+        with self._lock:
+            self._stats["flushes"] += 1
+            self._stats["flushed"] += written
+        return written
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                pass
+
+    def close(self):
+        """停止后台线程并写出剩余数据"""
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        self._wakeup.set()
+        self._thread.join(timeout=self.flush_interval + 1)
+        try:
+            self.flush()
+        except Exception:
+            pass
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["pending"] = len(self._pending)
+        return stats
+
+
+class UsageDAO:
+    """基于汇总表的用量查询"""
+
+    def __init__(self, db: Database):
+        self.db = db
+
+    def summary(self, days: int = 30, user_id: Optional[int] = None,
+                group_by: Tuple[str, ...] = ("day", "provider")) -> List[Dict]:
+        """最近days天的用量，按指定维度分组；user_id为None时统计全部用户"""
+        unknown = set(group_by) - set(GROUP_COLUMNS)
+        if unknown:
+            raise ValueError(f"不支持的分组维度: {', '.join(sorted(unknown))}")
+        columns = [GROUP_COLUMNS[name] for name in group_by]
+        conditions = ["day >= %s"]
+        params: list = [date.today() - timedelta(days=max(days, 1) - 1)]
+        if user_id is not None:
+            conditions.append("user_id = %s")
+            params.append(user_id)
+        select = ", ".join(columns + [
+            "SUM(calls) AS calls", "SUM(input_tokens) AS input_tokens",
+            "SUM(output_tokens) AS output_tokens", "SUM(cached_tokens) AS cached_tokens",
+        ])
+        query = f"SELECT {select} FROM token_usage_daily WHERE {' AND '.join(conditions)}"
+        if columns:
+            query += f" GROUP BY {', '.join(columns)} ORDER BY {', '.join(columns)}"
+        rows = self.db.execute_query(query, tuple(params))
+        for row in rows:
+            for key in ("calls", "input_tokens", "output_tokens", "cached_tokens"):
+                row[key] = int(row[key] or 0)
+            if isinstance(row.get("day"), date):
+                row["day"] = row["day"].isoformat()
+        return rows
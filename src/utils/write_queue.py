@@ -0,0 +1,113 @@
+"""有界后台写入队列
+
+请求处理中可以延后的数据库写入（如优化结果的保存）交给后台线程执行，不占用响应时间。
+队列有上限：写满时submit返回False，由调用方改为同步写入，避免无界堆积或丢数据。
+关闭时停止接收新任务，并在超时前写完队列中剩余的任务。
+"""
+import atexit
+import os
+import queue
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from .logger import Logger
+
+
+class BackgroundWriter:
+    """单线程顺序执行写入任务，失败时按退避重试"""
+
+    def __init__(self, name: str = "background-writer", maxsize: int = 256, max_attempts: int = 3,
+                 retry_delay: float = 0.5, logger: Optional[Logger] = None):
+        self.name = name
+        self.maxsize = maxsize
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.logger = logger or Logger()
+        self._stats_lock = threading.Lock()
+        self._stats = {"submitted": 0, "completed": 0, "failed": 0, "rejected": 0}
+        self._start()
+        atexit.register(self.close)
+        # fork出的子进程中重新创建队列和线程（父进程的队列由父进程负责写完）
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._restart_after_fork)
+
+    def _start(self):
+        self._queue: "queue.Queue" = queue.Queue(maxsize=self.maxsize)
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def _restart_after_fork(self):
+        if self._closed:
+            return
+        self._stats_lock = threading.Lock()
+        self._start()
+
+    def _count(self, key: str):
+        with self._stats_lock:
+            self._stats[key] += 1
+
+    def submit(self, task: Callable, *args, description: str = "", **kwargs) -> bool:
+        """提交写入任务；队列已满或已关闭时返回False（调用方应同步执行）"""
+        if self._closed:
+            return False
+        try:
+            self._queue.put_nowait((task, args, kwargs, description))
+        except queue.Full:
+            self._count("rejected")
+            return False
+        self._count("submitted")
+        return True
+
+    def _execute(self, task: Callable, args, kwargs, description: str):
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                task(*args, **kwargs)
+                self._count("completed")
+                return
+            except Exception as e:
+                if attempt < self.max_attempts:
+                    self.logger.warning("后台写入失败，准备重试 (%d/%d) %s: %s",
+                                        attempt, self.max_attempts, description, e)
+                    time.sleep(self.retry_delay * attempt)
+                else:
+                    self._count("failed")
+                    self.logger.error("后台写入最终失败 %s: %s", description, e, exc_info=True,
+                                      event="background_write_failed")
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                self._execute(*item)
+            finally:
+                self._queue.task_done()
+
+    def close(self, timeout: float = 10) -> bool:
+        """停止接收新任务并写完队列中的任务，超时返回False"""
+        if self._closed:
+            return True
+        self._closed = True
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                self._queue.put(None, timeout=max(deadline - time.monotonic(), 0.01))
+                break
+            except queue.Full:
+                if time.monotonic() >= deadline:
+                    break
+        self._thread.join(max(deadline - time.monotonic(), 0))
+        finished = not self._thread.is_alive()
+        if not finished:
+            self.logger.warning("后台写入队列关闭超时，剩余 %d 个任务未写入", self._queue.qsize())
+        return finished
+
+    def snapshot(self) -> Dict:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["pending"] = self._queue.qsize()
+        stats["maxsize"] = self.maxsize
+        return stats
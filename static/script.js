@@ -1,6 +1,10 @@
 // 提示词优化工具 - 前端交互逻辑
 
 let conversationHistory = [];
+// 已同步的对话记录及会话版本，用于增量同步
+let conversationRecords = [];
+let syncedSessionId = null;
+let sessionVersion = null;
 let isProcessing = false;
 let isPaused = false;
 let currentUserId = null;
@@ -233,22 +237,41 @@ async function loadSessionData(sessionId, loadInputField = true) {
             }
         }
         
-        // 加载对话历史
-        const response = await fetch(`${API_BASE}/conversations/${sessionId}`, {
-            credentials: 'include'
+        // 加载对话历史：同一会话只获取上次同步之后的变化
+        const incremental = syncedSessionId === sessionId && sessionVersion !== null;
+        const url = incremental
+            ? `${API_BASE}/conversations/${sessionId}?since_version=${sessionVersion}`
+            : `${API_BASE}/conversations/${sessionId}`;
+        const headers = incremental ? { 'If-None-Match': `W/"conv-${sessionId}-${sessionVersion}"` } : {};
+        const response = await fetch(url, {
+            credentials: 'include',
+            headers: headers
         });
         
-        const data = await response.json();
-        
-        if (data.success) {
-            conversationHistory = data.data.map(conv => ({
+        if (response.status === 304) {
+            // 没有变化，保留本地历史
+            renderHistory();
+        } else {
+            const data = await response.json();
+            
+            if (data.success) {
+                if (data.mode === 'delta') {
+                    mergeConversationRecords(data.data);
+                } else {
+                    conversationRecords = data.data;
+                }
+                syncedSessionId = sessionId;
+                sessionVersion = data.version;
+            } else {
+                conversationRecords = [];
+                syncedSessionId = null;
+                sessionVersion = null;
+            }
+            conversationHistory = conversationRecords.map(conv => ({
                 user: conv.user_message,
                 ai: conv.ai_response
             }));
             renderHistory();
-        } else {
-            conversationHistory = [];
-            renderHistory();
         }
         
         // 切换会话时才清空结果
@@ -261,6 +284,44 @@ async function loadSessionData(sessionId, loadInputField = true) {
     }
 }
 
+// 按换行切分并保留行尾换行符（与服务端 stage_delta.split_lines 一致）
+function splitLines(text) {
+    return (text || '').match(/[^\n]*\n|[^\n]+/g) || [];
+}
+
+// 还原增量格式的三步结果：正数复制基准的n行，负数跳过n行，字符串为插入的文本
+function resolveStageDeltas(stages) {
+    const resolved = { ...stages };
+    ['kimi', 'qwen'].forEach(stage => {
+        const value = resolved[stage];
+        if (!value || typeof value !== 'object') {
+            return;
+        }
+        const baseLines = splitLines(resolved[value.base]);
+        const parts = [];
+        let position = 0;
+        value.ops.forEach(op => {
+            if (typeof op === 'string') {
+                parts.push(op);
+            } else if (op >= 0) {
+                parts.push(...baseLines.slice(position, position + op));
+                position += op;
+            } else {
+                position -= op;
+            }
+        });
+        resolved[stage] = parts.join('');
+    });
+    return resolved;
+}
+
+// 按ID合并增量返回的对话记录，并按轮次排序
+function mergeConversationRecords(changed) {
+    const byId = new Map(conversationRecords.map(conv => [conv.id, conv]));
+    changed.forEach(conv => byId.set(conv.id, conv));
+    conversationRecords = Array.from(byId.values()).sort((a, b) => a.turn_number - b.turn_number);
+}
+
 // 渲染对话历史
 function renderHistory() {
     const historyList = document.getElementById('history-list');
@@ -500,6 +561,7 @@ async function clearHistory() {
         const data = await response.json();
         if (data.success) {
             conversationHistory = [];
+            conversationRecords = [];
             renderHistory();
             showNotification('对话历史已清空', 'success');
         } else {
@@ -577,20 +639,33 @@ async function startOptimize() {
         card.classList.remove('active');
     });
     
+    // 请求ID用于在排队期间查询本次请求的位置
+    const requestId = Math.random().toString(16).slice(2, 18);
+    const stopQueuePolling = startQueuePolling(requestId);
+    
     try {
         const response = await fetch(`${API_BASE}/optimize`, {
             method: 'POST',
             headers: {
-                'Content-Type': 'application/json'
+                'Content-Type': 'application/json',
+                'X-Request-ID': requestId
             },
             credentials: 'include',
             body: JSON.stringify({
                 user_text: userText,
-                conversation_history: conversationHistory
+                conversation_history: conversationHistory,
+                // 由服务端在同一事务中保存本轮对话和优化结果
+                session_id: currentSessionId,
+                // 后续步骤以相对上一步的增量返回，在本地还原
+                format: 'delta'
             })
         });
+        stopQueuePolling();
         
         const data = await response.json();
+        if (data.success && data.format === 'delta' && data.data) {
+            data.data = resolveStageDeltas(data.data);
+        }
         
         if (data.success) {
             // 分步更新结果和进度，添加动画效果
@@ -623,8 +698,16 @@ async function startOptimize() {
             if (userText) {
                 // 只保存用户输入和简短的AI响应摘要
                 const aiSummary = `已完成三模型优化：DeepSeek(${data.data.deepseek.length}字) + Kimi(${data.data.kimi.length}字) + Qwen(${data.data.qwen.length}字)`;
-                await addConversation(userText, aiSummary);
-                await saveOptimizationResult(userText, data.data);
+                if (data.persisted === 'queued' || data.persisted === 'saved') {
+                    // 服务端已保存，直接追加到本地历史，无需重新加载
+                    conversationHistory.push({ user: userText, ai: aiSummary });
+                    renderHistory();
+                    // 默认名称的会话由服务端在保存后自动命名
+                    refreshSessionName(currentSessionId);
+                } else {
+                    await addConversation(userText, aiSummary);
+                    await saveOptimizationResult(userText, data.data);
+                }
             }
             
             // 滚动到结果区域
@@ -638,12 +721,35 @@ async function startOptimize() {
         showError('优化失败: ' + error.message);
         updateStatus('错误', 0);
     } finally {
+        stopQueuePolling();
         isProcessing = false;
         document.getElementById('optimize-btn').disabled = false;
         document.getElementById('pause-btn').disabled = true;
     }
 }
 
+// 优化请求排队期间定时查询排队位置和预计等待时间
+function startQueuePolling(requestId) {
+    const timer = setInterval(async () => {
+        try {
+            const response = await fetch(`${API_BASE}/optimize/queue`, {
+                credentials: 'include'
+            });
+            const data = await response.json();
+            const ticket = (data.data || []).find(item => item.request_id === requestId);
+            if (ticket) {
+                const wait = ticket.estimated_wait != null ? `，预计等待${Math.ceil(ticket.estimated_wait)}秒` : '';
+                updateStatus(`排队中：第${ticket.position}位${wait}`, 0);
+            } else {
+                updateStatus('处理中...', 0);
+            }
+        } catch (error) {
+            console.error('查询排队状态失败:', error);
+        }
+    }, 2000);
+    return () => clearInterval(timer);
+}
+
 // 添加对话到数据库
 async function addConversation(userMsg, aiMsg) {
     if (!currentSessionId) return;
@@ -683,6 +789,31 @@ async function addConversation(userMsg, aiMsg) {
     }
 }
 
+// 服务端后台命名完成后更新会话选择器中的名称（仅默认名称的会话，最多重试5次）
+async function refreshSessionName(sessionId, attempts = 5) {
+    const current = sessions.find(s => s.id === sessionId);
+    if (!current || current.session_name !== '新会话') return;
+    
+    for (let i = 0; i < attempts; i++) {
+        await new Promise(resolve => setTimeout(resolve, 2000));
+        try {
+            const response = await fetch(`${API_BASE}/sessions`, {
+                credentials: 'include'
+            });
+            const data = await response.json();
+            const updated = (data.data || []).find(s => s.id === sessionId);
+            if (updated && updated.session_name !== '新会话') {
+                current.session_name = updated.session_name;
+                renderSessionSelect();
+                return;
+            }
+        } catch (error) {
+            console.error('刷新会话名称失败:', error);
+            return;
+        }
+    }
+}
+
 // 保存优化结果到数据库
 async function saveOptimizationResult(originalPrompt, results) {
     if (!currentSessionId) return;
@@ -754,6 +885,7 @@ async function resetAll() {
             const data = await response.json();
             if (data.success) {
                 conversationHistory = [];
+                conversationRecords = [];
                 renderHistory();
             } else {
                 showError('清空对话历史失败: ' + data.error);
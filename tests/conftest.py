@@ -0,0 +1,63 @@
+"""测试公共配置
+
+项目以 prompt_optimizer 包的形式导入（与 init_db.py 等脚本一致）。检出目录不叫
+prompt_optimizer 时，把项目根目录注册为该包。
+
+依赖MySQL的测试使用 TEST_MYSQL_HOST / TEST_MYSQL_PORT / TEST_MYSQL_USER / TEST_MYSQL_PASSWORD
+连接测试服务器，每个测试模块创建独立的临时数据库并在结束后删除；未设置 TEST_MYSQL_HOST 时跳过。
+"""
+import importlib.util
+import os
+import sys
+import uuid
+from pathlib import Path
+
+import pytest
+
+PROJECT_ROOT = Path(__file__).parent.parent
+
+if str(PROJECT_ROOT.parent) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT.parent))
+if "prompt_optimizer" not in sys.modules and PROJECT_ROOT.name != "prompt_optimizer":
+    spec = importlib.util.spec_from_file_location(
+        "prompt_optimizer", PROJECT_ROOT / "__init__.py",
+        submodule_search_locations=[str(PROJECT_ROOT)]
+    )
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["prompt_optimizer"] = module
+    spec.loader.exec_module(module)
+
+
+def _server_config() -> dict:
+    return {
+        "host": os.environ["TEST_MYSQL_HOST"],
+        "port": int(os.getenv("TEST_MYSQL_PORT", 3306)),
+        "user": os.getenv("TEST_MYSQL_USER", "root"),
+        "password": os.getenv("TEST_MYSQL_PASSWORD", ""),
+        "charset": "utf8mb4",
+        "collation": "utf8mb4_unicode_ci",
+    }
+
+
+@pytest.fixture(scope="module")
+def mysql_db():
+    """已执行全部迁移的临时数据库（Database实例，不使用连接池）"""
+    if not os.getenv("TEST_MYSQL_HOST"):
+        pytest.skip("未设置 TEST_MYSQL_HOST，跳过依赖MySQL的测试")
+    mysql_connector = pytest.importorskip("mysql.connector")
+    from prompt_optimizer.src.utils.database import Database
+    from prompt_optimizer.src.utils.migrations import MigrationRunner
+
+    name = f"prompt_test_{uuid.uuid4().hex[:8]}"
+    server = mysql_connector.connect(**_server_config())
+    cursor = server.cursor()
+    cursor.execute(f"CREATE DATABASE `{name}` CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci")
+    try:
+        db = Database(pool_size=0)
+        db.config.update(_server_config(), database=name)
+        MigrationRunner(db).migrate()
+        yield db
+    finally:
+        cursor.execute(f"DROP DATABASE IF EXISTS `{name}`")
+        cursor.close()
+        server.close()
@@ -0,0 +1,121 @@
+"""Web层辅助函数与接口权限（不依赖数据库和模型服务）"""
+from types import SimpleNamespace
+
+import pytest
+
+from prompt_optimizer.app import parse_bool_param
+
+
+@pytest.mark.parametrize("value,expected", [
+    (True, True), (False, False), (1, True), (0, False),
+    ("true", True), ("True", True), ("1", True), ("yes", True),
+    ("false", False), ("0", False), ("off", False), ("", False),
+])
+def test_parse_bool_param(value, expected):
+    assert parse_bool_param(value, default=not expected) is expected
+
+
+def test_parse_bool_param_default_and_invalid():
+    assert parse_bool_param(None, True) is True
+    for value in ("maybe", 2, [], {}):
+        with pytest.raises(ValueError):
+            parse_bool_param(value, False)
+
+
+METRICS_ENDPOINTS = ["upstreams", "prompt-cache", "pipeline", "persist-writer", "text-compression", "scheduler"]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    import prompt_optimizer.app as app_module
+    monkeypatch.setattr(app_module, "config", SimpleNamespace(admin_users={"1"}))
+    return app_module.app.test_client()
+
+
+def _login(client, user_id):
+    with client.session_transaction() as sess:
+        sess["user_id"] = user_id
+
+
+@pytest.mark.parametrize("name", METRICS_ENDPOINTS)
+def test_metrics_require_admin(client, name):
+    assert client.get(f"/api/metrics/{name}").status_code == 401
+    _login(client, 2)
+    assert client.get(f"/api/metrics/{name}").status_code == 403
+    _login(client, 1)
+    response = client.get(f"/api/metrics/{name}")
+    assert response.status_code == 200 and response.get_json()["success"] is True
+
+
+class _Recorder:
+    """记录submit/record调用的替身（persist_writer、naming_executor、usage_ledger）"""
+
+    def __init__(self):
+        self.calls = []
+
+    def submit(self, task, *args, description="", **kwargs):
+        self.calls.append((task.__name__, args))
+        return True
+
+    def record(self, *args, **kwargs):
+        self.calls.append(("record", kwargs))
+
+
+@pytest.mark.parametrize("name_session", [True, False])
+def test_persist_queues_only_the_write(monkeypatch, name_session):
+    import prompt_optimizer.app as app_module
+    writer = _Recorder()
+    monkeypatch.setattr(app_module, "persist_writer", writer)
+    results = {"deepseek": "d", "kimi": "k", "qwen": "q"}
+
+    with app_module.app.test_request_context("/api/optimize", method="POST"):
+        app_module.g.request_id = "req-1"
+        assert app_module.persist_optimize_turn(1, 42, "需求", results, name_session=name_session) == "queued"
+    [(task, args)] = writer.calls
+    assert task == "write_optimize_turn" and args[1] == 42
+    assert args[-1] == (("req-1", "optimize") if name_session else None)
+
+
+def test_naming_runs_on_executor_after_write(monkeypatch):
+    import prompt_optimizer.app as app_module
+    executor = _Recorder()
+    conversations = SimpleNamespace(add_turn_with_result=lambda *args: (1, 10, 20))
+    monkeypatch.setattr(app_module, "conversation_dao", conversations)
+    monkeypatch.setattr(app_module, "similarity_index", None)
+    monkeypatch.setattr(app_module, "naming_executor", executor)
+
+    results = {"deepseek": "d", "kimi": "k", "qwen": "q"}
+    app_module.write_optimize_turn(1, 42, "需求", "摘要", results, ("req-1", "optimize"))
+    assert executor.calls == [("name_persisted_session", (1, 42, "req-1", "optimize"))]
+
+
+def test_background_naming_usage_is_attributed(monkeypatch):
+    import prompt_optimizer.app as app_module
+    ledger = _Recorder()
+    monkeypatch.setattr(app_module, "usage_ledger", ledger)
+    def fake_generate(session_id):
+        app_module.record_model_usage("DeepSeek (会话命名)", "deepseek", "deepseek#0", {}, 5.0)
+        return "会议周报"
+
+    monkeypatch.setattr(app_module, "generate_session_name", fake_generate)
+    monkeypatch.setattr(app_module, "logger", SimpleNamespace(info=lambda *a, **k: None,
+                                                              warning=lambda *a, **k: None))
+    app_module.name_persisted_session(7, 42, "req-1", "optimize")
+
+    [(_, recorded)] = ledger.calls
+    assert (recorded["user_id"], recorded["request_id"], recorded["source"]) == (7, "req-1", "optimize")
+    assert app_module.usage_attribution.get() is None
+
+
+def test_precompressed_asset_hides_file_name(monkeypatch, tmp_path):
+    import prompt_optimizer.app as app_module
+    compressed = tmp_path / "script.abc123.js.gz"
+    compressed.write_bytes(b"\x1f\x8b fake")
+    monkeypatch.setattr(app_module.asset_manifest, "resolve",
+                        lambda entry, accept: (compressed, "gzip", "abc123", "application/javascript"))
+
+    with app_module.app.test_request_context("/static/dist/script.abc123.js", headers={"Accept-Encoding": "gzip"}):
+        response = app_module.send_built_asset({"immutable": True})
+    assert "Content-Disposition" not in response.headers
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.mimetype == "application/javascript"
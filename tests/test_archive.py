@@ -0,0 +1,110 @@
+"""冷数据归档与还原"""
+import uuid
+from datetime import datetime
+
+import pytest
+
+from prompt_optimizer.src.utils.archive import SessionArchiver, pack_rows, unpack_rows
+
+
+def test_pack_rows_round_trip():
+    created = datetime(2024, 1, 2, 3, 4, 5)
+    tables = {"conversations": [{"id": 1, "user_message": "你好", "created_at": created}],
+              "optimization_results": []}
+    payload, raw_bytes = pack_rows(tables)
+    assert raw_bytes > 0
+    assert unpack_rows(payload) == tables
+
+
+@pytest.fixture
+def daos(mysql_db):
+    from prompt_optimizer.src.utils.database import (
+        ConversationDAO, OptimizationResultDAO, SessionDAO, UserDAO
+    )
+    archiver = SessionArchiver(mysql_db, after_days=30, pause=0)
+    user_id = UserDAO(mysql_db).create_user(f"archive_{uuid.uuid4().hex[:8]}", "x")
+    return {
+        "db": mysql_db,
+        "archiver": archiver,
+        "user_id": user_id,
+        "sessions": SessionDAO(mysql_db),
+        "conversations": ConversationDAO(mysql_db, archiver=archiver),
+        "results": OptimizationResultDAO(mysql_db, archiver=archiver),
+    }
+
+
+def _age(db, session_id: int, days: int = 40):
+    db.execute_update("UPDATE sessions SET updated_at = NOW() - INTERVAL %s DAY WHERE id = %s", (days, session_id))
+
+
+def test_archived_session_is_rehydrated_on_read(daos):
+    session_id = daos["sessions"].create_session(daos["user_id"], "s")
+    daos["conversations"].add_conversation(session_id, 1, "问", "答")
+    daos["results"].save_result(session_id, "p", "d", "k", "q")
+    _age(daos["db"], session_id)
+
+    stats = daos["archiver"].archive_session(session_id)
+    assert stats["conversations"] == 1 and stats["results"] == 1
+    assert daos["db"].execute_query("SELECT id FROM conversations WHERE session_id = %s", (session_id,)) == []
+
+    conversations = daos["conversations"].get_session_conversations(session_id)
+    assert [row["user_message"] for row in conversations] == ["问"]
+    assert daos["sessions"].get_session(session_id)["archived_at"] is None
+
+
+def test_empty_session_mark_is_cleared_by_rehydrate(daos):
+    session_id = daos["sessions"].create_session(daos["user_id"], "empty")
+    _age(daos["db"], session_id)
+    assert daos["archiver"].archive_session(session_id)["conversations"] == 0
+    assert daos["sessions"].get_session(session_id)["archived_at"] is not None
+
+    assert daos["archiver"].rehydrate(session_id) is False
+    assert daos["sessions"].get_session(session_id)["archived_at"] is None
+
+
+def test_writes_to_archived_session_keep_archived_rows(daos):
+    session_id = daos["sessions"].create_session(daos["user_id"], "s")
+    daos["conversations"].add_conversation(session_id, 1, "旧问题", "旧回答")
+    daos["results"].save_result(session_id, "旧需求", "d", "k", "q")
+    _age(daos["db"], session_id)
+    daos["archiver"].archive_session(session_id)
+
+    daos["results"].save_result(session_id, "新需求", "d2", "k2", "q2")
+    daos["conversations"].add_conversation(session_id, 2, "新问题", "新回答")
+
+    prompts = sorted(row["original_prompt"] for row in daos["results"].get_session_results(session_id))
+    assert prompts == ["新需求", "旧需求"]
+    messages = [row["user_message"] for row in daos["conversations"].get_session_conversations(session_id)]
+    assert messages == ["旧问题", "新问题"]
+
+
+def test_clear_removes_archived_conversations(daos):
+    session_id = daos["sessions"].create_session(daos["user_id"], "s")
+    daos["conversations"].add_conversation(session_id, 1, "问", "答")
+    _age(daos["db"], session_id)
+    daos["archiver"].archive_session(session_id)
+
+    daos["conversations"].clear_session_conversations(session_id)
+    assert daos["conversations"].get_session_conversations(session_id) == []
+
+
+def test_rehydrated_session_is_not_archived_again_within_window(daos):
+    session_id = daos["sessions"].create_session(daos["user_id"], "s")
+    daos["conversations"].add_conversation(session_id, 1, "问", "答")
+    _age(daos["db"], session_id)
+    updated_at = daos["sessions"].get_session(session_id)["updated_at"]
+    daos["archiver"].archive_session(session_id)
+
+    daos["conversations"].get_session_conversations(session_id)
+    rehydrated = daos["sessions"].get_session(session_id)
+    assert rehydrated["rehydrated_at"] is not None
+    assert rehydrated["updated_at"] == updated_at
+    assert session_id not in daos["archiver"].find_candidates(10000)
+    assert daos["archiver"].archive_session(session_id) is None
+
+    # 还原时间也超过窗口后重新成为候选
+    daos["db"].execute_update(
+        "UPDATE sessions SET rehydrated_at = NOW() - INTERVAL 40 DAY, updated_at = updated_at WHERE id = %s",
+        (session_id,)
+    )
+    assert session_id in daos["archiver"].find_candidates(10000)
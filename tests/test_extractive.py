@@ -0,0 +1,47 @@
+"""本地抽取式摘要"""
+from prompt_optimizer.src.core.extractive import GAP_MARKER, ExtractiveSummarizer, sentence_terms, split_sentences
+
+
+def _long_text(count: int) -> str:
+    return "".join(f"第{i}条要求：输出格式需要包含标题和列表{i % 7}。" for i in range(count))
+
+
+def test_split_sentences_on_punctuation_and_newlines():
+    assert split_sentences("第一句。第二句！\n# 标题\n- 列表项\n") == ["第一句。", "第二句！", "# 标题", "- 列表项"]
+
+
+def test_sentence_terms_use_cjk_bigrams_and_words():
+    assert sentence_terms("提示词 JSON") == ["json", "提示", "示词"]
+
+
+def test_short_text_is_returned_unchanged():
+    summarizer = ExtractiveSummarizer(budget=100)
+    assert summarizer.summarize("很短的回复。") == "很短的回复。"
+
+
+def test_summary_respects_budget_and_marks_gaps():
+    summarizer = ExtractiveSummarizer(budget=200)
+    summary = summarizer.summarize(_long_text(100))
+    assert len(summary.replace(GAP_MARKER, "").replace("\n", "")) <= 200
+    assert GAP_MARKER in summary
+
+
+def test_summary_is_cached_by_content():
+    summarizer = ExtractiveSummarizer(budget=200)
+    text = _long_text(50)
+    assert summarizer.summarize(text) == summarizer.summarize(text)
+    stats = summarizer.snapshot()
+    assert stats["calls"] == 2 and stats["computed"] == 1
+
+
+def test_oversized_input_is_bounded():
+    summarizer = ExtractiveSummarizer(budget=300, max_input=5000, max_sentences=40)
+    text = _long_text(20000)
+    sentences, positions = summarizer._candidates(text)
+    assert len(sentences) <= 40
+    assert positions == sorted(positions) and len(set(positions)) == len(positions)
+    # 截取首尾时中间必然有省略
+    assert positions[-1] - positions[0] + 1 > len(positions)
+    summary = summarizer.summarize(text)
+    assert summary.startswith("第0条") or summary.startswith(GAP_MARKER)
+    assert len(summary.replace(GAP_MARKER, "").replace("\n", "")) <= 300
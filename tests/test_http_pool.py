@@ -0,0 +1,41 @@
+"""模型API共享HTTP连接池"""
+import threading
+
+import pytest
+
+from prompt_optimizer.src.models.http_pool import HTTPClientPool
+
+httpx = pytest.importorskip("httpx")
+
+
+def test_clients_are_shared_per_host():
+    pool = HTTPClientPool()
+    try:
+        assert pool.get_client("https://api.example.com/v1") is pool.get_client("https://api.example.com/v2")
+        assert pool.get_client("https://api.example.com/v1") is not pool.get_client("https://other.example.com")
+    finally:
+        pool.close()
+
+
+def test_concurrent_request_hooks_are_counted_exactly():
+    pool = HTTPClientPool()
+    client = pool.get_client("https://api.example.com")
+    on_request = client.event_hooks["request"][0]
+    threads, per_thread = 8, 2000
+
+    def send():
+        for _ in range(per_thread):
+            request = httpx.Request("POST", "https://api.example.com/chat")
+            on_request(request)
+            request.extensions["trace"]("connection.connect_tcp.started", {})
+
+    workers = [threading.Thread(target=send) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    stats = pool.stats()["api.example.com"]
+    assert stats["requests"] == threads * per_thread
+    assert stats["new_connections"] == threads * per_thread
+    assert stats["reused_requests"] == 0
+    pool.close()
@@ -0,0 +1,30 @@
+"""进行中请求跟踪与优雅退出"""
+import threading
+
+import pytest
+
+from prompt_optimizer.src.utils.lifecycle import InFlightTracker
+
+
+def test_stop_accepting_rejects_new_tasks_without_waiting():
+    tracker = InFlightTracker()
+    started, release = threading.Event(), threading.Event()
+
+    def task():
+        with tracker.track():
+            started.set()
+            release.wait(5)
+
+    worker = threading.Thread(target=task)
+    worker.start()
+    started.wait(5)
+    tracker.stop_accepting()
+    assert tracker.draining and tracker.count == 1
+    with pytest.raises(RuntimeError):
+        with tracker.track():
+            pass
+
+    assert tracker.drain(timeout=0.01) is False
+    release.set()
+    assert tracker.drain(timeout=5) is True
+    worker.join(5)
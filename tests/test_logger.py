@@ -0,0 +1,54 @@
+"""日志格式化与队列处理"""
+import io
+import json
+import logging
+import queue
+from logging.handlers import QueueListener
+
+from prompt_optimizer.src.utils.logger import JsonFormatter, StructuredQueueHandler, parse_event_rates
+
+
+def _queued_logger(name: str, formatter: logging.Formatter):
+    stream = io.StringIO()
+    target = logging.StreamHandler(stream)
+    target.setFormatter(formatter)
+    log_queue = queue.Queue()
+    listener = QueueListener(log_queue, target)
+    logger = logging.getLogger(name)
+    logger.handlers = [StructuredQueueHandler(log_queue)]
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    return logger, listener, stream
+
+
+def _log_failure(logger):
+    try:
+        raise ValueError("坏了")
+    except ValueError:
+        logger.error("处理失败: %s", "id-1", exc_info=True, extra={"event": "failed"})
+
+
+def test_json_log_keeps_exception_through_queue():
+    logger, listener, stream = _queued_logger("test.json", JsonFormatter())
+    listener.start()
+    _log_failure(logger)
+    listener.stop()
+    payload = json.loads(stream.getvalue())
+    assert payload["message"] == "处理失败: id-1"
+    assert payload["event"] == "failed"
+    assert "ValueError: 坏了" in payload["exc"]
+    assert "Traceback" not in payload["message"]
+
+
+def test_text_log_still_contains_traceback():
+    logger, listener, stream = _queued_logger("test.text", logging.Formatter("%(levelname)s %(message)s"))
+    listener.start()
+    _log_failure(logger)
+    listener.stop()
+    output = stream.getvalue()
+    assert output.startswith("ERROR 处理失败: id-1\nTraceback")
+    assert output.count("ValueError: 坏了") == 1
+
+
+def test_parse_event_rates_skips_invalid_items():
+    assert parse_event_rates("a=0.5, b=x,c,d=2") == {"a": 0.5, "d": 2.0}
@@ -0,0 +1,119 @@
+"""版本化迁移：SQL拆分、迁移执行和DAO查询的执行计划"""
+import pytest
+
+from prompt_optimizer.src.utils.migrations import (
+    DAO_QUERY_PLANS, MIGRATIONS_DIR, Migration, MigrationRunner, explain_dao_queries, split_statements
+)
+
+
+class TestSplitStatements:
+
+    def test_splits_on_semicolon_and_skips_blank_lines(self):
+        assert split_statements("SELECT 1;\n\nSELECT 2;\n") == ["SELECT 1", "SELECT 2"]
+
+    def test_last_statement_without_delimiter(self):
+        assert split_statements("SELECT 1;\nSELECT 2") == ["SELECT 1", "SELECT 2"]
+
+    def test_delimiter_inside_quotes_is_kept(self):
+        sql = "SELECT 'a;b';\nSELECT \"c;d\";\nSELECT `e;f`;"
+        assert split_statements(sql) == ["SELECT 'a;b'", 'SELECT "c;d"', "SELECT `e;f`"]
+
+    def test_escaped_quote_inside_string(self):
+        assert split_statements("SELECT 'it\\'s;';SELECT 2;") == ["SELECT 'it\\'s;'", "SELECT 2"]
+
+    def test_multiline_string_keeps_newlines(self):
+        assert split_statements("INSERT INTO t VALUES ('a\nb;c');") == ["INSERT INTO t VALUES ('a\nb;c')"]
+
+    def test_line_comments_are_removed(self):
+        sql = "-- 说明\nSELECT 1; -- 行尾注释;\n  -- 缩进的注释\nSELECT 2;"
+        assert split_statements(sql) == ["SELECT 1", "SELECT 2"]
+
+    def test_double_dash_inside_string_or_without_space_is_not_a_comment(self):
+        assert split_statements("SELECT '--x';\nSELECT 1--2;") == ["SELECT '--x'", "SELECT 1--2"]
+
+    def test_delimiter_directive_for_trigger_body(self):
+        sql = (
+            "DROP TRIGGER IF EXISTS t;\n"
+            "DELIMITER $$\n"
+            "CREATE TRIGGER t BEFORE INSERT ON a FOR EACH ROW\n"
+            "BEGIN\n"
+            "    SET NEW.x = 1;\n"
+            "    SET NEW.y = 'a;b';\n"
+            "END$$\n"
+            "DELIMITER ;\n"
+            "SELECT 2;\n"
+        )
+        assert split_statements(sql) == [
+            "DROP TRIGGER IF EXISTS t",
+            "CREATE TRIGGER t BEFORE INSERT ON a FOR EACH ROW\nBEGIN\n"
+            "    SET NEW.x = 1;\n    SET NEW.y = 'a;b';\nEND",
+            "SELECT 2",
+        ]
+
+    def test_shipped_migrations_parse(self):
+        for path in sorted(MIGRATIONS_DIR.glob("*.sql")):
+            statements = Migration(path).statements()
+            assert statements, path.name
+            assert not any(statement.upper().startswith("DELIMITER") for statement in statements)
+
+
+def _seed(db):
+    """写入足够的数据，使优化器按选择性选择索引而不是全表扫描"""
+    db.execute_many(
+        "INSERT INTO users (username, password_hash) VALUES (%s, %s)",
+        [(f"user{i}", "x") for i in range(200)]
+    )
+    # 大多数会话已归档，少量为待归档的旧会话
+    db.execute_many(
+        """
+        INSERT INTO sessions (user_id, session_name, is_active, updated_at, archived_at)
+        VALUES (%s, %s, %s, NOW() - INTERVAL %s DAY, IF(%s, NOW(), NULL))
+        """,
+        [(i % 200 + 1, f"s{i}", i % 7 != 0, i % 90, i % 20 != 0) for i in range(4000)]
+    )
+    db.execute_many(
+        "INSERT INTO conversations (session_id, turn_number, user_message, ai_response, version) "
+        "VALUES (%s, %s, 'u', 'a', %s)",
+        [(i % 4000 + 1, i // 4000 + 1, i // 4000 + 1) for i in range(12000)]
+    )
+    db.execute_many(
+        "INSERT INTO optimization_results (session_id, original_prompt, deepseek_result, kimi_result, qwen_result) "
+        "VALUES (%s, 'p', 'd', 'k', 'q')",
+        [(i % 4000 + 1,) for i in range(8000)]
+    )
+    db.execute_many(
+        "INSERT INTO token_usage_daily (day, user_id, provider, stage, calls) "
+        "VALUES (CURDATE() - INTERVAL %s DAY, %s, 'deepseek', 'DeepSeek', 1)",
+        [(i % 60, i % 200) for i in range(600)]
+    )
+    for table in ("users", "sessions", "conversations", "optimization_results", "token_usage_daily"):
+        db.execute_query(f"ANALYZE TABLE {table}")
+
+
+class TestMigrations:
+
+    def test_all_migrations_applied_and_rerun_is_noop(self, mysql_db):
+        runner = MigrationRunner(mysql_db)
+        assert all(item["state"] == "applied" for item in runner.status())
+        assert runner.migrate() == []
+
+    def test_trigger_from_delimiter_block_is_created(self, mysql_db):
+        rows = mysql_db.execute_query("SHOW TRIGGERS LIKE 'sessions'")
+        assert any(row["Trigger"] == "auto_name_session" for row in rows)
+
+    @pytest.fixture(scope="class")
+    def seeded(self, mysql_db):
+        _seed(mysql_db)
+        return mysql_db
+
+    @pytest.mark.parametrize("name,query,params,expected", DAO_QUERY_PLANS,
+                             ids=[plan[0] for plan in DAO_QUERY_PLANS])
+    def test_dao_query_uses_expected_index(self, seeded, name, query, params, expected):
+        plan = seeded.execute_query("EXPLAIN " + query, params)[0]
+        assert plan["key"] == expected, plan
+        assert "filesort" not in (plan.get("Extra") or ""), plan
+
+    def test_explain_report_requires_chosen_key(self, seeded):
+        report = explain_dao_queries(seeded)
+        assert [item["query"] for item in report if not item["ok"]] == []
+        assert all(item["key"] == item["expected"] for item in report)
@@ -0,0 +1,178 @@
+"""按需采样性能剖析"""
+import json
+import os
+import time
+
+import pytest
+
+from prompt_optimizer.src.utils.profiling import ARM_FILE, RequestProfiler
+
+
+class _QuietLogger:
+    def info(self, *args, **kwargs):
+        pass
+
+    def warning(self, *args, **kwargs):
+        pass
+
+
+def _profiler(tmp_path, **kwargs) -> RequestProfiler:
+    return RequestProfiler(tmp_path / "profiles", logger=_QuietLogger(), **kwargs)
+
+
+def _busy(seconds: float) -> int:
+    total = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        total += sum(range(200))
+    return total
+
+
+def test_arm_validates_arguments(tmp_path):
+    profiler = _profiler(tmp_path)
+    with pytest.raises(ValueError):
+        profiler.arm("", count=1)
+    with pytest.raises(ValueError):
+        profiler.arm("optimize", kinds=("heap",))
+    with pytest.raises(ValueError):
+        profiler.arm("optimize", rate=1.5)
+    assert profiler.arm("optimize", count=500)["count"] == profiler.max_profiles
+
+
+def test_arm_matches_endpoint_and_disarms_after_count(tmp_path):
+    profiler = _profiler(tmp_path)
+    arm = profiler.arm("optimize", count=2, kinds=("wall",))
+    assert (profiler.directory / ARM_FILE).exists()
+    assert profiler.maybe_start("history", "/api/history") is None
+
+    first = profiler.maybe_start("optimize", "/api/optimize", "POST")
+    second = profiler.maybe_start("optimize", "/api/optimize", "POST")
+    assert first is not None and second is not None
+    assert first.profile_id.startswith(arm["id"] + "-")
+    # 已有count个请求在剖析中，不再接受新的请求
+    assert profiler.maybe_start("optimize", "/api/optimize") is None
+
+    profiler.finish(first, status=200)
+    assert profiler.status()["armed"]["completed"] == 1
+    profiler.finish(second, status=200)
+    assert not (profiler.directory / ARM_FILE).exists()
+    assert profiler.status()["armed"] is None
+    assert profiler.maybe_start("optimize", "/api/optimize") is None
+    assert len(profiler.list_profiles()) == 2
+
+
+def test_other_process_sees_arm_and_completed_count(tmp_path):
+    profiler = _profiler(tmp_path)
+    profiler.arm("*", count=1, kinds=("wall",))
+    capture = profiler.maybe_start("anything", "/x")
+    profiler.finish(capture, status=200)
+
+    # 另一个worker进程读取同一目录：布置已解除
+    other = _profiler(tmp_path)
+    assert other.maybe_start("anything", "/x") is None
+
+
+def test_arm_expires(tmp_path):
+    profiler = _profiler(tmp_path)
+    profiler.arm("optimize", count=5, duration=0.05)
+    assert profiler.status()["armed"] is not None
+    time.sleep(0.1)
+    assert profiler.status()["armed"] is None
+    assert not (profiler.directory / ARM_FILE).exists()
+    assert profiler.maybe_start("optimize", "/api/optimize") is None
+
+
+def test_arm_by_path_and_disarm(tmp_path):
+    profiler = _profiler(tmp_path)
+    profiler.arm("/api/optimize", count=5, kinds=("wall",))
+    capture = profiler.maybe_start("optimize", "/api/optimize")
+    assert capture is not None
+    profiler.finish(capture, status=200)
+    profiler.disarm()
+    profiler.disarm()
+    assert profiler.maybe_start("optimize", "/api/optimize") is None
+
+
+def test_captures_real_request(tmp_path):
+    profiler = _profiler(tmp_path)
+    arm = profiler.arm("optimize", count=1, kinds=("wall", "cpu"), interval_ms=1)
+    capture = profiler.maybe_start("optimize", "/api/optimize", "POST")
+    assert capture is not None
+    _busy(0.1)
+    profiler.finish(capture, status=201)
+
+    meta = json.loads((profiler.directory / f"{capture.profile_id}.json").read_text(encoding="utf-8"))
+    assert meta["arm_id"] == arm["id"]
+    assert meta["status"] == 201 and meta["method"] == "POST"
+    assert meta["samples"] > 0
+    assert "wall" in meta["kinds"]
+    for kind in meta["kinds"]:
+        assert (profiler.directory / f"{capture.profile_id}.{kind}.folded").exists()
+    wall = profiler.collapsed(capture.profile_id, "wall")
+    assert "_busy (" in wall and "test_captures_real_request (" in wall
+    # count个请求完成后自动解除布置
+    assert not (profiler.directory / ARM_FILE).exists()
+    assert profiler.maybe_start("optimize", "/api/optimize") is None
+    assert profiler.status()["inflight"] == 0
+
+
+def test_failed_request_is_recorded_as_500(tmp_path):
+    profiler = _profiler(tmp_path)
+    profiler.arm("optimize", count=1, kinds=("wall",))
+    capture = profiler.maybe_start("optimize", "/api/optimize")
+    profiler.finish(capture, status=None, error=RuntimeError("boom"))
+    assert profiler.list_profiles()[0]["status"] == 500
+
+
+def _write_profile(directory, profile_id, folded=None, mtime=None):
+    meta_path = directory / f"{profile_id}.json"
+    meta_path.write_text(json.dumps({"id": profile_id}), encoding="utf-8")
+    if folded is not None:
+        (directory / f"{profile_id}.wall.folded").write_text(folded, encoding="utf-8")
+    if mtime is not None:
+        os.utime(meta_path, (mtime, mtime))
+
+
+def test_collapsed_merges_profiles_of_one_arm(tmp_path):
+    profiler = _profiler(tmp_path)
+    directory = profiler.directory
+    _write_profile(directory, "abcd1234-00000001", "main;handler 10\nmain 5\n")
+    _write_profile(directory, "abcd1234-00000002", "main;handler 7\n")
+    _write_profile(directory, "ffff0000-00000001", "other 100\n")
+
+    assert profiler.collapsed("abcd1234-00000002", "wall") == "main;handler 7\n"
+    assert profiler.collapsed("abcd1234", "wall") == "main;handler 17\nmain 5\n"
+    assert profiler.collapsed("abcd1234", "cpu") is None
+    assert profiler.collapsed("00000000", "wall") is None
+
+
+@pytest.mark.parametrize("profile_id", [
+    "", "../armed", "abcd1234-../../etc/passwd", "abcd1234/00000001", "ABCD1234", "*", "abcd1234-*",
+])
+def test_collapsed_rejects_unsafe_ids(tmp_path, profile_id):
+    profiler = _profiler(tmp_path)
+    _write_profile(profiler.directory, "abcd1234-00000001", "main 1\n")
+    assert profiler.collapsed(profile_id, "wall") is None
+
+
+def test_collapsed_rejects_unknown_kind(tmp_path):
+    profiler = _profiler(tmp_path)
+    _write_profile(profiler.directory, "abcd1234-00000001", "main 1\n")
+    assert profiler.collapsed("abcd1234-00000001", "../wall") is None
+
+
+def test_prune_keeps_newest_profiles(tmp_path):
+    profiler = _profiler(tmp_path, max_profiles=2)
+    directory = profiler.directory
+    profiler.arm("optimize", count=2)
+    now = time.time()
+    for index in range(4):
+        _write_profile(directory, f"abcd1234-0000000{index}", "main 1\n", mtime=now - 100 + index)
+
+    profiler._prune()
+    remaining = sorted(path.name for path in directory.iterdir())
+    assert remaining == [
+        "abcd1234-00000002.json", "abcd1234-00000002.wall.folded",
+        "abcd1234-00000003.json", "abcd1234-00000003.wall.folded",
+        ARM_FILE,
+    ]
@@ -0,0 +1,162 @@
+"""多用户公平调度"""
+import multiprocessing
+import threading
+import time
+
+import pytest
+
+from prompt_optimizer.src.core.scheduler import FairScheduler, SchedulerRejected, SharedSlots
+
+
+def _hold(scheduler, user_key, started, release, order=None, priority="normal"):
+    with scheduler.slot(user_key, priority):
+        if order is not None:
+            order.append(user_key)
+        started.set()
+        release.wait(5)
+
+
+def _start(scheduler, user_key, release, order=None):
+    started = threading.Event()
+    thread = threading.Thread(target=_hold, args=(scheduler, user_key, started, release, order))
+    thread.start()
+    return thread, started
+
+
+def test_per_user_limit_lets_other_users_through():
+    scheduler = FairScheduler(slots=2, per_user_limit=1, queue_timeout=5)
+    release = threading.Event()
+    first, first_started = _start(scheduler, "a", release)
+    first_started.wait(5)
+    second, second_started = _start(scheduler, "a", release)
+    third, third_started = _start(scheduler, "b", release)
+
+    assert third_started.wait(5)
+    assert not second_started.is_set()
+    assert scheduler.snapshot()["running"] == 2
+    release.set()
+    for thread in (first, second, third):
+        thread.join(5)
+    assert second_started.is_set()
+
+
+def test_queue_timeout_and_full_queue_are_rejected():
+    scheduler = FairScheduler(slots=1, per_user_limit=1, max_queue=1, queue_timeout=0.2)
+    release = threading.Event()
+    holder, started = _start(scheduler, "a", release)
+    started.wait(5)
+
+    with pytest.raises(SchedulerRejected) as rejected:
+        with scheduler.slot("b"):
+            pass
+    assert rejected.value.position == 1
+    assert scheduler.snapshot()["timeouts"] == 1
+
+    waiter, _ = _start(scheduler, "c", release)
+    deadline = time.monotonic() + 5
+    while scheduler.snapshot()["queued"] == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    with pytest.raises(SchedulerRejected):
+        with scheduler.slot("d"):
+            pass
+    release.set()
+    holder.join(5)
+    waiter.join(5)
+
+
+def test_queue_status_reports_position():
+    scheduler = FairScheduler(slots=1, per_user_limit=1, queue_timeout=5)
+    release = threading.Event()
+    holder, started = _start(scheduler, "a", release)
+    started.wait(5)
+
+    def wait():
+        with scheduler.slot("b", request_id="r1"):
+            pass
+
+    waiter = threading.Thread(target=wait)
+    waiter.start()
+    deadline = time.monotonic() + 5
+    while not scheduler.queue_status("b") and time.monotonic() < deadline:
+        time.sleep(0.01)
+    status = scheduler.queue_status("b")
+    assert [(item["request_id"], item["position"]) for item in status] == [("r1", 1)]
+    release.set()
+    holder.join(5)
+    waiter.join(5)
+    assert scheduler.queue_status("b") == []
+
+
+def test_shared_slots_are_exclusive_per_file(tmp_path):
+    slots = SharedSlots(tmp_path)
+    first = slots.try_acquire("slot", 2)
+    second = slots.try_acquire("slot", 2)
+    assert first is not None and second is not None
+    assert slots.try_acquire("slot", 2) is None
+    slots.release(first)
+    third = slots.try_acquire("slot", 2)
+    assert third is not None
+    slots.release(second)
+    slots.release(third)
+
+
+def _run_worker(shared_dir, user_key, barrier, running, peak, lock):
+    scheduler = FairScheduler(slots=4, per_user_limit=1, queue_timeout=10,
+                              shared_dir=shared_dir, poll_interval=0.05)
+    barrier.wait()
+    with scheduler.slot(user_key):
+        with lock:
+            running.value += 1
+            peak.value = max(peak.value, running.value)
+        time.sleep(0.2)
+        with lock:
+            running.value -= 1
+
+
+def test_per_user_limit_is_shared_between_processes(tmp_path):
+    context = multiprocessing.get_context("fork")
+    barrier = context.Barrier(4)
+    running, peak, lock = context.Value("i", 0), context.Value("i", 0), context.Lock()
+    workers = [
+        context.Process(target=_run_worker, args=(tmp_path, "user-1", barrier, running, peak, lock))
+        for _ in range(4)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(30)
+    assert [worker.exitcode for worker in workers] == [0, 0, 0, 0]
+    assert peak.value == 1
+
+
+def test_queue_status_includes_other_processes(tmp_path):
+    # 先fork再占用槽位：子进程继承的锁文件描述符会让锁在父进程释放后仍然有效
+    context = multiprocessing.get_context("fork")
+    held = context.Event()
+
+    def wait_in_child():
+        held.wait(5)
+        scheduler = FairScheduler(slots=1, per_user_limit=1, queue_timeout=5,
+                                  shared_dir=tmp_path, poll_interval=0.05)
+        with scheduler.slot("b", request_id="child"):
+            pass
+
+    child = context.Process(target=wait_in_child)
+    child.start()
+    holder = FairScheduler(slots=1, per_user_limit=1, queue_timeout=5, shared_dir=tmp_path, poll_interval=0.05)
+    release = threading.Event()
+    thread, started = _start(holder, "a", release)
+    started.wait(5)
+    held.set()
+
+    deadline = time.monotonic() + 5
+    status = []
+    while not status and time.monotonic() < deadline:
+        status = holder.queue_status("b")
+        time.sleep(0.02)
+    assert [item["request_id"] for item in status] == ["child"]
+    release.set()
+    thread.join(5)
+    child.join(10)
+    assert child.exitcode == 0
+    assert holder.queue_status("b") == []
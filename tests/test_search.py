@@ -0,0 +1,49 @@
+"""全文搜索（依赖MySQL的ngram全文索引）"""
+import uuid
+
+import pytest
+
+from prompt_optimizer.src.core.search import build_boolean_query
+
+
+@pytest.fixture(scope="module")
+def corpus(mysql_db):
+    from prompt_optimizer.src.utils.database import (
+        ConversationDAO, OptimizationResultDAO, SearchDAO, SessionDAO, UserDAO
+    )
+    users, sessions = UserDAO(mysql_db), SessionDAO(mysql_db)
+    conversations, results = ConversationDAO(mysql_db), OptimizationResultDAO(mysql_db)
+    owner = users.create_user(f"search_{uuid.uuid4().hex[:8]}", "x")
+    other = users.create_user(f"search_{uuid.uuid4().hex[:8]}", "x")
+
+    session_id = sessions.create_session(owner, "周报整理", "把会议纪要整理成周报")
+    conversations.add_conversation(session_id, 1, "周报需要待办事项", "好的")
+    results.save_result(session_id, "整理周报", "周报提示词", "周报提示词", "周报提示词")
+    for index in range(5):
+        other_session = sessions.create_session(other, f"周报{index}", "别人的周报")
+        conversations.add_conversation(other_session, 1, "周报", "周报")
+    return {"dao": SearchDAO(mysql_db), "owner": owner, "other": other, "session_id": session_id}
+
+
+def test_search_returns_only_own_hits_from_every_source(corpus):
+    rows = corpus["dao"].search(corpus["owner"], build_boolean_query(["周报"]))
+    assert sorted(row["source"] for row in rows) == ["conversation", "result", "session"]
+    assert {row["session_id"] for row in rows} == {corpus["session_id"]}
+    by_source = {row["source"]: row for row in rows}
+    assert by_source["session"]["content"] == "把会议纪要整理成周报"
+    assert by_source["conversation"]["content"] == "周报需要待办事项\n好的"
+    assert by_source["result"]["content"].startswith("整理周报\n")
+    assert all(row["session_name"] == "周报整理" for row in rows)
+    scores = [row["score"] for row in rows]
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_search_pages_across_sources(corpus):
+    dao, query = corpus["dao"], build_boolean_query(["周报"])
+    everything = dao.search(corpus["other"], query, limit=20)
+    assert len(everything) == 10
+    pages = [dao.search(corpus["other"], query, limit=4, offset=offset) for offset in (0, 4, 8)]
+    assert [len(page) for page in pages] == [4, 4, 2]
+    paged = [(row["source"], row["item_id"]) for page in pages for row in page]
+    assert sorted(paged) == sorted((row["source"], row["item_id"]) for row in everything)
+    assert dao.search(corpus["other"], query, limit=4, offset=12) == []
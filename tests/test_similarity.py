@@ -0,0 +1,95 @@
+"""近似重复需求索引"""
+import multiprocessing
+
+from prompt_optimizer.src.core.similarity import MinHasher, SimilarityIndex, char_ngrams, normalize_text
+
+REQUIREMENT = "帮我写一个提示词，让模型把会议记录整理成带标题和待办事项的周报"
+
+
+def test_normalize_ignores_whitespace_punctuation_and_case():
+    assert normalize_text("Hello， World！") == normalize_text("hello world")
+
+
+def test_char_ngrams_short_text():
+    assert char_ngrams("ab", 3) == {"ab"}
+    assert char_ngrams("", 3) == set()
+    assert char_ngrams("abcd", 3) == {"abc", "bcd"}
+
+
+def test_signature_is_deterministic_across_instances():
+    assert MinHasher().signature(REQUIREMENT) == MinHasher().signature(REQUIREMENT)
+
+
+def test_query_finds_near_duplicate_for_same_user():
+    index = SimilarityIndex()
+    index.add(1, REQUIREMENT, user_id=7, session_id=70)
+    index.add(2, "把这段英文翻译成中文并保留专业术语", user_id=7, session_id=71)
+
+    matches = index.query(REQUIREMENT + "。", threshold=0.8, user_id=7)
+    assert [match["result_id"] for match in matches] == [1]
+    assert matches[0]["session_id"] == 70
+    assert index.query(REQUIREMENT, threshold=0.8, user_id=8) == []
+
+
+def test_index_file_is_shared_between_instances(tmp_path):
+    index_file = tmp_path / "index.jsonl"
+    writer = SimilarityIndex(index_file)
+    reader = SimilarityIndex(index_file)
+    writer.add(1, REQUIREMENT, user_id=1, session_id=1)
+    assert reader.query(REQUIREMENT, user_id=1)[0]["result_id"] == 1
+    assert len(SimilarityIndex(index_file)) == 1
+
+
+def test_rebuild_replaces_file_and_other_instances_reload(tmp_path):
+    index_file = tmp_path / "index.jsonl"
+    first = SimilarityIndex(index_file)
+    other = SimilarityIndex(index_file)
+    first.add(1, REQUIREMENT, user_id=1, session_id=1)
+    assert len(other.query(REQUIREMENT, user_id=1)) == 1
+
+    assert first.rebuild([(2, REQUIREMENT, 1, 2)]) == 1
+    assert [match["result_id"] for match in other.query(REQUIREMENT, user_id=1)] == [2]
+    assert list(tmp_path.glob("*.tmp")) == []
+
+    # 重建后追加的记录不会导致重复读取
+    other.add(3, "另一个完全不同的需求描述文本", user_id=1, session_id=3)
+    assert len(first.query("另一个完全不同的需求描述文本", user_id=1)) == 1
+    assert len(SimilarityIndex(index_file)) == 2
+
+
+def test_build_if_missing_only_builds_once(tmp_path):
+    index_file = tmp_path / "index.jsonl"
+    calls = []
+
+    def load_records():
+        calls.append(1)
+        return [(1, REQUIREMENT, 1, 1)]
+
+    assert SimilarityIndex(index_file).build_if_missing(load_records) == 1
+    late = SimilarityIndex(index_file)
+    assert late.build_if_missing(load_records) is None
+    assert len(calls) == 1 and len(late) == 1
+
+
+def _start_worker(index_file, barrier, queue):
+    barrier.wait()
+    count = SimilarityIndex(index_file).build_if_missing(
+        lambda: [(i, f"{REQUIREMENT}{i}", 1, i) for i in range(200)]
+    )
+    queue.put(count)
+
+
+def test_concurrent_workers_build_once(tmp_path):
+    index_file = tmp_path / "index.jsonl"
+    context = multiprocessing.get_context("fork")
+    barrier = context.Barrier(4)
+    queue = context.Queue()
+    workers = [context.Process(target=_start_worker, args=(index_file, barrier, queue)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(30)
+    counts = [queue.get(timeout=5) for _ in workers]
+    assert sorted(counts, key=lambda count: count is None) == [200, None, None, None]
+    assert len(SimilarityIndex(index_file)) == 200
+    assert sum(1 for _ in open(index_file, encoding="utf-8")) == 200
@@ -0,0 +1,84 @@
+"""多步优化结果的增量编码"""
+import random
+
+import pytest
+
+from prompt_optimizer.src.utils import stage_delta
+from prompt_optimizer.src.utils.stage_delta import PREFIX
+
+BASE = "".join(f"{i}. 第{i}条要求：输出需要包含标题、列表和示例。\n" for i in range(1, 41))
+
+
+def _edit(text: str) -> str:
+    lines = stage_delta.split_lines(text)
+    lines[3] = "4. 改写后的第四条要求。\n"
+    del lines[10:12]
+    lines.insert(20, "新增：补充约束条件。\n")
+    return "".join(lines)
+
+
+def test_split_lines_keeps_newlines_and_last_line():
+    assert stage_delta.split_lines("a\n\nb") == ["a\n", "\n", "b"]
+    assert stage_delta.split_lines("") == []
+    assert stage_delta.split_lines(None) == []
+
+
+@pytest.mark.parametrize("target", [
+    "",
+    BASE,
+    _edit(BASE),
+    "完全不同的内容\n没有共同的行",
+    BASE.rstrip("\n"),
+    "开头插入\n" + BASE + "结尾追加",
+])
+def test_ops_round_trip(target):
+    assert stage_delta.apply_ops(BASE, stage_delta.diff_ops(BASE, target)) == target
+
+
+def test_random_edits_round_trip():
+    rng = random.Random(7)
+    lines = stage_delta.split_lines(BASE)
+    for _ in range(50):
+        edited = [line for line in lines if rng.random() > 0.1]
+        for _ in range(rng.randint(0, 5)):
+            edited.insert(rng.randint(0, len(edited)), f"插入{rng.randint(0, 99)}\n")
+        target = "".join(edited)
+        assert stage_delta.apply_ops(BASE, stage_delta.diff_ops(BASE, target)) == target
+
+
+def test_encode_only_when_shorter():
+    edited = _edit(BASE)
+    value = stage_delta.encode(BASE, edited)
+    assert value.startswith(PREFIX) and len(value) < len(edited) * stage_delta.MAX_RATIO
+    assert stage_delta.decode(BASE, value) == edited
+    unrelated = "完全不同的内容"
+    assert stage_delta.encode(BASE, unrelated) == unrelated
+    assert stage_delta.encode("", edited) == edited
+    assert stage_delta.encode(BASE, value) == value
+
+
+def test_decode_passes_through_plain_values():
+    assert stage_delta.decode(BASE, "普通文本") == "普通文本"
+    assert stage_delta.decode(BASE, None) is None
+
+
+def test_encode_results_and_decode_row_chain():
+    kimi = _edit(BASE)
+    qwen = _edit(kimi).replace("新增", "再次新增")
+    deepseek_value, kimi_value, qwen_value = stage_delta.encode_results(BASE, kimi, qwen)
+    assert deepseek_value == BASE
+    assert stage_delta.is_encoded(kimi_value) and stage_delta.is_encoded(qwen_value)
+
+    row = {"deepseek_result": deepseek_value, "kimi_result": kimi_value, "qwen_result": qwen_value}
+    assert stage_delta.decode_row(row) == {"deepseek_result": BASE, "kimi_result": kimi, "qwen_result": qwen}
+
+
+def test_encode_response_uses_previous_stage_as_base():
+    kimi = _edit(BASE)
+    results = {"deepseek": BASE, "kimi": kimi, "qwen": "全新的短结果"}
+    encoded = stage_delta.encode_response(results)
+    assert encoded["deepseek"] == BASE
+    assert encoded["kimi"]["base"] == "deepseek"
+    assert stage_delta.apply_ops(BASE, encoded["kimi"]["ops"]) == kimi
+    assert encoded["qwen"] == "全新的短结果"
+    assert results["kimi"] == kimi
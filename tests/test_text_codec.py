@@ -0,0 +1,66 @@
+"""大文本字段的透明压缩"""
+import pytest
+
+from prompt_optimizer.src.utils import text_codec
+from prompt_optimizer.src.utils.text_codec import MARKER, TextCompressor
+
+LONG_TEXT = "## 角色\n你是一名资深的提示词工程师，请按以下要求输出。\n" * 80
+
+
+@pytest.mark.parametrize("codec", ["zlib", "zstd"])
+def test_round_trip(codec):
+    if codec == "zstd" and text_codec.zstandard is None:
+        pytest.skip("未安装zstandard")
+    compressor = TextCompressor(codec=codec, min_size=256)
+    value = compressor.encode(LONG_TEXT)
+    assert value.startswith(f"{MARKER}{codec}:")
+    assert len(value) < len(LONG_TEXT.encode("utf-8"))
+    assert compressor.decode(value) == LONG_TEXT
+
+
+def test_zstd_falls_back_to_zlib_when_unavailable(monkeypatch):
+    monkeypatch.setattr(text_codec, "zstandard", None)
+    assert TextCompressor(codec="zstd").codec == "zlib"
+
+
+def test_short_or_plain_values_are_unchanged():
+    compressor = TextCompressor(codec="zlib", min_size=1024)
+    assert compressor.encode("短文本") == "短文本"
+    assert compressor.encode(None) is None
+    assert compressor.decode("未压缩的旧数据") == "未压缩的旧数据"
+    assert compressor.decode(None) is None
+
+
+def test_incompressible_text_is_stored_as_is():
+    compressor = TextCompressor(codec="zlib", min_size=16)
+    text = "".join(chr(0x4e00 + (i * 7919) % 20000) for i in range(40))
+    assert compressor.encode(text) == text
+    assert compressor.snapshot()["skipped"] == 1
+
+
+def test_disabled_compressor_still_decodes():
+    value = TextCompressor(codec="zlib", min_size=256).encode(LONG_TEXT)
+    reader = TextCompressor(codec="zlib", min_size=256, enabled=False)
+    assert reader.encode(LONG_TEXT) == LONG_TEXT
+    assert reader.decode(value) == LONG_TEXT
+
+
+def test_encoded_value_is_not_compressed_twice():
+    compressor = TextCompressor(codec="zlib", min_size=256)
+    value = compressor.encode(LONG_TEXT)
+    assert compressor.encode(value) == value
+
+
+def test_unknown_codec_is_rejected():
+    with pytest.raises(ValueError):
+        TextCompressor().decode(f"{MARKER}lz4:AAAA")
+
+
+def test_decode_row_and_snapshot():
+    compressor = TextCompressor(codec="zlib", min_size=256)
+    row = {"id": 1, "ai_response": compressor.encode(LONG_TEXT), "user_message": "问"}
+    assert compressor.decode_row(row, "ai_response", "missing") is row
+    assert row["ai_response"] == LONG_TEXT
+    stats = compressor.snapshot()
+    assert stats["compressed"] == 1 and stats["decompressed"] == 1
+    assert 0 < stats["ratio"] < 1
@@ -0,0 +1,173 @@
+"""token用量台账"""
+import uuid
+from contextlib import contextmanager
+from datetime import date, datetime
+
+import pytest
+
+from prompt_optimizer.src.utils.usage import UsageDAO, UsageLedger
+
+DAY = datetime(2026, 10, 1, 12, 0)
+
+
+class _FakeCursor:
+    def __init__(self, statements):
+        self.statements = statements
+
+    def execute(self, query, params=None):
+        self.statements.append((query, params))
+
+    def close(self):
+        pass
+
+
+class _FakeConnection:
+    def __init__(self, statements):
+        self.statements = statements
+
+    def cursor(self):
+        return _FakeCursor(self.statements)
+
+
+class _FakeDB:
+    """记录每个事务执行的语句；fail_on指定第几次获取连接时抛出异常（从1开始）"""
+
+    def __init__(self, fail_on=None):
+        self.fail_on = fail_on
+        self.connections = 0
+        self.transactions = []
+
+    @contextmanager
+    def get_connection(self):
+        self.connections += 1
+        if self.connections == self.fail_on:
+            raise ConnectionError("数据库不可用")
+        statements = []
+        yield _FakeConnection(statements)
+        self.transactions.append(statements)
+
+
+def _ledger(db, **kwargs):
+    ledger = UsageLedger(db, **kwargs)
+    # 停止后台线程，由测试显式调用flush
+    ledger.close()
+    return ledger
+
+
+def _record(ledger, user_id=1, request_id=None, **usage):
+    ledger.record("optimize", "openai", {"input_tokens": 10, "output_tokens": 5, **usage},
+                  user_id=user_id, request_id=request_id, created_at=DAY)
+
+
+def _row(user_id, stage, provider, created_at, input_tokens=0, output_tokens=0, cached_tokens=0):
+    return (user_id, None, None, stage, provider, None, input_tokens, output_tokens, cached_tokens, None, created_at)
+
+
+def test_rollup_groups_by_day_user_provider_stage():
+    rows = [
+        _row(1, "optimize", "openai", DAY, 10, 5, 2),
+        _row(1, "optimize", "openai", DAY.replace(hour=23), 20, 6, 0),
+        _row(None, "optimize", "openai", DAY, 1, 1, 1),
+        _row(1, "evaluate", "openai", DAY, 3, 3, 3),
+        _row(1, "optimize", "openai", datetime(2026, 10, 2), 7, 7, 7),
+    ]
+    totals = UsageLedger.rollup(rows)
+    assert totals == {
+        (date(2026, 10, 1), 1, "openai", "optimize"): [2, 30, 11, 2],
+        (date(2026, 10, 1), 0, "openai", "optimize"): [1, 1, 1, 1],
+        (date(2026, 10, 1), 1, "openai", "evaluate"): [1, 3, 3, 3],
+        (date(2026, 10, 2), 1, "openai", "optimize"): [1, 7, 7, 7],
+    }
+
+
+def test_record_fills_defaults():
+    ledger = _ledger(_FakeDB())
+    ledger.record("optimize", None, {"input_tokens": None}, duration_ms=12.7)
+    row = ledger._pending[0]
+    assert row[4] == "unknown"
+    assert row[6:10] == (0, 0, 0, 12)
+    assert isinstance(row[10], datetime)
+
+
+def test_overflow_drops_oldest_rows():
+    ledger = _ledger(_FakeDB(), max_buffer=3, batch_size=100)
+    for index in range(5):
+        _record(ledger, request_id=f"r{index}")
+    assert [row[1] for row in ledger._pending] == ["r2", "r3", "r4"]
+    stats = ledger.snapshot()
+    assert stats["recorded"] == 5 and stats["dropped"] == 2 and stats["pending"] == 3
+
+
+def test_flush_writes_detail_and_daily_rollup_in_one_transaction():
+    db = _FakeDB()
+    ledger = _ledger(db, batch_size=100)
+    _record(ledger, user_id=1)
+    _record(ledger, user_id=1, cached_tokens=4)
+    _record(ledger, user_id=None)
+
+    assert ledger.flush() == 3
+    assert len(db.transactions) == 1
+    (detail_sql, detail_params), (daily_sql, daily_params) = db.transactions[0]
+    assert detail_sql.startswith("INSERT INTO token_usage (")
+    assert len(detail_params) == 3 * 11
+    assert "ON DUPLICATE KEY UPDATE" in daily_sql
+    assert daily_params == [
+        date(2026, 10, 1), 1, "openai", "optimize", 2, 20, 10, 4,
+        date(2026, 10, 1), 0, "openai", "optimize", 1, 10, 5, 0,
+    ]
+    assert ledger.flush() == 0
+
+
+def test_failed_chunk_is_requeued_ahead_of_new_rows():
+    db = _FakeDB(fail_on=2)
+    ledger = _ledger(db, batch_size=2)
+    for index in range(5):
+        _record(ledger, request_id=f"r{index}")
+
+    with pytest.raises(ConnectionError):
+        ledger.flush()
+    # 第一个分块已提交，失败的分块及其后的记录放回缓冲区头部
+    assert len(db.transactions) == 1
+    assert len(db.transactions[0][0][1]) == 2 * 11
+    _record(ledger, request_id="r5")
+    assert [row[1] for row in ledger._pending] == ["r2", "r3", "r4", "r5"]
+    stats = ledger.snapshot()
+    assert stats["flushed"] == 2 and stats["failures"] == 1
+
+    assert ledger.flush() == 4
+    assert len(db.transactions) == 3
+    assert ledger.snapshot()["flushed"] == 6 and ledger.snapshot()["pending"] == 0
+
+
+def test_summary_rejects_unknown_group_by():
+    with pytest.raises(ValueError) as error:
+        UsageDAO(_FakeDB()).summary(group_by=("day", "model; DROP TABLE users"))
+    assert "model; DROP TABLE users" in str(error.value)
+
+
+def test_daily_rollup_accumulates_across_flushes(mysql_db):
+    from prompt_optimizer.src.utils.database import UserDAO
+
+    user_id = UserDAO(mysql_db).create_user(f"usage_{uuid.uuid4().hex[:8]}", "x")
+    ledger = _ledger(mysql_db, batch_size=2)
+    today = datetime.now()
+    for _ in range(3):
+        ledger.record("optimize", "openai", {"input_tokens": 10, "output_tokens": 5, "cached_tokens": 1},
+                      user_id=user_id, created_at=today)
+    assert ledger.flush() == 3
+    ledger.record("optimize", "openai", {"input_tokens": 7, "output_tokens": 3},
+                  user_id=user_id, created_at=today)
+    assert ledger.flush() == 1
+
+    rows = mysql_db.execute_query(
+        "SELECT calls, input_tokens, output_tokens, cached_tokens FROM token_usage_daily "
+        "WHERE user_id = %s AND provider = 'openai' AND stage = 'optimize'", (user_id,)
+    )
+    assert [(row["calls"], row["input_tokens"], row["output_tokens"], row["cached_tokens"]) for row in rows] == [
+        (4, 37, 18, 3)
+    ]
+    summary = UsageDAO(mysql_db).summary(days=1, user_id=user_id, group_by=("provider",))
+    assert summary == [{"provider": "openai", "calls": 4, "input_tokens": 37,
+                        "output_tokens": 18, "cached_tokens": 3}]
+    detail = mysql_db.execute_query("SELECT COUNT(*) AS n FROM token_usage WHERE user_id = %s", (user_id,))
+    assert detail[0]["n"] == 4